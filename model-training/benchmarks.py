@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmarks
+Times every prepare/train stage on synthetic corpora of increasing size,
+fully offline, and fails loudly when throughput or memory regress against
+a stored baseline
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, Optional
+from instrumentation import PeakMemory
+from synthetic_reviews import write_jsonl
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_BASELINE = os.path.join(HERE, 'benchmark_baseline.json')
+DEFAULT_TOLERANCE = 0.25  # Fractional slowdown / memory growth allowed before a stage counts as regressed
+MEMORY_SLACK_MB = 16  # Absolute memory noise allowed on top of the tolerance
+MIN_COMPARABLE_SECONDS = 0.05  # Stages faster than this in the baseline are mostly timer noise
+STAGES = ['download', 'game_stats', 'dedup', 'select_diverse', 'select_text', 'select_best', 'index', 'search',
+          'format', 'save', 'estimate_cost']
+# Timed against an index of every substantive review; rows/sec of the search stage is queries/sec
+SEARCH_QUERIES = ['great story', 'performance crash bugs', 'multiplayer with friends', 'challenging bosses',
+                  'beautiful graphics', 'worth the price', 'replay value', 'boring and repetitive'] * 25
+
+def measure(stage: str, rows: int, run: Callable[[], object]) -> Dict:
+    """Run one stage, returning its result plus wall time, rows/sec and peak memory growth
+
+    Memory is this process's RSS above where the stage started; pool
+    workers' memory is not included.
+    """
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            result = run()
+        seconds = time.perf_counter() - start
+    return {
+        'stage': stage,
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_mb': round((memory.peak - memory.start) / 1024 / 1024, 1),
+        'result': result,
+    }
+
+def _load_legacy_prepare():
+    """Import scripts/prepare_training_data.py under its own name, next to ours"""
+    path = os.path.join(HERE, '..', 'scripts', 'prepare_training_data.py')
+    spec = importlib.util.spec_from_file_location('legacy_prepare_training_data', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def run_searches(path: str, queries: List[str], k: int = 5) -> int:
+    """Open an index and run every query against it; returns the hits found"""
+    from review_index import ReviewIndex
+
+    index = ReviewIndex(path)
+    return sum(len(index.search(query, k=k)) for query in queries)
+
+def run_size(count: int, workdir: str, stages: List[str], workers: int, seed: int = 0) -> List[Dict]:
+    """Benchmark every requested stage on one synthetic corpus"""
+    import prepare_training_data as prepare
+    import train_model
+    from dedup import deduplicate_reviews
+
+    corpus = os.path.join(workdir, f"reviews-{count}.jsonl.gz")
+    output = os.path.join(workdir, f"training-{count}.jsonl")
+    index = os.path.join(workdir, f"index-{count}")
+    # A size-specific seed keeps corpora disjoint, so no size warms another's token cache
+    write_jsonl(corpus, count, seed=seed + count)
+
+    results = []
+
+    def stage(name: str, rows: int, run: Callable[[], object], needed: bool = False):
+        """Measure a requested stage; run an unrequested one only if later stages need its output"""
+        if name not in stages:
+            if not needed:
+                return None
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                return run()
+        measured = measure(name, rows, run)
+        result = measured.pop('result')
+        if result is None:
+            raise RuntimeError(f"Stage {name} failed on {count:,} reviews; see its output without the benchmark harness")
+        results.append(measured)
+        print(f"  {name:<15} {measured['rows']:>10,} rows  {measured['seconds']:>9.3f}s  "
+              f"{measured['rows_per_sec'] or 0:>12,.0f} rows/s  {measured['peak_mb']:>8.1f} MB")
+        return result
+
+    writes_output = bool({'save', 'estimate_cost'} & set(stages))
+    reviews = stage('download', count, lambda: prepare.download_steam_reviews(corpus), needed=True)
+    if len(reviews) < count * 0.5:
+        raise RuntimeError(f"Synthetic corpus did not load ({len(reviews)} of {count} rows); refusing to benchmark sample data")
+
+    stage('game_stats', len(reviews), lambda: prepare.game_aspect_stats(reviews, workers=workers))
+    substantive = prepare.substantive_reviews(reviews)
+    stage('dedup', len(substantive), lambda: deduplicate_reviews(substantive, workers=workers))
+    stage('select_diverse', len(reviews), lambda: prepare.select_diverse_reviews(reviews, target_count=2000))
+    stage('select_text', len(reviews),
+          lambda: prepare.select_diverse_reviews(reviews, target_count=2000, diversity='text', workers=workers))
+    legacy = _load_legacy_prepare()
+    # The legacy script takes review dicts; converting them is not part of what it is timed on
+    legacy_reviews = reviews.to_pylist() if 'select_best' in stages else None
+    stage('select_best', len(reviews), lambda: legacy.select_best_reviews(legacy_reviews, target_count=5000))
+    stage('index', len(substantive), lambda: prepare.index_reviews(substantive, index, workers=workers),
+          needed='search' in stages)
+    stage('search', len(SEARCH_QUERIES), lambda: run_searches(index, SEARCH_QUERIES))
+
+    # Format, save and cost-estimate at corpus scale: every substantive review becomes training data
+    examples = stage('format', len(substantive),
+                     lambda: prepare.format_for_gaming_intelligence(substantive, workers=workers),
+                     needed=writes_output) or []
+    stage('save', len(examples), lambda: prepare.save_training_data(examples, output), needed=writes_output)
+    stage('estimate_cost', len(examples), lambda: train_model.estimate_cost(output))
+
+    if os.path.exists(index):
+        shutil.rmtree(index)
+    for path in (corpus, output):
+        if os.path.exists(path):
+            os.remove(path)
+    return results
+
+def compare(results: Dict[str, List[Dict]], baseline: Dict, tolerance: float) -> List[str]:
+    """Describe every stage that is slower or hungrier than the baseline allows"""
+    regressions = []
+    for size, stages in results.items():
+        expected = {entry['stage']: entry for entry in baseline.get('sizes', {}).get(size, [])}
+        for entry in stages:
+            base = expected.get(entry['stage'])
+            if not base:
+                continue
+            comparable = base['rows_per_sec'] and base['seconds'] >= MIN_COMPARABLE_SECONDS
+            if comparable and entry['rows_per_sec'] < base['rows_per_sec'] * (1 - tolerance):
+                regressions.append(
+                    f"{entry['stage']} @ {size}: {entry['rows_per_sec']:,.0f} rows/s vs baseline {base['rows_per_sec']:,.0f}"
+                )
+            if entry['peak_mb'] > base['peak_mb'] * (1 + tolerance) + MEMORY_SLACK_MB:
+                regressions.append(
+                    f"{entry['stage']} @ {size}: peak {entry['peak_mb']:.1f} MB vs baseline {base['peak_mb']:.1f} MB"
+                )
+    return regressions
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Benchmark the training data pipeline on synthetic corpora")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Corpus sizes to benchmark")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help="Stages to benchmark")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Processes for dedup and formatting")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed fractional slowdown or memory growth per stage")
+    parser.add_argument('--report', help="Also write the results as JSON here")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main execution function; returns a non-zero exit code on regression"""
+    args = parse_args(argv)
+
+    print("⏱️ Steam Training Pipeline Benchmarks")
+    print("=" * 50)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='steam-bench-') as workdir:
+        # Isolated caches, so earlier runs never make a stage look faster than it is
+        os.environ['STEAM_TRAINING_CACHE'] = workdir
+        for count in args.sizes:
+            print(f"\n📦 {count:,} reviews")
+            results[str(count)] = run_size(count, workdir, args.stages, args.workers)
+
+    report = {
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'workers': args.workers,
+        'sizes': results,
+    }
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('machine') != report['machine']:
+        print("\n⚠️ Baseline was recorded on a different machine; comparisons are only indicative")
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ PERFORMANCE REGRESSION ({len(regressions)} stage(s) beyond {args.tolerance:.0%} of baseline):")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+
+    print("\n✅ No regressions against baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Resumable Pipeline Stage Checkpoints
+Persists each prepare stage's output under a hash of its input, parameters
+and code, so re-runs only recompute stages downstream of a change
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import numpy as np
+from typing import Any, Callable, Optional
+from review_cache import DEFAULT_CACHE_DIR, normalization_version
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(DEFAULT_CACHE_DIR, 'checkpoints')
+CHECKPOINT_SUFFIXES = {'json': '.json.gz', 'npy': '.npy', 'arrow': '.arrow'}
+
+def stage_key(name: str, parent: Optional[str], *parts) -> Optional[str]:
+    """Key a stage by its upstream stage's key, its parameters and its code
+
+    parts are fingerprinted like normalization_version (functions and
+    modules by source, anything else by repr). A stage whose input has no
+    key has none either, and is never checkpointed.
+    """
+    if parent is None:
+        return None
+    digest = hashlib.sha256(f"{name}\0{parent}\0{normalization_version(*parts)}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def checkpoint_path(name: str, key: str, kind: str, cache_dir: str = DEFAULT_CHECKPOINT_DIR) -> str:
+    """File holding one stage output"""
+    return os.path.join(cache_dir, f"{name}-{key}{CHECKPOINT_SUFFIXES[kind]}")
+
+def _write(value: Any, path: str, kind: str):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        if kind == 'npy':
+            with open(tmp_path, 'wb') as f:
+                np.save(f, value)
+        elif kind == 'arrow':
+            import pyarrow as pa
+            # IPC files need one dictionary per column across all chunks
+            value = value.unify_dictionaries()
+            with pa.ipc.new_file(tmp_path, value.schema) as writer:
+                writer.write_table(value)
+        else:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _read(path: str, kind: str) -> Any:
+    if kind == 'npy':
+        return np.load(path)
+    if kind == 'arrow':
+        import pyarrow as pa
+        return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+def run_stage(name: str, key: Optional[str], compute: Callable[[], Any], kind: str = 'json',
+              cache_dir: Optional[str] = DEFAULT_CHECKPOINT_DIR) -> Any:
+    """Return the checkpointed output for key, or compute and checkpoint it
+
+    kind is 'json' for lists of plain dicts, 'npy' for NumPy arrays and
+    'arrow' for Arrow tables.
+    With no key or no cache_dir the stage simply runs.
+    """
+    if key is None or cache_dir is None:
+        return compute()
+
+    path = checkpoint_path(name, key, kind, cache_dir)
+    if os.path.exists(path):
+        try:
+            value = _read(path, kind)
+            print(f"♻️ Reusing {name} checkpoint {os.path.basename(path)}")
+            return value
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable {name} checkpoint ({e})")
+
+    value = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    _write(value, path, kind)
+    return value
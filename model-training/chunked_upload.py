@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Chunked, Resumable File Uploads
+Streams a training file to OpenAI's Uploads API in parts, concurrently, retrying
+only failed parts and resuming interrupted uploads from a local journal
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from typing import Any, Dict, Optional
+
+PART_SIZE = 32 * 1024 * 1024  # The API accepts parts of up to 64 MB
+MAX_CONCURRENT_PARTS = 4
+MAX_PART_RETRIES = 5
+EXPIRY_MARGIN = 300  # Don't resume an upload that expires within this many seconds
+MIME_TYPE = 'application/jsonl'
+
+def journal_path(path: str) -> str:
+    """Where an upload's progress is recorded, next to the file itself"""
+    return f"{path}.upload.json"
+
+def _file_identity(path: str) -> Dict:
+    stat = os.stat(path)
+    return {'bytes': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _read_part(path: str, offset: int, size: int) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+def _md5(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class UploadJournal:
+    """Local record of an in-progress upload: its id, part size and finished parts"""
+
+    def __init__(self, path: str):
+        self.path = journal_path(path)
+        self.data = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except ValueError:
+                self.data = None
+
+    def resumable(self, identity: Dict, part_size: int) -> bool:
+        """Whether the journal describes an unexpired upload of this exact file"""
+        return bool(
+            self.data
+            and self.data.get('file') == identity
+            and self.data.get('part_size') == part_size
+            and self.data.get('expires_at', 0) > time.time() + EXPIRY_MARGIN
+        )
+
+    def start(self, upload_id: str, expires_at: int, identity: Dict, part_size: int):
+        self.data = {'upload_id': upload_id, 'expires_at': expires_at, 'file': identity,
+                     'part_size': part_size, 'parts': {}}
+        self.save()
+
+    def record_part(self, index: int, part_id: str):
+        self.data['parts'][str(index)] = part_id
+        self.save()
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+async def upload_file_chunked(client: Any, path: str, purpose: str = 'fine-tune', part_size: int = PART_SIZE,
+                              max_concurrent_parts: int = MAX_CONCURRENT_PARTS) -> str:
+    """Upload path in parts and return the resulting file id
+
+    client is an openai.AsyncOpenAI (or a stand-in with the same uploads
+    API). Only part_size bytes per in-flight part are held in memory. Each
+    finished part is journaled, so re-running after a crash or network
+    failure uploads only the parts that are missing.
+    """
+    identity = _file_identity(path)
+    part_count = max(1, math.ceil(identity['bytes'] / part_size))
+    journal = UploadJournal(path)
+
+    if journal.resumable(identity, part_size):
+        done = len(journal.data['parts'])
+        print(f"♻️ Resuming upload {journal.data['upload_id']} ({done}/{part_count} parts already sent)")
+    else:
+        upload = await client.uploads.create(bytes=identity['bytes'], filename=os.path.basename(path),
+                                             mime_type=MIME_TYPE, purpose=purpose)
+        journal.start(upload.id, upload.expires_at, identity, part_size)
+    upload_id = journal.data['upload_id']
+
+    # The checksum is computed off the event loop while parts upload
+    md5 = asyncio.ensure_future(asyncio.to_thread(_md5, path))
+    slots = asyncio.Semaphore(max_concurrent_parts)
+
+    async def send_part(index: int):
+        async with slots:
+            for attempt in range(MAX_PART_RETRIES):
+                data = await asyncio.to_thread(_read_part, path, index * part_size, part_size)
+                try:
+                    part = await client.uploads.parts.create(upload_id, data=data)
+                    journal.record_part(index, part.id)
+                    return
+                except Exception as e:
+                    if attempt == MAX_PART_RETRIES - 1:
+                        raise
+                    delay = 2 ** attempt
+                    print(f"⚠️ Part {index + 1}/{part_count} failed ({e}); retrying in {delay}s")
+                    await asyncio.sleep(delay)
+
+    missing = [index for index in range(part_count) if str(index) not in journal.data['parts']]
+    try:
+        await asyncio.gather(*(send_part(index) for index in missing))
+    except Exception:
+        md5.cancel()
+        raise
+    print(f"📦 {part_count} part(s) uploaded")
+
+    part_ids = [journal.data['parts'][str(index)] for index in range(part_count)]
+    upload = await client.uploads.complete(upload_id, part_ids=part_ids, md5=await md5)
+    journal.remove()
+    return upload.file.id
+
+def upload_file(path: str, purpose: str = 'fine-tune', api_key: Optional[str] = None,
+                base_url: Optional[str] = None, **kwargs) -> str:
+    """Blocking entry point: chunked upload with a fresh AsyncOpenAI client
+
+    base_url points the client at another OpenAI-compatible server, e.g. a
+    local HTTP stand-in of the Uploads API.
+    """
+    import openai
+
+    async def run():
+        async with openai.AsyncOpenAI(api_key=api_key, base_url=base_url) as client:
+            return await upload_file_chunked(client, path, purpose, **kwargs)
+
+    return asyncio.run(run())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate Review Detection
+Drops exact copies and near-copies (MinHash + LSH) of Steam reviews so we
+don't pay to fine-tune on the same text twice
+"""
+
+import hashlib
+import os
+import string
+import numpy as np
+import pyarrow as pa
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from review_batch import ReviewBatch
+
+EMPTY_BIN = np.uint32(0xFFFFFFFF)  # Real bin values are even, so this never collides
+MAX_MEMO_WORDS = 2_000_000  # Word-hash memo is dropped and rebuilt past this size
+_PUNCTUATION = str.maketrans({character: ' ' for character in string.punctuation})
+_WORD_HASHES = {}
+
+def mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: spreads every input bit across the 64-bit output"""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """Pick (bands, rows) whose LSH similarity threshold (1/b)^(1/r) is closest to threshold"""
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+def _densify(signatures: np.ndarray):
+    """Fill empty bins from the nearest non-empty bin to their right (cyclically)
+
+    Each hop adds a constant, so two texts only agree on a borrowed bin when
+    they borrowed it from the same distance.
+    """
+    rows = np.flatnonzero((signatures == EMPTY_BIN).any(axis=1))
+    if not len(rows):
+        return
+    block = signatures[rows]
+    empty = block == EMPTY_BIN
+    while empty.any():
+        borrowed = np.roll(block, -1, axis=1)
+        fill = empty & (borrowed != EMPTY_BIN)
+        block[fill] = borrowed[fill] + np.uint32(0x9E3779B8)
+        empty &= ~fill
+    signatures[rows] = block
+
+def word_hashes(words: List[str]) -> np.ndarray:
+    """64-bit hash of every word, memoized so each distinct word is hashed once"""
+    if len(_WORD_HASHES) > MAX_MEMO_WORDS:
+        _WORD_HASHES.clear()
+    for word in set(words).difference(_WORD_HASHES):
+        _WORD_HASHES[word] = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'little')
+    return np.fromiter(map(_WORD_HASHES.__getitem__, words), dtype=np.uint64, count=len(words))
+
+def _chunk_hashes(texts: List[str], num_perm: int, shingle_size: int,
+                  seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact-text hash and MinHash signature for every text in a chunk
+
+    Texts are only lowercased and split in Python; word hashing goes through
+    a memo, and shingling plus min-hashing (one permutation hashing: one
+    hash per shingle, num_perm bins, densified) run over the whole chunk
+    in NumPy.
+    """
+    word_lists = [(text or '').lower().translate(_PUNCTUATION).split() for text in texts]
+    n_docs = len(word_lists)
+    words_per_doc = np.fromiter(map(len, word_lists), dtype=np.int64, count=n_docs)
+    words = word_hashes(list(chain.from_iterable(word_lists)))
+    word_doc = np.repeat(np.arange(n_docs), words_per_doc)
+    first_word = np.cumsum(words_per_doc) - words_per_doc
+    has_words = words_per_doc > 0
+
+    # Exact-text hash: order-sensitive mix of each word with its position
+    positioned = mix64(words ^ mix64((np.arange(len(words)) - first_word[word_doc]).astype(np.uint64)))
+    doc_hash = mix64(words_per_doc.astype(np.uint64))
+    if len(words):
+        doc_hash[has_words] ^= np.bitwise_xor.reduceat(positioned, first_word[has_words])
+
+    # Word shingles that stay within one text; short texts fall back to their whole-text hash
+    count = max(len(words) - shingle_size + 1, 0)
+    shingle_doc = word_doc[:count]
+    valid = shingle_doc == word_doc[shingle_size - 1:shingle_size - 1 + count]
+    shingles = words[:count].copy()
+    for offset in range(1, shingle_size):
+        shingles = mix64(shingles * np.uint64(0x9E3779B97F4A7C15) + words[offset:offset + count])
+    shingles, shingle_doc = shingles[valid], shingle_doc[valid]
+    lacking = np.flatnonzero(np.bincount(shingle_doc, minlength=n_docs) == 0)
+    shingles = np.r_[shingles, doc_hash[lacking]]
+    shingle_doc = np.r_[shingle_doc, lacking]
+
+    # One permutation hashing: each shingle is hashed once and its high bits pick the bin it competes in
+    mixed = mix64(shingles ^ np.uint64(seed))
+    bins = ((mixed >> np.uint64(32)) % np.uint64(num_perm)).astype(np.int64)
+    signatures = np.full(n_docs * num_perm, EMPTY_BIN, dtype=np.uint32)
+    np.minimum.at(signatures, shingle_doc * num_perm + bins, (mixed & np.uint64(0xFFFFFFFE)).astype(np.uint32))
+    signatures = signatures.reshape(n_docs, num_perm)
+    _densify(signatures)
+
+    return doc_hash, signatures
+
+def _iter_text_chunks(texts: Union[Iterable[str], pa.Array, pa.ChunkedArray],
+                      chunk_size: int) -> Iterator[List[str]]:
+    """Cut texts into lists of at most chunk_size strings"""
+    if isinstance(texts, (pa.Array, pa.ChunkedArray)):
+        for start in range(0, len(texts), chunk_size):
+            yield texts.slice(start, chunk_size).to_pylist()
+        return
+
+    batch = []
+    for text in texts:
+        batch.append(text)
+        if len(batch) >= chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def minhash_signatures(texts: Union[Iterable[str], pa.Array], num_perm: int = 64, shingle_size: int = 3,
+                       seed: int = 1) -> np.ndarray:
+    """MinHash signature (num_perm uint32 values) for each text"""
+    chunks = [_chunk_hashes(chunk, num_perm, shingle_size, seed)[1] for chunk in _iter_text_chunks(texts, 10_000)]
+    return np.concatenate(chunks) if chunks else np.zeros((0, num_perm), dtype=np.uint32)
+
+def _hash_chunks(chunks: Iterator[List[str]], num_perm: int, shingle_size: int,
+                 workers: Optional[int]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Hash chunks in order, on a process pool with a bounded number in flight"""
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for chunk in chunks:
+            yield _chunk_hashes(chunk, num_perm, shingle_size, seed=1)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_chunk_hashes, chunk, num_perm, shingle_size, 1))
+            if len(pending) > workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _find(parent: Dict[int, int], i: int) -> int:
+    """Union-find root, halving paths as it goes"""
+    while parent.get(i, i) != i:
+        parent[i] = parent.get(parent[i], parent[i])
+        i = parent[i]
+    return i
+
+def duplicate_mask(texts: Union[Iterable[str], pa.Array, pa.ChunkedArray], threshold: float = 0.8,
+                   num_perm: int = 64, shingle_size: int = 3, chunk_size: int = 10_000,
+                   workers: Optional[int] = None) -> Tuple[np.ndarray, Dict[str, int]]:
+    """Decide which texts to keep: the first of each exact or near-duplicate group
+
+    Exact copies (after normalization) share a text hash. The rest are
+    bucketed per LSH band over their MinHash signatures; bucket-mates are
+    verified against the bucket's first member by estimated Jaccard
+    similarity >= threshold. Sorting the band keys keeps this near-linear,
+    and memory is about 4 * num_perm bytes per review. Chunks are hashed on
+    a process pool when workers > 1.
+    Returns the keep mask and counts of exact / near duplicates removed.
+    """
+    bands, rows = lsh_params(threshold, num_perm)
+    hashed = list(_hash_chunks(_iter_text_chunks(texts, chunk_size), num_perm, shingle_size, workers))
+    if not hashed:
+        return np.zeros(0, dtype=bool), {'exact': 0, 'near': 0}
+
+    doc_hash = np.concatenate([h for h, _ in hashed])
+    _, first_rows = np.unique(doc_hash, return_index=True)
+    unique_rows = np.sort(first_rows)
+    signatures = np.concatenate([s for _, s in hashed])[unique_rows]
+    del hashed
+
+    # Candidate pairs: every bucket member against the bucket's first member
+    parent = {}
+    for band in range(bands):
+        key = np.zeros(len(signatures), dtype=np.uint64)
+        for column in signatures[:, band * rows:(band + 1) * rows].T:
+            key = mix64(key ^ column.astype(np.uint64))
+        order = np.argsort(key, kind='stable')
+        sorted_keys = key[order]
+        starts = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        leaders = order[np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))][~starts]
+        members = order[~starts]
+        if not len(members):
+            continue
+        similar = (signatures[members] == signatures[leaders]).mean(axis=1) >= threshold
+        for member, leader in zip(members[similar].tolist(), leaders[similar].tolist()):
+            root_member, root_leader = _find(parent, member), _find(parent, leader)
+            if root_member != root_leader:
+                low, high = sorted((root_member, root_leader))
+                parent[high] = low
+
+    survivors = np.ones(len(unique_rows), dtype=bool)
+    for i in parent:
+        survivors[i] = _find(parent, i) == i
+
+    keep = np.zeros(len(doc_hash), dtype=bool)
+    keep[unique_rows[survivors]] = True
+    return keep, {'exact': len(doc_hash) - len(unique_rows), 'near': int((~survivors).sum())}
+
+def duplicate_free_indices(reviews_data: Union[List[Dict], pa.Table, ReviewBatch], threshold: float = 0.8,
+                           num_perm: int = 64, shingle_size: int = 3,
+                           workers: Optional[int] = None) -> np.ndarray:
+    """Row numbers of the reviews to keep: the first copy of each duplicate group"""
+    print(f"Removing duplicate reviews (similarity >= {threshold})...")
+
+    if isinstance(reviews_data, (pa.Table, ReviewBatch)):
+        texts = reviews_data.column('review_text')
+    else:
+        texts = (review['review_text'] for review in reviews_data)
+
+    keep, removed = duplicate_mask(texts, threshold, num_perm, shingle_size, workers=workers)
+    print(f"Removed {removed['exact']} exact and {removed['near']} near-duplicate reviews, {int(keep.sum())} left")
+    return np.flatnonzero(keep)
+
+def take_reviews(reviews_data: Union[List[Dict], pa.Table, ReviewBatch],
+                 indices: np.ndarray) -> Union[List[Dict], pa.Table, ReviewBatch]:
+    """Rows at indices, as the same kind of collection"""
+    if isinstance(reviews_data, ReviewBatch):
+        return reviews_data.take(indices)
+    if isinstance(reviews_data, pa.Table):
+        return reviews_data.take(pa.array(indices, type=pa.int64()))
+    return [reviews_data[i] for i in indices.tolist()]
+
+def deduplicate_reviews(reviews_data: Union[List[Dict], pa.Table, ReviewBatch], threshold: float = 0.8,
+                        num_perm: int = 64, shingle_size: int = 3,
+                        workers: Optional[int] = None) -> Union[List[Dict], pa.Table, ReviewBatch]:
+    """Drop exact and near-duplicate reviews, keeping the first copy of each
+
+    Works on a list of review dicts, an Arrow table or a ReviewBatch and
+    returns the same kind. threshold is the estimated Jaccard similarity of word
+    shingles above which two reviews count as duplicates.
+    """
+    return take_reviews(reviews_data, duplicate_free_indices(reviews_data, threshold, num_perm, shingle_size, workers))
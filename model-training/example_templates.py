@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Precompiled Training Example Templates
+Compiles declarative question/answer templates once, then renders them over
+whole columns of reviews into compact examples that share interned parts
+"""
+
+import json
+import random
+from functools import lru_cache
+from string import Formatter
+from typing import Callable, Dict, Iterator, List, Sequence, Union
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from review_batch import column_pylist
+
+ROW_FIELDS = ('sample_text', 'game_name')  # Filled in per example when rendering
+UNKNOWN_GAME_NAME = 'this game'  # Stands in for a missing (null or blank) game name
+TEMPLATE_FIELDS = {'aspects', 'key_phrase', *ROW_FIELDS}
+QUESTION_CACHE_SIZE = 4096
+
+def _fields(text: str) -> set:
+    return {field for _, field, _, _ in Formatter().parse(text) if field is not None}
+
+def _escape(text: str) -> str:
+    return text.replace('{', '{{').replace('}', '}}')
+
+def _partial_format(text: str, **values) -> str:
+    """Substitute some fields of a format string, leaving the others for later"""
+    parts = []
+    for literal, field, spec, conversion in Formatter().parse(text):
+        parts.append(_escape(literal))
+        if field is None:
+            continue
+        placeholder = '{' + field + (f'!{conversion}' if conversion else '') + (f':{spec}' if spec else '') + '}'
+        parts.append(_escape(placeholder.format_map(values)) if field in values else placeholder)
+    return ''.join(parts)
+
+def _compile(text: str) -> Union[str, Callable[..., str]]:
+    """A finished string when nothing per-row is left to fill in, else its bound format method"""
+    return text.format if _fields(text) else text.format()
+
+class CompiledTemplate:
+    """One template with everything but the per-review fields substituted ahead of time
+
+    A template has one variant per aspect combination (a bitmask over its
+    aspect flags) or, for phrase templates, one per phrase; every variant's
+    questions and response are prepared here, once.
+    """
+
+    def __init__(self, spec: Dict, system: int):
+        self.name = spec['name']
+        self.system = system
+        self.when = dict(spec.get('when', {}))
+        self.aspects = list(spec.get('aspects', []))
+        self.max_aspects = spec.get('max_aspects')
+        self.phrases = list(spec.get('phrases', {}))
+        self.question_count = len(spec['questions'])
+
+        responses = list(spec['phrases'].values()) if self.phrases else [spec['response']]
+        for text in [*spec['questions'], *responses]:
+            unknown = _fields(text) - TEMPLATE_FIELDS
+            if unknown:
+                raise ValueError(f"Template {self.name!r} uses unknown field(s) {sorted(unknown)}")
+
+        if self.aspects:
+            variants = []
+            for code in range(2 ** len(self.aspects)):
+                named = [text for bit, (_, text) in enumerate(self.aspects) if code >> bit & 1]
+                variants.append({'aspects': ', '.join(named[:self.max_aspects])})
+            responses = responses * len(variants)
+        elif self.phrases:
+            variants = [{'key_phrase': phrase} for phrase in self.phrases]
+        else:
+            variants = [{}]
+        self.questions = [[_compile(_partial_format(question, **variant)) for question in spec['questions']]
+                          for variant in variants]
+        self.responses = [_compile(_partial_format(response, **variant))
+                          for response, variant in zip(responses, variants)]
+
+    def applies(self, flags: Dict[str, Sequence[bool]], count: int) -> np.ndarray:
+        mask = np.ones(count, dtype=bool)
+        for column, value in self.when.items():
+            mask &= np.asarray(flags[column], dtype=bool) == value
+        return mask
+
+class TrainingExamples:
+    """Chat examples held column-wise: a system prompt id, a question and a response each
+
+    System prompts live once in prompts. Questions with no per-review field
+    are the compiled template strings themselves, so identical questions
+    are one object. Message dicts and JSON lines are only built on the way
+    out, by iterating or by jsonl_lines().
+    """
+
+    def __init__(self, prompts: List[str], system: np.ndarray, questions: List[str], responses: List[str]):
+        self.prompts = prompts
+        self.system = system
+        self.questions = questions
+        self.responses = responses
+
+    @classmethod
+    def concat(cls, parts: List["TrainingExamples"]) -> "TrainingExamples":
+        """Join batches, re-interning their system prompts"""
+        interned = {}
+        systems = []
+        for part in parts:
+            ids = np.array([interned.setdefault(prompt, len(interned)) for prompt in part.prompts], dtype=np.int32)
+            systems.append(ids[part.system] if len(part.system) else part.system)
+        return cls(list(interned), np.concatenate(systems) if systems else np.zeros(0, dtype=np.int32),
+                   [question for part in parts for question in part.questions],
+                   [response for part in parts for response in part.responses])
+
+    @classmethod
+    def from_table(cls, table: pa.Table) -> "TrainingExamples":
+        """Examples from to_table()'s layout (e.g. a format checkpoint)"""
+        table = table.unify_dictionaries()
+        system = table.column('system')
+        prompts = system.chunk(0).dictionary.to_pylist() if system.num_chunks else []
+        ids = [chunk.indices.to_numpy() for chunk in system.chunks]
+        return cls(prompts, np.concatenate(ids).astype(np.int32) if ids else np.zeros(0, dtype=np.int32),
+                   column_pylist(table.column('question')), column_pylist(table.column('response')))
+
+    def to_table(self) -> pa.Table:
+        """Arrow table with the system prompt and question columns dictionary-encoded"""
+        return pa.table({
+            'system': pa.DictionaryArray.from_arrays(pa.array(self.system, pa.int32()), pa.array(self.prompts, pa.string())),
+            'question': pc.dictionary_encode(pa.array(self.questions, pa.string())),
+            'response': pa.array(self.responses, pa.string()),
+        })
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Each example as an OpenAI chat dict; every one shares its system message dict"""
+        system_messages = [{"role": "system", "content": prompt} for prompt in self.prompts]
+        for system, question, response in zip(self.system.tolist(), self.questions, self.responses):
+            yield {"messages": [system_messages[system], {"role": "user", "content": question},
+                                {"role": "assistant", "content": response}]}
+
+    def jsonl_lines(self) -> Iterator[bytes]:
+        """Encoded JSONL lines, byte for byte what json.dumps(example, ensure_ascii=False) writes
+
+        Each system prompt is encoded once and repeated questions come from a
+        cache, so only the responses are serialized per example.
+        """
+        heads = [('{"messages": [{"role": "system", "content": ' + json.dumps(prompt, ensure_ascii=False)
+                  + '}, {"role": "user", "content": ').encode('utf-8') for prompt in self.prompts]
+        middle = b'}, {"role": "assistant", "content": '
+        tail = b'}]}\n'
+        encode_question = lru_cache(maxsize=QUESTION_CACHE_SIZE)(
+            lambda question: json.dumps(question, ensure_ascii=False).encode('utf-8'))
+        for system, question, response in zip(self.system.tolist(), self.questions, self.responses):
+            yield heads[system] + encode_question(question) + middle + json.dumps(response, ensure_ascii=False).encode('utf-8') + tail
+
+class ExampleTemplates:
+    """A compiled set of templates sharing an interned table of system prompts
+
+    Template specs are dicts:
+      name        label used in errors
+      questions   question format strings; with several, one is drawn per review
+      response    response format string (or per phrase, see phrases)
+      when        {flag column: required value}, e.g. {'recommend': True}
+      aspects     [(flag column, text)]; the template needs at least one flag
+                  set, and {aspects} joins the texts of those set
+      max_aspects how many aspect texts {aspects} names at most
+      phrases     {phrase: response}; the template needs a phrase in the
+                  review's sample text, and one found is drawn as {key_phrase}
+      system      system prompt (default: the set's)
+    {sample_text} and {game_name} are filled in per review; a review without
+    a game name gets UNKNOWN_GAME_NAME.
+    """
+
+    def __init__(self, specs: List[Dict], system_prompt: str):
+        interned = {}
+        self.templates = []
+        for spec in specs:
+            system = interned.setdefault(spec.get('system', system_prompt), len(interned))
+            self.templates.append(CompiledTemplate(spec, system))
+        self.prompts = list(interned)
+
+    def render(self, flags: Dict[str, Sequence[bool]], sample_texts: List[str], game_names: List[str],
+               rng_of: Callable[[int], random.Random]) -> TrainingExamples:
+        """Render every template over a batch of reviews, in review order then template order
+
+        flags maps each flag column the templates test to one value per
+        review. Template selection and aspect combinations are worked out
+        with array operations; rng_of(row) is only asked for a generator for
+        reviews that need a random draw. A review's draws happen in template
+        order: the question as soon as a template applies, then the phrase.
+        """
+        count = len(sample_texts)
+        game_names = [(name or '').strip() or UNKNOWN_GAME_NAME for name in game_names]
+        lowered = None
+        produced, question_draws, variants, found = [], [], [], []
+        for template in self.templates:
+            applies = template.applies(flags, count)
+            variant = np.zeros(count, dtype=np.int64)
+            phrases_found = None
+            if template.aspects:
+                for bit, (column, _) in enumerate(template.aspects):
+                    variant |= np.asarray(flags[column], dtype=bool).astype(np.int64) << bit
+                produces = applies & (variant > 0)
+            elif template.phrases:
+                if lowered is None:
+                    lowered = pa.array([text.lower() for text in sample_texts], pa.string())
+                phrases_found = np.zeros((count, len(template.phrases)), dtype=bool)
+                for column, phrase in enumerate(template.phrases):
+                    phrases_found[:, column] = pc.match_substring(lowered, phrase.lower()).to_numpy(zero_copy_only=False)
+                produces = applies & phrases_found.any(axis=1)
+            else:
+                produces = applies
+            produced.append(produces)
+            question_draws.append(applies if template.question_count > 1 else np.zeros(count, dtype=bool))
+            variants.append(variant)
+            found.append(phrases_found)
+
+        # Draws happen row by row in Python, so flags are read from lists rather than arrays
+        phrase_draws = [produces if template.phrases else np.zeros(count, dtype=bool)
+                        for template, produces in zip(self.templates, produced)]
+        drawing = np.logical_or.reduce([np.zeros(count, dtype=bool), *question_draws, *phrase_draws])
+        question_draws = [draws.tolist() for draws in question_draws]
+        phrase_draws = [draws.tolist() for draws in phrase_draws]
+        variants = [variant.tolist() for variant in variants]
+        choices = [[0] * count for _ in self.templates]
+        for row in np.flatnonzero(drawing).tolist():
+            rng = rng_of(row)
+            for index, template in enumerate(self.templates):
+                if question_draws[index][row]:
+                    choices[index][row] = rng.choice(range(template.question_count))
+                if phrase_draws[index][row]:
+                    variants[index][row] = rng.choice(np.flatnonzero(found[index][row]).tolist())
+
+        rows, template_ids, questions, responses = [], [], [], []
+        for index, template in enumerate(self.templates):
+            template_rows = np.flatnonzero(produced[index])
+            variant, choice = variants[index], choices[index]
+            for row in template_rows.tolist():
+                question = template.questions[variant[row]][choice[row]]
+                response = template.responses[variant[row]]
+                if not isinstance(question, str):
+                    question = question(sample_text=sample_texts[row], game_name=game_names[row])
+                if not isinstance(response, str):
+                    response = response(sample_text=sample_texts[row], game_name=game_names[row])
+                questions.append(question)
+                responses.append(response)
+            rows.append(template_rows)
+            template_ids.append(np.full(len(template_rows), index))
+
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        template_ids = np.concatenate(template_ids) if template_ids else np.zeros(0, dtype=np.int64)
+        order = np.lexsort((template_ids, rows)).tolist()
+        systems = np.array([template.system for template in self.templates], dtype=np.int32)
+        return TrainingExamples(list(self.prompts), systems[template_ids[order]] if order else np.zeros(0, dtype=np.int32),
+                                [questions[position] for position in order], [responses[position] for position in order])
+
+def compile_templates(specs: List[Dict], system_prompt: str) -> ExampleTemplates:
+    """Validate and precompile template specs (see ExampleTemplates)"""
+    return ExampleTemplates(specs, system_prompt)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Per-game Aspect Statistics
+Aggregates per-review aspect and sentiment flags into one row per game with
+grouped bincounts, and serves the table memory-mapped for microsecond
+lookups and library scoring
+"""
+
+import json
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Dict, List, Optional, Sequence
+from review_batch import ReviewBatch
+
+RATE_SUFFIX = '_rate'
+MIN_REVIEWS = 5  # Games with fewer reviews are too noisy to recommend
+
+def aggregate_game_stats(reviews: ReviewBatch, flags: Dict[str, np.ndarray], aspects: Sequence[str]) -> pa.Table:
+    """One row per reviewed game, sorted by game_id
+
+    Columns: game_id, game_name, reviews, positive_ratio, mean_helpful and
+    <flag>_rate (the share of its reviews with each flag set). flags holds
+    one boolean per review for each flag column; aspects names the ones
+    that describe the game (the rest, e.g. sentiment, are only reported).
+    All sums are bincounts over the game_id dictionary codes. Reviews
+    without a game_id (e.g. steam-bundle reviews of an unknown item) belong
+    to no game and are left out.
+    """
+    table = reviews.table.unify_dictionaries()
+    known = pc.is_valid(table.column('game_id')).to_numpy(zero_copy_only=False)
+    if not known.all():
+        table = table.filter(known)
+        flags = {column: np.asarray(values)[known] for column, values in flags.items()}
+    games = table.column('game_id')
+    if not pa.types.is_dictionary(games.type):
+        games = games.dictionary_encode()
+    if games.num_chunks:
+        codes = np.concatenate([chunk.indices.to_numpy(zero_copy_only=False) for chunk in games.chunks])
+        dictionary = games.chunk(0).dictionary
+    else:
+        codes, dictionary = np.zeros(0, dtype=np.int64), pa.array([], games.type.value_type)
+
+    present, first, codes = np.unique(codes, return_index=True, return_inverse=True)
+    count = np.bincount(codes, minlength=len(present))
+    denominator = np.maximum(count, 1)
+
+    def mean_of(values) -> pa.Array:
+        return pa.array(np.bincount(codes, weights=np.asarray(values, dtype=np.float64), minlength=len(present))
+                        / denominator, pa.float32())
+
+    columns = {
+        'game_id': dictionary.take(pa.array(present, pa.int64())),
+        'game_name': pa.array(ReviewBatch(table).take(first).pylist('game_name'), pa.string()),
+        'reviews': pa.array(count, pa.int32()),
+        'positive_ratio': mean_of(table.column('recommend').to_numpy()),
+        'mean_helpful': mean_of(table.column('helpful').to_numpy()),
+    }
+    for column, values in flags.items():
+        columns[column + RATE_SUFFIX] = mean_of(values)
+    stats = pa.table(columns).sort_by('game_id')
+    return stats.replace_schema_metadata({'aspects': json.dumps(list(aspects))})
+
+def write_game_stats(stats: pa.Table, path: str) -> int:
+    """Write the stats as one uncompressed Arrow IPC record batch, atomically; returns the game count"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        with pa.ipc.new_file(tmp_path, stats.schema) as writer:
+            writer.write_table(stats.combine_chunks())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return stats.num_rows
+
+class GameStats:
+    """A memory-mapped per-game stats table with NumPy lookups
+
+    Games are found by binary search over the sorted game_id column, and
+    each game's aspect rates are one row of a (games x aspects) matrix, so
+    lookups and library scoring are a few array operations.
+    """
+
+    def __init__(self, path: str):
+        self.table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all().combine_chunks()
+        metadata = self.table.schema.metadata or {}
+        self.aspects = json.loads(metadata.get(b'aspects', b'[]'))
+        self.synthetic = metadata.get(b'synthetic') == b'true'  # Aggregated from generated sample reviews
+        self.game_ids = self.table.column('game_id').to_numpy()
+        self.reviews = self.table.column('reviews').to_numpy()
+        self.positive_ratio = self.table.column('positive_ratio').to_numpy()
+        self.aspect_rates = np.column_stack(
+            [self.table.column(aspect + RATE_SUFFIX).to_numpy() for aspect in self.aspects]
+        ) if self.aspects else np.zeros((len(self.game_ids), 0), dtype=np.float32)
+        self.aspect_norms = np.linalg.norm(self.aspect_rates, axis=1)
+        self._names = None
+
+    def __len__(self) -> int:
+        return len(self.game_ids)
+
+    def rows_of(self, game_ids: Sequence) -> np.ndarray:
+        """Row of each game in the table, -1 for games without stats"""
+        game_ids = np.asarray(game_ids, dtype=self.game_ids.dtype)
+        rows = np.minimum(np.searchsorted(self.game_ids, game_ids), max(len(self.game_ids) - 1, 0))
+        found = self.game_ids[rows] == game_ids if len(self.game_ids) else np.zeros(len(game_ids), dtype=bool)
+        return np.where(found, rows, -1)
+
+    def get(self, game_id) -> Optional[Dict]:
+        """Every stat of one game, or None"""
+        row = int(self.rows_of([game_id])[0])
+        return self.table.slice(row, 1).to_pylist()[0] if row >= 0 else None
+
+    def profile(self, library: Sequence) -> np.ndarray:
+        """Aspect rates of a library's games, averaged with each game weighted by its review count"""
+        rows = self.rows_of(library)
+        rows = rows[rows >= 0]
+        weights = self.reviews[rows].astype(np.float64)
+        if not weights.sum():
+            return np.zeros(len(self.aspects), dtype=np.float32)
+        return (weights @ self.aspect_rates[rows] / weights.sum()).astype(np.float32)
+
+    def recommend(self, library: Sequence, k: int = 10, min_reviews: int = MIN_REVIEWS) -> List[Dict]:
+        """Games outside a library whose aspects best match its profile, best first
+
+        A game scores the cosine similarity of its aspect rates to the
+        library's profile, times its positive ratio. Games with fewer than
+        min_reviews reviews are skipped.
+        """
+        target = self.profile(library)
+        norms = self.aspect_norms * np.linalg.norm(target)
+        scores = np.where(norms > 0, self.aspect_rates @ target / np.where(norms > 0, norms, 1), 0) * self.positive_ratio
+        owned = self.rows_of(library)
+        eligible = self.reviews >= min_reviews
+        eligible[owned[owned >= 0]] = False
+        rows = np.flatnonzero(eligible & (scores > 0))
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        rows = rows[np.lexsort((rows, -scores[rows]))]
+        if self._names is None:
+            self._names = self.table.column('game_name').to_pylist()
+        return [{'game_id': game_id, 'game_name': self._names[row], 'score': round(float(scores[row]), 4)}
+                for row, game_id in zip(rows.tolist(), self.game_ids[rows].tolist())]
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Pipeline Stage Instrumentation
+Records wall/CPU time, rows in/out, throughput and peak RSS for every stage,
+writes them as a JSON report, and optionally profiles each stage
+"""
+
+import cProfile
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+PROFILERS = ['cprofile', 'sample']
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples and RSS readings
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # No /proc (macOS): ru_maxrss is the best we have, in bytes there
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class PeakMemory:
+    """Sample RSS on a background thread and keep the highest value seen"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start = self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+class StackSampler:
+    """Sampling profiler: periodically records the main thread's stack
+
+    Stacks are kept in collapsed form ("outer;inner;leaf count"), which
+    flamegraph.pl and speedscope read directly.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._target = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def _cpu_seconds() -> float:
+    """CPU time of this process plus any child processes already reaped"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def counted(items: Iterable, record: Dict, field: str = 'rows_in', size: Optional[Callable[[Any], int]] = None) -> Iterator:
+    """Pass items through, counting them (or their size(item) rows) into record[field] (for lazy streams)"""
+    record[field] = 0
+    for item in items:
+        record[field] += size(item) if size else 1
+        yield item
+
+class Instrumentation:
+    """Collects one record per pipeline stage
+
+    Use stage() as a context manager around each step and fill in
+    rows_in/rows_out on the record it yields. With profiler set, each stage
+    also leaves a cProfile (.prof) or sampled-stack (.folded) file in
+    profile_dir.
+    """
+
+    def __init__(self, run: str, profiler: Optional[str] = None, profile_dir: str = 'profiles'):
+        if profiler not in (None, *PROFILERS):
+            raise ValueError(f"Unknown profiler {profiler!r}; expected one of {PROFILERS}")
+        self.run = run
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.stages = []
+        self.started = time.time()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[Dict]:
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        profile_path = profiler = None
+        if self.profiler:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            stem = os.path.join(self.profile_dir, f"{self.run}-{len(self.stages):02d}-{name}")
+            if self.profiler == 'cprofile':
+                profile_path, profiler = f"{stem}.prof", cProfile.Profile()
+                start, stop = profiler.enable, profiler.disable
+            else:
+                profile_path, profiler = f"{stem}.folded", StackSampler()
+                start, stop = profiler.start, profiler.stop
+
+        cpu_start = _cpu_seconds()
+        with PeakMemory() as memory:
+            wall_start = time.perf_counter()
+            if profiler is not None:
+                start()
+            try:
+                yield record
+            finally:
+                if profiler is not None:
+                    stop()
+                wall = time.perf_counter() - wall_start
+
+        rows = record['rows_in'] if record['rows_in'] is not None else record['rows_out']
+        record.update({
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(_cpu_seconds() - cpu_start, 4),
+            'rows_per_sec': round(rows / wall, 1) if rows and wall > 0 else None,
+            'peak_rss_mb': round(memory.peak / 1024 / 1024, 1),
+            'peak_rss_growth_mb': round((memory.peak - memory.start) / 1024 / 1024, 1),
+        })
+        if profile_path:
+            if isinstance(profiler, StackSampler):
+                profiler.dump(profile_path)
+            else:
+                profiler.dump_stats(profile_path)
+            record['profile'] = profile_path
+        self.stages.append(record)
+
+    def report(self) -> Dict:
+        """Everything recorded so far, as JSON-ready data"""
+        return {
+            'run': self.run,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+            'total_seconds': round(time.time() - self.started, 3),
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+            'stages': self.stages,
+        }
+
+    def write_report(self, path: str):
+        """Write the JSON report and print a one-line-per-stage summary"""
+        print(f"\n📈 Stage timings ({path})")
+        for record in self.stages:
+            rate = f"{record['rows_per_sec']:>12,.0f} rows/s" if record['rows_per_sec'] else ' ' * 19
+            print(f"  {record['stage']:<12} {record['wall_seconds']:>9.2f}s wall  {record['cpu_seconds']:>9.2f}s cpu  "
+                  f"{rate}  peak {record['peak_rss_mb']:,.0f} MB")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Async Fine-tuning Job Monitor
+Follows any number of OpenAI fine-tuning jobs from one process, streaming new
+events (step, loss) as they appear and polling adaptively
+"""
+
+import asyncio
+import contextlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+MIN_POLL_INTERVAL = 2.0  # Seconds between polls while events are flowing
+MAX_POLL_INTERVAL = 10.0  # Quiet jobs are still checked this often, so completion shows up within seconds
+BACKOFF_FACTOR = 1.5
+ERROR_BACKOFF = 30.0  # Wait after a failed poll (rate limits, network)
+EVENT_PAGE_SIZE = 100
+MAX_CONCURRENT_REQUESTS = 8  # In flight at once across every job an orchestrator watches
+TERMINAL_STATUSES = {'succeeded', 'failed', 'cancelled'}
+
+def format_event(job_id: str, event: Any) -> str:
+    """One console line per event; metrics events show step and loss"""
+    data = getattr(event, 'data', None) or {}
+    if getattr(event, 'type', None) == 'metrics' and 'step' in data:
+        step = f"step {data['step']}" + (f"/{data['total_steps']}" if data.get('total_steps') else '')
+        metrics = [f"{key.replace('train_', '')} {value:.4f}" for key, value in data.items()
+                   if key not in ('step', 'total_steps') and isinstance(value, (int, float))]
+        return f"📉 {job_id}: {step}  " + '  '.join(metrics)
+    icon = {'error': '❌', 'warn': '⚠️'}.get(getattr(event, 'level', 'info'), 'ℹ️')
+    return f"{icon} {job_id}: {event.message}"
+
+async def fetch_new_events(client: Any, job_id: str, last_event_id: Optional[str],
+                           page_size: int = EVENT_PAGE_SIZE) -> List[Any]:
+    """Events newer than last_event_id, oldest first
+
+    The API pages newest-first, so we page backwards from the latest event
+    until we reach the one we saw last (or the start of the job).
+    """
+    new_events = []
+    after = None
+    while True:
+        kwargs = {'limit': page_size}
+        if after:
+            kwargs['after'] = after
+        page = await client.fine_tuning.jobs.list_events(job_id, **kwargs)
+        for event in page.data:
+            if event.id == last_event_id:
+                return new_events[::-1]
+            new_events.append(event)
+        if not page.data or not page.has_more:
+            return new_events[::-1]
+        after = page.data[-1].id
+
+async def watch_job(client: Any, job_id: str, on_event: Callable[[str, Any], None] = None,
+                    sleep: Callable[[float], Awaitable] = asyncio.sleep,
+                    limiter: Optional[asyncio.Semaphore] = None,
+                    min_interval: float = MIN_POLL_INTERVAL, max_interval: float = MAX_POLL_INTERVAL) -> Any:
+    """Follow one job until it finishes and return its final state
+
+    client is an openai.AsyncOpenAI (or anything with the same
+    fine_tuning.jobs.retrieve / list_events coroutines, such as a local
+    stand-in). The poll interval starts at min_interval, grows by
+    BACKOFF_FACTOR while nothing happens, and snaps back when events arrive.
+    Each poll reads the status first and the events after it, so the events
+    a job writes as it finishes (the final metrics and status messages) are
+    reported before it is returned. limiter, when given, is shared by every
+    watch_job an orchestrator runs and bounds their requests in flight.
+    """
+    on_event = on_event or (lambda job, event: print(format_event(job, event)))
+    limiter = limiter or contextlib.nullcontext()
+    last_event_id = None
+    last_status = None
+    interval = min_interval
+
+    while True:
+        try:
+            async with limiter:
+                job = await client.fine_tuning.jobs.retrieve(job_id)
+                events = await fetch_new_events(client, job_id, last_event_id)
+        except Exception as e:
+            print(f"⚠️ {job_id}: error checking status ({e}); retrying in {ERROR_BACKOFF:.0f}s")
+            await sleep(ERROR_BACKOFF)
+            continue
+
+        for event in events:
+            on_event(job_id, event)
+        if events:
+            last_event_id = events[-1].id
+        if job.status != last_status:
+            print(f"Status {job_id}: {job.status}")
+            last_status = job.status
+        if job.status in TERMINAL_STATUSES:
+            return job
+
+        interval = min_interval if events else min(interval * BACKOFF_FACTOR, max_interval)
+        await sleep(interval)
+
+async def watch_jobs(client: Any, job_ids: List[str], limiter: Optional[asyncio.Semaphore] = None,
+                     **kwargs) -> Dict[str, Any]:
+    """Follow several jobs concurrently through one limiter (default: MAX_CONCURRENT_REQUESTS in flight); returns each final state"""
+    limiter = limiter or asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    jobs = await asyncio.gather(*(watch_job(client, job_id, limiter=limiter, **kwargs) for job_id in job_ids))
+    return dict(zip(job_ids, jobs))
+
+def monitor_jobs(job_ids: List[str], api_key: Optional[str] = None, base_url: Optional[str] = None) -> Dict[str, Any]:
+    """Blocking entry point: watch job_ids with a fresh AsyncOpenAI client
+
+    base_url points the client at another OpenAI-compatible server, e.g. a
+    local stand-in of the fine-tuning API.
+    """
+    import openai
+
+    async def run():
+        async with openai.AsyncOpenAI(api_key=api_key, base_url=base_url) as client:
+            return await watch_jobs(client, job_ids)
+
+    return asyncio.run(run())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Sharded JSONL Output
+Writes training examples in buffered batches to size-capped, optionally
+compressed JSONL shards, plus a manifest describing every shard
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional
+
+MAX_SHARD_BYTES = 500 * 1024 * 1024  # Stays under OpenAI's 512 MB per-file upload limit
+WRITE_BUFFER_BYTES = 1024 * 1024
+COMPRESSION_SUFFIXES = {'none': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+def _zstd():
+    """Import the optional zstandard package"""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError as e:
+        raise RuntimeError("zstd compression needs the zstandard package (pip install zstandard)") from e
+
+def encode_example(example: Dict) -> bytes:
+    """One example as a UTF-8 JSONL line"""
+    return (json.dumps(example, ensure_ascii=False) + '\n').encode('utf-8')
+
+def compression_of(path: str) -> str:
+    """Infer a shard's compression from its file suffix"""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and path.endswith(suffix):
+            return compression
+    return 'none'
+
+def open_jsonl(path: str) -> BinaryIO:
+    """Open a JSONL shard for binary line reading, decompressing by suffix"""
+    compression = compression_of(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'zstd':
+        return io.BufferedReader(_zstd().ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path, 'rb', buffering=WRITE_BUFFER_BYTES)
+
+def manifest_path(filename: str) -> str:
+    """Manifest location for an output filename: steam_training_data.manifest.json"""
+    stem, _ = os.path.splitext(filename)
+    return f"{stem}.manifest.json"
+
+def read_manifest(filename: str) -> Dict:
+    """Load the manifest written next to filename, with shard paths made absolute"""
+    path = manifest_path(filename)
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    directory = os.path.dirname(os.path.abspath(path))
+    for shard in manifest['shards']:
+        shard['path'] = os.path.join(directory, shard['file'])
+    return manifest
+
+def write_manifest(filename: str, manifest: Dict):
+    """Atomically write the manifest for filename (dropping read_manifest's absolute paths)"""
+    manifest = {**manifest, 'shards': [{key: value for key, value in shard.items() if key != 'path'}
+                                       for shard in manifest['shards']]}
+    path = manifest_path(filename)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+class _HashingFile:
+    """Raw file that hashes and counts every byte that reaches the disk"""
+
+    def __init__(self, path: str):
+        self.f = open(path, 'wb', buffering=WRITE_BUFFER_BYTES)
+        self.sha256 = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.bytes += len(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+def _compressing_stream(raw: _HashingFile, compression: str):
+    """Stream that compresses into raw (raw itself when uncompressed)"""
+    if compression == 'gzip':
+        return gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0)
+    if compression == 'zstd':
+        return _zstd().ZstdCompressor().stream_writer(raw, closefd=False)
+    return raw
+
+class ShardedJsonlWriter:
+    """Buffered JSONL writer that rolls over to a new shard at max_shard_bytes
+
+    Examples are serialized and written max_buffer_rows at a time. Shards are
+    capped on uncompressed size, so a shard never exceeds the cap on disk
+    either. With a single shard the output keeps the plain filename (plus
+    the compression suffix); otherwise shards are numbered
+    steam_training_data-00000-of-00003.jsonl and so on.
+    """
+
+    def __init__(self, filename: str, compression: str = 'none', max_shard_bytes: int = MAX_SHARD_BYTES,
+                 max_buffer_rows: int = 1000):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression {compression!r}; expected one of {list(COMPRESSION_SUFFIXES)}")
+        if compression == 'zstd':
+            _zstd()
+        self.filename = filename
+        self.compression = compression
+        self.max_shard_bytes = max_shard_bytes
+        self.max_buffer_rows = max_buffer_rows
+        self.shards = []
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.raw = None
+        self.stream = None
+        self.shard_rows = 0
+        self.shard_bytes = 0
+
+    def _shard_name(self, index: int, count: Optional[int] = None) -> str:
+        stem, ext = os.path.splitext(self.filename)
+        suffix = COMPRESSION_SUFFIXES[self.compression]
+        if count is None:
+            return f"{stem}-{index:05d}.partial{ext}{suffix}"
+        if count == 1:
+            return f"{self.filename}{suffix}"
+        return f"{stem}-{index:05d}-of-{count:05d}{ext}{suffix}"
+
+    def _open_shard(self):
+        path = self._shard_name(len(self.shards))
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.raw = _HashingFile(path)
+        self.stream = _compressing_stream(self.raw, self.compression)
+        self.shard_rows = 0
+        self.shard_bytes = 0
+
+    def _flush_buffer(self):
+        if not self.buffer:
+            return
+        if self.stream is None:
+            self._open_shard()
+        self.stream.write(b''.join(self.buffer))
+        self.shard_rows += len(self.buffer)
+        self.shard_bytes += self.buffer_bytes
+        self.buffer.clear()
+        self.buffer_bytes = 0
+
+    def _close_shard(self):
+        self._flush_buffer()
+        if self.stream is None:
+            return
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
+        self.shards.append({
+            'file': self._shard_name(len(self.shards)),
+            'rows': self.shard_rows,
+            'uncompressed_bytes': self.shard_bytes,
+            'bytes': self.raw.bytes,
+            'sha256': self.raw.sha256.hexdigest(),
+        })
+        self.stream = self.raw = None
+        self.shard_bytes = self.shard_rows = 0
+
+    def write(self, example: Dict):
+        """Queue one example, flushing the batch or starting a new shard as needed"""
+        self.write_line(encode_example(example))
+
+    def write_line(self, line: bytes):
+        """Queue one already encoded JSONL line (newline included)"""
+        filled = self.shard_bytes + self.buffer_bytes
+        if filled and filled + len(line) > self.max_shard_bytes:
+            self._close_shard()
+        self.buffer.append(line)
+        self.buffer_bytes += len(line)
+        if len(self.buffer) >= self.max_buffer_rows:
+            self._flush_buffer()
+
+    def write_all(self, examples: Iterable[Dict]):
+        for example in examples:
+            self.write(example)
+
+    def write_lines(self, lines: Iterable[bytes]):
+        for line in lines:
+            self.write_line(line)
+
+    def close(self, count_tokens: Optional[Callable[[str], int]] = None, metadata: Optional[Dict] = None) -> Dict:
+        """Finish the last shard, give shards their final names and write the manifest
+
+        count_tokens(path), if given, fills in each shard's token count, and
+        metadata adds top-level manifest fields. Returns the manifest.
+        """
+        self._close_shard()
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        single = self._shard_name(0, 1)
+        if len(self.shards) > 1 and os.path.exists(single):
+            os.remove(single)  # A stale single-file output would shadow the shards
+        for index, shard in enumerate(self.shards):
+            final = self._shard_name(index, len(self.shards))
+            os.replace(shard['file'], final)
+            shard['file'] = os.path.relpath(final, directory)
+            if count_tokens is not None:
+                shard['tokens'] = count_tokens(final)
+
+        manifest = {
+            'format': 'jsonl',
+            'compression': self.compression,
+            'rows': sum(shard['rows'] for shard in self.shards),
+            'shards': self.shards,
+        }
+        if count_tokens is not None:
+            manifest['tokens'] = sum(shard['tokens'] for shard in self.shards)
+        manifest.update(metadata or {})
+
+        write_manifest(self.filename, manifest)
+        return manifest
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            # Leave no half-written shards behind on failure
+            if self.stream is not None and self.stream is not self.raw:
+                self.stream.close()
+            if self.raw is not None:
+                self.raw.close()
+                self.shards.append({'file': self._shard_name(len(self.shards))})
+            for shard in self.shards:
+                if os.path.exists(shard['file']):
+                    os.remove(shard['file'])
+
+def write_sharded_jsonl(examples: Iterable[Dict], filename: str, compression: str = 'none',
+                        max_shard_bytes: int = MAX_SHARD_BYTES,
+                        count_tokens: Optional[Callable[[str], int]] = None) -> Dict:
+    """Write examples to sharded JSONL and return the manifest"""
+    return write_sharded_jsonl_lines(map(encode_example, examples), filename, compression, max_shard_bytes, count_tokens)
+
+def write_sharded_jsonl_lines(lines: Iterable[bytes], filename: str, compression: str = 'none',
+                              max_shard_bytes: int = MAX_SHARD_BYTES,
+                              count_tokens: Optional[Callable[[str], int]] = None,
+                              metadata: Optional[Dict] = None) -> Dict:
+    """Write already encoded JSONL lines to sharded JSONL and return the manifest"""
+    with ShardedJsonlWriter(filename, compression, max_shard_bytes) as writer:
+        writer.write_lines(lines)
+        return writer.close(count_tokens, metadata)
+
+def rewrite_jsonl(path: str, lines: Iterable[bytes]) -> Dict:
+    """Atomically replace a JSONL file (compressed by suffix) with lines
+
+    Returns the file's new manifest fields: rows, uncompressed_bytes, bytes
+    and sha256.
+    """
+    tmp_path = f"{path}.tmp"
+    raw = _HashingFile(tmp_path)
+    stream = _compressing_stream(raw, compression_of(path))
+    rows = uncompressed_bytes = 0
+    try:
+        for line in lines:
+            stream.write(line)
+            rows += 1
+            uncompressed_bytes += len(line)
+        if stream is not raw:
+            stream.close()
+        raw.close()
+    except BaseException:
+        raw.close()
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return {'rows': rows, 'uncompressed_bytes': uncompressed_bytes, 'bytes': raw.bytes, 'sha256': raw.sha256.hexdigest()}
+
+def shard_paths(manifest: Dict) -> List[str]:
+    """Shard paths from a manifest returned by read_manifest, in order"""
+    return [shard['path'] for shard in manifest['shards']]
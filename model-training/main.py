@@ -1,6 +1,134 @@
-def main():
-    print("Hello from model-training!")
+#!/usr/bin/env python3
+"""
+Steam Model Training CLI
+One entry point for preparing data, checking it and fine-tuning. Each
+subcommand imports only what it needs, so quick checks start instantly.
+"""
 
+import argparse
+import sys
+from typing import List, Optional
+
+DEFAULT_TRAINING_FILE = "steam_training_data.jsonl"
+
+def _client():
+    """OpenAI client, or exit if no API key is configured"""
+    from train_model import setup_openai_client
+    client = setup_openai_client()
+    if not client:
+        sys.exit(1)
+    return client
+
+def cmd_prepare(args: argparse.Namespace) -> int:
+    from prepare_training_data import main as prepare_main
+    return prepare_main(args.options)
+
+def cmd_search(args: argparse.Namespace) -> int:
+    from review_index import main as search_main
+    return search_main(args.options)
+
+def cmd_estimate(args: argparse.Namespace) -> int:
+    from train_model import DEFAULT_EPOCHS, estimate_cost
+    n_epochs = DEFAULT_EPOCHS if args.epochs is None else args.epochs
+    return 0 if estimate_cost(args.file, n_epochs) is not None else 1
+
+def cmd_validate(args: argparse.Namespace) -> int:
+    from train_model import validate_training_file
+    return 0 if validate_training_file(args.file, drop_invalid=args.drop_invalid, max_tokens=args.max_tokens) else 1
+
+def cmd_upload(args: argparse.Namespace) -> int:
+    from train_model import upload_training_files
+    return 0 if upload_training_files(_client(), args.file) else 1
+
+def cmd_train(args: argparse.Namespace) -> int:
+    from train_model import main as train_main
+    return train_main(args.options)
+
+def cmd_monitor(args: argparse.Namespace) -> int:
+    if len(args.job_ids) == 1:
+        from train_model import monitor_training
+        return 0 if monitor_training(_client(), args.job_ids[0]) else 1
+    
+    from job_monitor import monitor_jobs
+    client = _client()
+    jobs = monitor_jobs(args.job_ids, api_key=client.api_key, base_url=client.base_url)
+    for job_id, job in jobs.items():
+        print(f"{job_id}: {job.status} {job.fine_tuned_model or ''}")
+    return 0 if all(job.status == 'succeeded' for job in jobs.values()) else 1
+
+def _learning_rate(value: str) -> Optional[float]:
+    return None if value == 'auto' else float(value)
+
+def cmd_sweep(args: argparse.Namespace) -> int:
+    from sweep import run_sweep, sweep_grid
+    from train_model import training_files
+    shards = args.shards or training_files(DEFAULT_TRAINING_FILE)
+    if not shards:
+        print(f"❌ {DEFAULT_TRAINING_FILE} holds no training examples; nothing to sweep")
+        return 1
+    client = _client()
+    configs = sweep_grid(args.models, args.epochs, args.learning_rates, shards)
+    summary = run_sweep(configs, args.state, args.summary, args.max_active_jobs, args.requests_per_minute,
+                        api_key=client.api_key, base_url=client.base_url)
+    return 0 if all(run['status'] == 'succeeded' for run in summary['runs']) else 1
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(prog='main.py', description="Steam review fine-tuning pipeline")
+    commands = parser.add_subparsers(dest='command', required=True, metavar='command')
+
+    # prepare and train hand their options (including --help) straight to the underlying script
+    prepare = commands.add_parser('prepare', add_help=False, help="Build training data (options as for prepare_training_data.py)")
+    prepare.set_defaults(handler=cmd_prepare, passthrough=True)
+
+    search = commands.add_parser('search', add_help=False,
+                                 help="Top review snippets from the BM25 index (options as for review_index.py)")
+    search.set_defaults(handler=cmd_search, passthrough=True)
+
+    for name, handler, description in (
+        ('estimate', cmd_estimate, "Count training tokens and estimate the fine-tuning cost"),
+        ('validate', cmd_validate, "Check schema, role order, empty content and token limits before uploading"),
+        ('upload', cmd_upload, "Upload training data (every shard, when sharded) to OpenAI"),
+    ):
+        command = commands.add_parser(name, help=description)
+        command.add_argument('file', nargs='?', default=DEFAULT_TRAINING_FILE, help="Training JSONL file")
+        command.set_defaults(handler=handler)
+        if name == 'estimate':
+            command.add_argument('--epochs', type=int,
+                                 help="Epochs the cost covers, billed per epoch (default: as main.py train)")
+        if name == 'validate':
+            command.add_argument('--drop-invalid', action='store_true', help="Rewrite the file(s) without the bad examples")
+            command.add_argument('--max-tokens', type=int, default=65536, help="Per-example token limit")
+
+    train = commands.add_parser('train', add_help=False, help="Estimate, upload, fine-tune and monitor (options as for train_model.py)")
+    train.set_defaults(handler=cmd_train, passthrough=True)
+
+    monitor = commands.add_parser('monitor', help="Follow running fine-tuning jobs, streaming step/loss events")
+    monitor.add_argument('job_ids', nargs='+', metavar='job_id')
+    monitor.set_defaults(handler=cmd_monitor)
+
+    sweep = commands.add_parser('sweep', help="Fine-tune a grid of models, epochs, learning rates and shards concurrently")
+    sweep.add_argument('--models', nargs='+', default=["gpt-4o-mini-2024-07-18"])
+    sweep.add_argument('--epochs', nargs='+', type=int, default=[3])
+    sweep.add_argument('--learning-rates', nargs='+', type=_learning_rate, default=[None],
+                       help="Learning-rate multipliers ('auto' lets OpenAI choose)")
+    sweep.add_argument('--shards', nargs='+', help="Training files (default: every shard of steam_training_data.jsonl)")
+    sweep.add_argument('--max-active-jobs', type=int, default=4, help="Jobs submitted but not yet finished at once")
+    sweep.add_argument('--requests-per-minute', type=float, default=20, help="Upload / job-creation API calls per minute")
+    sweep.add_argument('--state', default='sweep_state.json', help="Resumable record of uploads and jobs")
+    sweep.add_argument('--summary', default='sweep_summary.json', help="Where model ids and metrics are written")
+    sweep.set_defaults(handler=cmd_sweep)
+
+    args, options = parser.parse_known_args(argv)
+    if options and not getattr(args, 'passthrough', False):
+        parser.error(f"unrecognized arguments: {' '.join(options)}")
+    args.options = options
+    return args
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main execution function"""
+    args = parse_args(argv)
+    return args.handler(args)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
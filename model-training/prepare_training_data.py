@@ -4,313 +4,678 @@ Steam Review Data Preparation for OpenAI Fine-tuning
 Selects 5K best Steam reviews and formats them for GPT-4o-mini training
 """
 
-import json
-import gzip
-import requests
-from datasets import load_dataset
-import pandas as pd
-from typing import List, Dict
+import hashlib
+import itertools
+import random
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import TYPE_CHECKING, List, Dict, Iterable, Iterator, Optional, Tuple, Union
 import os
+import argparse
+import dedup
+import example_templates
+import game_stats
+import review_batch
+import review_sampling
+import review_sources
+import text_diversity
+from checkpoints import run_stage, stage_key
+from dedup import duplicate_free_indices
+from example_templates import UNKNOWN_GAME_NAME, TrainingExamples, compile_templates
+from game_stats import aggregate_game_stats, write_game_stats
+from instrumentation import PROFILERS, Instrumentation, counted
+from jsonl_writer import COMPRESSION_SUFFIXES, MAX_SHARD_BYTES, encode_example, manifest_path, write_sharded_jsonl_lines
+from review_batch import ReviewBatch, rebatch_reviews
+from review_index import build_review_index
+from review_sources import (
+    HF_PREFIX, MIN_REVIEW_CHARS, POOLS, SCHEMA_ADAPTERS, read_review_sources, source_identity, stream_review_sources
+)
+from review_cache import (
+    DEFAULT_CACHE_DIR, load_or_build_review_cache, normalization_version
+)
+from review_sampling import StratifiedSample, stratum_ids
+from synthetic_reviews import generate_reviews
+from text_diversity import CHUNK_ROWS, idf_sample, select_farthest
+from token_counter import DEFAULT_EPOCHS, count_jsonl_tokens, estimate_training_cost, tokens_are_approximate
 
-def download_steam_reviews():
-    """Download Steam reviews dataset from HuggingFace"""
-    print("Downloading Steam reviews dataset...")
+if TYPE_CHECKING:
+    import pandas as pd
+
+DATASET_NAME = "ksang/steamreviews"
+SYNTHETIC_METADATA = {'synthetic': 'true'}  # Marks generated sample reviews and the outputs built from them
+
+# Key gaming concepts looked for in review text
+GAMING_KEYWORDS = {
+    'gameplay': ['gameplay', 'mechanics', 'controls', 'combat', 'strategy'],
+    'difficulty': ['easy', 'hard', 'challenging', 'difficult', 'steep learning curve', 'accessible'],
+    'replay_value': ['replay', 'replayability', 'hours', 'addictive', 'repetitive'],
+    'graphics': ['graphics', 'visuals', 'art style', 'beautiful', 'ugly'],
+    'story': ['story', 'narrative', 'plot', 'characters', 'writing'],
+    'multiplayer': ['multiplayer', 'online', 'co-op', 'pvp', 'community'],
+    'performance': ['bugs', 'crashes', 'optimization', 'smooth', 'laggy']
+}
+
+# Sentiment indicators
+POSITIVE_INDICATORS = ['great', 'amazing', 'excellent', 'love', 'recommend', 'fun', 'enjoyable']
+NEGATIVE_INDICATORS = ['bad', 'terrible', 'boring', 'frustrating', 'waste', 'disappointed']
+
+# Every boolean flag extracted per review, keyed by its column name
+INSIGHT_KEYWORDS = {
+    **GAMING_KEYWORDS,
+    'has_positive_language': POSITIVE_INDICATORS,
+    'has_negative_language': NEGATIVE_INDICATORS
+}
+
+def iter_steam_reviews(source: Optional[Union[str, List[str]]] = None, min_length: int = MIN_REVIEW_CHARS,
+                       revision: Optional[str] = None, schema: Optional[str] = None) -> Iterator[ReviewBatch]:
+    """Lazily yield normalized reviews as compact batches, dropping empty/short ones as they stream past
+
+    With no source the HuggingFace train split is streamed; otherwise
+    source names local shards or hf: datasets (see review_sources). Either
+    way reviews arrive a record batch at a time and stay columnar, so
+    memory stays flat however large the input is.
+    """
+    for batch in stream_review_sources(source_specs(source), schema, min_length, revision):
+        yield ReviewBatch.from_table(batch)
+
+def source_specs(source: Optional[Union[str, List[str]]] = None) -> List[str]:
+    """Source specs to read: the given ones, or the default HuggingFace dataset"""
+    if not source:
+        return [HF_PREFIX + DATASET_NAME]
+    return [source] if isinstance(source, str) else list(source)
+
+def load_review_table(source: Optional[Union[str, List[str]]] = None, min_length: int = MIN_REVIEW_CHARS,
+                      revision: Optional[str] = None, workers: Optional[int] = None, schema: Optional[str] = None,
+                      pool: str = 'thread') -> pa.Table:
+    """Read and normalize every review of every source as Arrow tables, never as per-review dicts
+
+    Local shards are parsed by Arrow's multithreaded readers, several at
+    once on a thread (or process) pool, and normalized by their schema
+    adapter; HuggingFace datasets are normalized by a batched datasets map.
+    """
+    return read_review_sources(source_specs(source), schema, min_length, revision, workers, pool)
+
+def download_steam_reviews(source: Optional[Union[str, List[str]]] = None, workers: Optional[int] = None,
+                           schema: Optional[str] = None, pool: str = 'thread') -> Optional[ReviewBatch]:
+    """Download Steam reviews dataset from HuggingFace (or read local review shards)
+
+    Only the default download falls back to sample data; an explicit source
+    that fails to load returns None, so fake reviews never stand in for it.
+    """
+    print("Downloading Steam reviews dataset..." if not source else f"Reading Steam reviews from {', '.join(source_specs(source))}...")
     
     try:
-        # Load the working dataset
-        dataset = load_dataset("ksang/steamreviews")
-        
-        reviews_data = []
-        
-        # Extract reviews from the dataset
-        if 'train' in dataset:
-            for item in dataset['train']:
-                if item.get('review_text') and len(item.get('review_text', '')) > 20:  # Filter out empty/short reviews
-                    reviews_data.append({
-                        'user_id': str(item.get('app_id', '')),  # Use app_id as identifier
-                        'game_id': item.get('app_id', ''),
-                        'game_name': item.get('app_name', ''),
-                        'review_text': item.get('review_text', ''),
-                        'recommend': item.get('review_score', 0) >= 1,  # 1 = positive, -1 = negative
-                        'helpful': item.get('review_votes', 0),
-                        'funny': 0,  # Not available in this dataset
-                        'hours': 0   # Not available in this dataset
-                    })
+        reviews_data = ReviewBatch.from_table(load_review_table(source, workers=workers, schema=schema, pool=pool))
         
         print(f"Loaded {len(reviews_data)} reviews")
         return reviews_data
         
     except Exception as e:
         print(f"Error loading dataset: {e}")
+        if source:
+            return None
         print("Falling back to sample data...")
         return create_sample_data()
 
-def create_sample_data():
-    """Create sample Steam review data for testing"""
-    print("Creating sample data for testing...")
-    
-    sample_reviews = [
-        {
-            'user_id': 'user1',
-            'game_id': 'game1',
-            'review_text': 'Amazing indie game with great pixel art and challenging gameplay. Spent over 50 hours exploring every corner. Highly recommend for platformer fans.',
-            'recommend': True,
-            'helpful': 15,
-            'funny': 2,
-            'hours': 52
-        },
-        {
-            'user_id': 'user2', 
-            'game_id': 'game2',
-            'review_text': 'Disappointing sequel. The story feels rushed and the graphics are outdated. Expected much more after waiting 5 years.',
-            'recommend': False,
-            'helpful': 8,
-            'funny': 0,
-            'hours': 12
-        },
-        # Add more sample reviews...
-    ]
-    
-    # Duplicate to simulate larger dataset
-    return sample_reviews * 1000
-
-def select_diverse_reviews(reviews_data: List[Dict], target_count: int = 1000) -> List[Dict]:
-    """Select diverse, high-quality reviews for gaming pattern analysis"""
-    print(f"Selecting {target_count} diverse reviews for gaming intelligence training...")
-    
-    df = pd.DataFrame(reviews_data)
-    
-    # Filter for substantive reviews
-    df = df[
-        (df['review_text'].str.len() >= 100) &  # Detailed reviews only
-        (df['review_text'].str.len() <= 1500) &  # Not too long
-        (df['helpful'] >= 1)  # At least some community validation
-    ]
+def review_source_identity(source: Optional[Union[str, List[str]]] = None, revision: Optional[str] = None,
+                           schema: Optional[str] = None) -> Tuple[str, str]:
+    """(dataset, revision) naming exactly which raw reviews a source yields, and through which adapter"""
+    dataset, revision = source_identity(source_specs(source), revision)
+    return (f"{dataset} [{schema}]" if schema else dataset), revision
+
+def load_cached_reviews(source: Optional[Union[str, List[str]]] = None, revision: Optional[str] = None,
+                        cache_dir: str = DEFAULT_CACHE_DIR, workers: Optional[int] = None,
+                        schema: Optional[str] = None, pool: str = 'thread') -> Optional[ReviewBatch]:
+    """Load normalized reviews from the columnar cache, building it on first use
+
+    The cache is keyed by dataset (or local shards), revision and a
+    fingerprint of the normalization code, so editing a schema adapter
+    invalidates it.
+    """
+    dataset, resolved = review_source_identity(source, revision, schema)
+    version = normalization_version(*LOAD_STAGE_CODE)
+    
+    table = load_or_build_review_cache(
+        dataset, resolved, version,
+        build=lambda: load_review_table(source, revision=revision if source else resolved, workers=workers, schema=schema, pool=pool),
+        cache_dir=cache_dir
+    )
+    if table is not None:
+        print(f"Loaded {table.num_rows} reviews")
+        return ReviewBatch.from_table(table)
+    return None
+
+def create_sample_data(count: int = 2000, seed: int = 0) -> ReviewBatch:
+    """Create realistic synthetic Steam review data for testing (see synthetic_reviews.py)
+
+    The batch's schema metadata marks it synthetic (see is_synthetic), so
+    outputs built from it can say so.
+    """
+    print("⚠️ Using GENERATED sample reviews, not real Steam reviews: training data, game stats and the index "
+          "built from them are for testing only")
+    reviews = ReviewBatch.from_table(pa.Table.from_batches(list(generate_reviews(count, seed))))
+    return ReviewBatch(reviews.table.replace_schema_metadata(SYNTHETIC_METADATA))
+
+def is_synthetic(reviews_data: Optional[ReviewBatch]) -> bool:
+    """Whether reviews came from create_sample_data rather than a real dataset"""
+    metadata = reviews_data.table.schema.metadata if isinstance(reviews_data, ReviewBatch) else None
+    return bool(metadata) and metadata.get(b'synthetic') == b'true'
+
+def substantive_mask(reviews_data: ReviewBatch) -> np.ndarray:
+    """Substantive = detailed but not too long, with some community validation"""
+    lengths = reviews_data.column('review_length')
+    mask = pc.and_(pc.and_(pc.greater_equal(lengths, 100), pc.less_equal(lengths, 1500)),
+                   pc.greater_equal(reviews_data.column('helpful'), 1))
+    return pc.fill_null(mask, False).to_numpy()
+
+def substantive_reviews(reviews_data: ReviewBatch) -> ReviewBatch:
+    """Keep only substantive reviews"""
+    return reviews_data.filter(substantive_mask(reviews_data))
+
+LENGTH_CATEGORIES = ['medium', 'long', 'detailed']
+
+def length_categories(reviews_data: ReviewBatch) -> np.ndarray:
+    """Equal-width length bucket (index into LENGTH_CATEGORIES) over the substantive 100-1500 character range"""
+    return np.minimum((reviews_data.numpy('review_length') - 100) * 3 // 1401, 2)
+
+SENTIMENTS = ('positive', 'negative')
+
+def sentiments_of(reviews_data: ReviewBatch) -> np.ndarray:
+    return np.where(reviews_data.numpy('recommend'), 'positive', 'negative')
+
+def game_codes(reviews_data: ReviewBatch) -> np.ndarray:
+    """game_id as int64, with reviews of no known game sharing one code"""
+    games = reviews_data.column('game_id').cast(pa.int64())
+    return pc.fill_null(games, np.iinfo(np.int64).min).to_numpy()
+
+def select_by_text(reviews_data: Union[ReviewBatch, Iterable[ReviewBatch]], target_count: int = 1000, seed: int = 0,
+                   workers: Optional[int] = None) -> ReviewBatch:
+    """Select substantive reviews whose text (and game) differ the most, half per sentiment
+
+    Reviews become hashed TF-IDF sketches and each sentiment's half is a
+    farthest-point sample over them (see text_diversity). A loaded batch is
+    cut into chunks of CHUNK_ROWS candidates with IDF fitted on an even
+    sample of them; a stream is read in batches with IDF fitted on its
+    first batch.
+    """
+    rng = random.Random(seed)
+    quota = target_count // 2
+    if isinstance(reviews_data, ReviewBatch):
+        # Candidates are taken a chunk at a time, so they are never copied all at once
+        rows = np.flatnonzero(substantive_mask(reviews_data))
+        sentiments = sentiments_of(reviews_data)[rows]
+        idf = idf_sample(reviews_data, rows)
+        group_rows = {sentiment: int((sentiments == sentiment).sum()) for sentiment in SENTIMENTS}
+        chunks = ((reviews_data.take(rows[start:start + CHUNK_ROWS]), sentiments[start:start + CHUNK_ROWS])
+                  for start in range(0, len(rows), CHUNK_ROWS))
+    else:
+        batches = (substantive_reviews(batch) for batch in rebatch_reviews(reviews_data, CHUNK_ROWS))
+        first = next(batches, None)
+        if first is None:
+            return ReviewBatch.empty()
+        idf = idf_sample(first)
+        group_rows = None
+        chunks = ((batch, sentiments_of(batch)) for batch in itertools.chain([first], batches))
     
-    # Create diversity categories for better training coverage
-    df['review_length_category'] = pd.cut(df['review_text'].str.len(), bins=3, labels=['medium', 'long', 'detailed'])
-    df['sentiment'] = df['recommend'].map({True: 'positive', False: 'negative'})
+    selected = select_farthest(chunks, {sentiment: quota for sentiment in SENTIMENTS}, idf, seed, workers, group_rows)
     
-    # Sample diverse reviews across categories
-    diverse_reviews = []
+    # Combine and shuffle
+    combined = ReviewBatch(pa.concat_tables([selected[sentiment].table for sentiment in SENTIMENTS],
+                                            promote_options='permissive'))
+    order = list(range(len(combined)))
+    rng.shuffle(order)
+    
+    print(f"Selected {len(combined)} diverse reviews")
+    print(f"Positive: {len(selected['positive'])}, Negative: {len(selected['negative'])}")
+    return combined.take(order[:target_count])
+
+def select_diverse_reviews(reviews_data: Union[ReviewBatch, Iterable[ReviewBatch]], target_count: int = 1000,
+                           seed: int = 0, stratify_length: bool = False, stratify_game: bool = False,
+                           max_per_game: Optional[int] = None, diversity: str = 'random',
+                           workers: Optional[int] = None) -> ReviewBatch:
+    """Select diverse, high-quality reviews for gaming pattern analysis
+
+    reviews_data may be a loaded ReviewBatch or a lazy stream of them (see
+    iter_steam_reviews). It is read once through a StratifiedSample: half
+    the target per sentiment, optionally spread evenly over length buckets
+    and games, which are drawn from in a seeded random order. With
+    stratify_game each game keeps at most max_per_game reviews per
+    sentiment (default: 1/50th of the sentiment's share). Strata are
+    computed column-wise and sampled reviews stay columnar, so memory
+    never depends on the corpus size.
+    With diversity='text' each half is picked by select_by_text instead.
+    """
+    print(f"Selecting {target_count} diverse reviews for gaming intelligence training...")
     
-    # Get balanced sentiment
-    positive_reviews = df[df['sentiment'] == 'positive'].sample(min(target_count//2, len(df[df['sentiment'] == 'positive'])))
-    negative_reviews = df[df['sentiment'] == 'negative'].sample(min(target_count//2, len(df[df['sentiment'] == 'negative'])))
+    if diversity == 'text':
+        return select_by_text(reviews_data, target_count, seed, workers)
+    
+    rng = random.Random(seed)
+    quota = target_count // 2
+    per_game = max_per_game or max(1, quota // 50)
+    # Past quota games per sentiment, even one review of each fills the share, so no more games are kept
+    sample = StratifiedSample(per_game if stratify_game else quota, seed, max_strata=quota if stratify_game else None)
+    for batch in ([reviews_data] if isinstance(reviews_data, ReviewBatch) else reviews_data):
+        rows = np.flatnonzero(substantive_mask(batch))
+        recommend = batch.numpy('recommend')[rows]
+        keys = [recommend]  # Each sentiment draws its games in its own order
+        if stratify_length:
+            keys.append(length_categories(batch)[rows])
+        if stratify_game:
+            keys.append(game_codes(batch)[rows])
+        sample.add(batch, rows, recommend, stratum_ids(len(rows), seed, *keys))
+    
+    # Get balanced sentiment, spread evenly across the finer strata
+    selected = {sentiment: sample.take(int(sentiment == 'positive'), quota) for sentiment in SENTIMENTS}
     
     # Combine and shuffle
-    selected_df = pd.concat([positive_reviews, negative_reviews]).sample(frac=1).head(target_count)
+    combined = ReviewBatch(pa.concat_tables([selected[sentiment].table for sentiment in SENTIMENTS],
+                                            promote_options='permissive'))
+    order = list(range(len(combined)))
+    rng.shuffle(order)
     
-    print(f"Selected {len(selected_df)} diverse reviews")
-    print(f"Positive: {len(selected_df[selected_df['sentiment'] == 'positive'])}, Negative: {len(selected_df[selected_df['sentiment'] == 'negative'])}")
+    print(f"Selected {min(len(combined), target_count)} diverse reviews")
+    print(f"Positive: {len(selected['positive'])}, Negative: {len(selected['negative'])}")
     
-    return selected_df.to_dict('records')
+    return combined.take(order[:target_count])
+
+SYSTEM_PROMPT = ("You are an expert gaming advisor who helps users understand games and make informed decisions. "
+                 "You analyze gaming patterns, terminology, and player feedback to provide helpful insights.")
 
-def format_for_gaming_intelligence(reviews: List[Dict]) -> List[Dict]:
-    """Format reviews to teach gaming analysis patterns and terminology"""
+# Gaming analysis patterns to teach, compiled once (see example_templates.ExampleTemplates)
+TRAINING_TEMPLATES = [
+    {
+        "name": "quality_signals",
+        "when": {"recommend": True},
+        "questions": [
+            "What should I look for in game reviews to identify quality?",
+            "How can I tell if a game is worth buying from reviews?",
+            "What are red flags in game reviews I should avoid?"
+        ],
+        "aspects": [("gameplay", "solid gameplay mechanics"), ("graphics", "good visual presentation"),
+                    ("story", "engaging narrative")],
+        "max_aspects": 2,
+        "response": "Look for reviews that mention {aspects}. For example, when players say things like '{sample_text}', it usually indicates a quality experience."
+    },
+    {
+        "name": "red_flags",
+        "when": {"recommend": False},
+        "questions": ["What are red flags in game reviews I should avoid?"],
+        "aspects": [("performance", "technical issues"), ("has_negative_language", "player frustration")],
+        "response": "Watch out for reviews mentioning {aspects}. When players write things like '{sample_text}', it often signals potential problems."
+    },
+    {
+        "name": "recommendation_matching",
+        "when": {"recommend": True},
+        "questions": ["I like {aspects}, what type of games should I look for?"],
+        "aspects": [("gameplay", "engaging gameplay"), ("replay_value", "high replay value"), ("story", "good storytelling")],
+        "max_aspects": 2,
+        "response": "Based on player feedback, look for games where reviewers specifically mention {aspects}. Games like {game_name} get positive reviews when players say things like '{sample_text}'"
+    },
+    {
+        "name": "gaming_terminology",
+        "questions": ["What does it mean when reviewers say a game is '{key_phrase}'?"],
+        "phrases": {
+            "addictive": "When players call a game 'addictive', they mean it has compelling gameplay loops that keep you coming back. As one player put it: '{sample_text}'",
+            "steep learning curve": "A 'steep learning curve' means the game is challenging to master initially. Players often mention this when describing complex games: '{sample_text}'",
+            "replay value": "The term '{key_phrase}' in gaming reviews typically refers to how much long-term enjoyment a game provides. Here's how one player described it: '{sample_text}'"
+        }
+    }
+]
+EXAMPLE_TEMPLATES = compile_templates(TRAINING_TEMPLATES, SYSTEM_PROMPT)
+
+def review_rng(review: Dict, seed: int = 0) -> random.Random:
+    """Random generator seeded from the review itself, so choices don't depend on run or worker"""
+    key = f"{seed}\0{review.get('user_id', '')}\0{review.get('game_id', '')}\0{review['review_text']}"
+    return random.Random(int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], 'big'))
+
+def sample_text(text: str) -> str:
+    """The excerpt of a review quoted in answers"""
+    return text[:200] + "..." if len(text) > 200 else text
+
+def _format_chunk(reviews: ReviewBatch, seed: int = 0) -> TrainingExamples:
+    """Create training examples for one chunk of reviews, in review order"""
+    texts = reviews.pylist('review_text')
+    user_ids = reviews.pylist('user_id')
+    game_ids = reviews.pylist('game_id')
+    
+    # Tag every review's aspects and sentiment in one batch pass
+    flags = extract_gaming_insights_batch(texts, workers=1)
+    columns = {column: flags[column].to_numpy() for column in INSIGHT_PATTERNS}
+    columns['recommend'] = np.asarray(reviews.numpy('recommend'), dtype=bool)
+    
+    def rng_of(row: int) -> random.Random:
+        return review_rng({'user_id': user_ids[row], 'game_id': game_ids[row], 'review_text': texts[row]}, seed)
+    
+    # Several training examples per review, one per template that applies
+    return EXAMPLE_TEMPLATES.render(columns, [sample_text(text) for text in texts], reviews.pylist('game_name'), rng_of)
+
+def format_for_gaming_intelligence(reviews: ReviewBatch, workers: int = 1, chunk_size: int = 2000,
+                                   seed: int = 0) -> TrainingExamples:
+    """Format reviews to teach gaming analysis patterns and terminology
+
+    With workers > 1 the reviews are split into chunks formatted in separate
+    processes. Every random choice comes from a per-review seed, so the
+    output is identical whatever the worker count.
+    """
     print("Creating gaming intelligence training examples...")
     
-    training_data = []
-    
-    # Gaming analysis patterns to teach
-    patterns = [
-        {
-            "user_pattern": "analyze_game_quality",
-            "questions": [
-                "What should I look for in game reviews to identify quality?",
-                "How can I tell if a game is worth buying from reviews?",
-                "What are red flags in game reviews I should avoid?"
-            ]
-        },
-        {
-            "user_pattern": "recommendation_matching", 
-            "questions": [
-                "I like {positive_aspects}, what type of games should I look for?",
-                "What games would suit someone who enjoys {positive_aspects}?",
-                "I'm looking for games that are {positive_aspects}"
-            ]
-        },
-        {
-            "user_pattern": "gaming_terminology",
-            "questions": [
-                "What does it mean when reviewers say a game is {key_phrase}?",
-                "Explain this gaming term: {key_phrase}",
-                "What should I expect from games described as {key_phrase}?"
-            ]
-        }
-    ]
+    # Slices are zero-copy here and pickle only their own rows for worker processes
+    chunks = [reviews.slice(start, chunk_size) for start in range(0, len(reviews), chunk_size)]
     
-    for review in reviews:
-        # Extract gaming insights from each review
-        insights = extract_gaming_insights(review)
-        
-        # Create multiple training examples per review
-        for pattern in patterns:
-            example = create_training_example(review, insights, pattern)
-            if example:
-                training_data.append(example)
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            training_data = TrainingExamples.concat(list(executor.map(_format_chunk, chunks, [seed] * len(chunks))))
+    else:
+        training_data = TrainingExamples.concat([_format_chunk(chunk, seed) for chunk in chunks])
     
     print(f"Created {len(training_data)} gaming intelligence examples")
     return training_data
 
-def extract_gaming_insights(review: Dict) -> Dict:
-    """Extract key gaming concepts and patterns from a review"""
-    text = review['review_text'].lower()
-    game_name = review.get('game_name', 'this game')
-    recommend = review['recommend']
-    
-    # Extract key gaming concepts mentioned
-    gaming_keywords = {
-        'gameplay': ['gameplay', 'mechanics', 'controls', 'combat', 'strategy'],
-        'difficulty': ['easy', 'hard', 'challenging', 'difficult', 'steep learning curve', 'accessible'],
-        'replay_value': ['replay', 'replayability', 'hours', 'addictive', 'repetitive'],
-        'graphics': ['graphics', 'visuals', 'art style', 'beautiful', 'ugly'],
-        'story': ['story', 'narrative', 'plot', 'characters', 'writing'],
-        'multiplayer': ['multiplayer', 'online', 'co-op', 'pvp', 'community'],
-        'performance': ['bugs', 'crashes', 'optimization', 'smooth', 'laggy']
-    }
-    
-    mentioned_aspects = {}
-    for category, keywords in gaming_keywords.items():
-        mentioned_aspects[category] = any(keyword in text for keyword in keywords)
-    
-    # Extract sentiment indicators
-    positive_indicators = ['great', 'amazing', 'excellent', 'love', 'recommend', 'fun', 'enjoyable']
-    negative_indicators = ['bad', 'terrible', 'boring', 'frustrating', 'waste', 'disappointed']
-    
+def _any_keyword_regex(keywords: List[str]) -> str:
+    """Alternation that matches wherever any of the keywords occurs as a substring"""
+    return '|'.join(re.escape(keyword) for keyword in keywords)
+
+# Column -> regex for the batch extractor; a match anywhere is exactly any(keyword in text)
+INSIGHT_PATTERNS = {column: _any_keyword_regex(keywords) for column, keywords in INSIGHT_KEYWORDS.items()}
+
+def _tag_chunk(texts: pa.Array) -> Dict[str, np.ndarray]:
+    """Run every insight pattern over one chunk of lowercased texts"""
     return {
-        'game_name': game_name,
-        'recommend': recommend,
-        'mentioned_aspects': mentioned_aspects,
-        'has_positive_language': any(word in text for word in positive_indicators),
-        'has_negative_language': any(word in text for word in negative_indicators),
-        'review_length': len(review['review_text']),
-        'sample_text': review['review_text'][:200] + "..." if len(review['review_text']) > 200 else review['review_text']
+        column: pc.match_substring_regex(texts, pattern).to_numpy(zero_copy_only=False)
+        for column, pattern in INSIGHT_PATTERNS.items()
     }
 
-def create_training_example(review: Dict, insights: Dict, pattern: Dict) -> Dict:
-    """Create a training example based on gaming intelligence patterns"""
-    import random
-    
-    system_message = {
-        "role": "system",
-        "content": "You are an expert gaming advisor who helps users understand games and make informed decisions. You analyze gaming patterns, terminology, and player feedback to provide helpful insights."
-    }
-    
-    if pattern["user_pattern"] == "analyze_game_quality":
-        if insights['recommend']:
-            question = random.choice(pattern["questions"])
-            positive_aspects = []
-            if insights['mentioned_aspects']['gameplay']: positive_aspects.append("solid gameplay mechanics")
-            if insights['mentioned_aspects']['graphics']: positive_aspects.append("good visual presentation")
-            if insights['mentioned_aspects']['story']: positive_aspects.append("engaging narrative")
-            
-            if positive_aspects:
-                response = f"Look for reviews that mention {', '.join(positive_aspects[:2])}. For example, when players say things like '{insights['sample_text']}', it usually indicates a quality experience."
-            else:
-                return None
-        else:
-            question = "What are red flags in game reviews I should avoid?"
-            negative_aspects = []
-            if insights['mentioned_aspects']['performance']: negative_aspects.append("technical issues")
-            if insights['has_negative_language']: negative_aspects.append("player frustration")
-            
-            if negative_aspects:
-                response = f"Watch out for reviews mentioning {', '.join(negative_aspects)}. When players write things like '{insights['sample_text']}', it often signals potential problems."
-            else:
-                return None
-    
-    elif pattern["user_pattern"] == "recommendation_matching":
-        if not insights['recommend']:
-            return None
-            
-        positive_aspects = []
-        if insights['mentioned_aspects']['gameplay']: positive_aspects.append("engaging gameplay")
-        if insights['mentioned_aspects']['replay_value']: positive_aspects.append("high replay value")
-        if insights['mentioned_aspects']['story']: positive_aspects.append("good storytelling")
-        
-        if not positive_aspects:
-            return None
-            
-        question = f"I like {', '.join(positive_aspects[:2])}, what type of games should I look for?"
-        response = f"Based on player feedback, look for games where reviewers specifically mention {', '.join(positive_aspects[:2])}. Games like {insights['game_name']} get positive reviews when players say things like '{insights['sample_text']}'"
-    
-    elif pattern["user_pattern"] == "gaming_terminology":
-        # Extract a key phrase from the review for terminology explanation
-        key_phrases = []
-        if 'addictive' in insights['sample_text'].lower(): key_phrases.append('addictive')
-        if 'steep learning curve' in insights['sample_text'].lower(): key_phrases.append('steep learning curve')
-        if 'replay value' in insights['sample_text'].lower(): key_phrases.append('replay value')
-        
-        if not key_phrases:
-            return None
-            
-        key_phrase = random.choice(key_phrases)
-        question = f"What does it mean when reviewers say a game is '{key_phrase}'?"
-        
-        if key_phrase == 'addictive':
-            response = f"When players call a game 'addictive', they mean it has compelling gameplay loops that keep you coming back. As one player put it: '{insights['sample_text']}'"
-        elif key_phrase == 'steep learning curve':
-            response = f"A 'steep learning curve' means the game is challenging to master initially. Players often mention this when describing complex games: '{insights['sample_text']}'"
-        else:
-            response = f"The term '{key_phrase}' in gaming reviews typically refers to how much long-term enjoyment a game provides. Here's how one player described it: '{insights['sample_text']}'"
-    
-    else:
-        return None
-    
+def extract_gaming_insights_batch(texts: Iterable[str], chunk_size: int = 100_000,
+                                  workers: Optional[int] = None) -> "pd.DataFrame":
+    """Tag a whole column of review texts with aspect and sentiment flags at once
+
+    Returns one boolean column per INSIGHT_KEYWORDS entry with the same
+    semantics as extract_gaming_insights: texts are lowercased with Python's
+    str.lower, then scanned by Arrow's compiled regex kernels. Those release
+    the GIL, so chunks are spread over a thread pool.
+    """
+    import pandas as pd
+    
+    lowered = pd.Series(texts, dtype=object).fillna('').str.lower()
+    values = lowered.to_numpy()
+    chunks = [pa.array(values[start:start + chunk_size], type=pa.string())
+              for start in range(0, len(values), chunk_size)]
+    
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        tagged = list(executor.map(_tag_chunk, chunks))
+    
+    return pd.DataFrame({
+        column: np.concatenate([chunk[column] for chunk in tagged]) if tagged else np.zeros(0, dtype=bool)
+        for column in INSIGHT_PATTERNS
+    }, index=lowered.index)
+
+def build_insights(review: Dict, flags: Dict[str, bool]) -> Dict:
+    """Assemble the insights dict for a review from its keyword flags"""
     return {
-        "messages": [
-            system_message,
-            {"role": "user", "content": question},
-            {"role": "assistant", "content": response}
-        ]
+        'game_name': (review.get('game_name') or '').strip() or UNKNOWN_GAME_NAME,
+        'recommend': review['recommend'],
+        'mentioned_aspects': {category: bool(flags[category]) for category in GAMING_KEYWORDS},
+        'has_positive_language': bool(flags['has_positive_language']),
+        'has_negative_language': bool(flags['has_negative_language']),
+        'review_length': len(review['review_text']),
+        'sample_text': sample_text(review['review_text'])
     }
 
-def save_training_data(training_data: List[Dict], filename: str = "steam_training_data.jsonl"):
-    """Save training data in JSONL format for OpenAI"""
+def extract_gaming_insights(review: Dict) -> Dict:
+    """Extract key gaming concepts and patterns from a review"""
+    text = review['review_text'].lower()
+    flags = {column: any(keyword in text for keyword in keywords) for column, keywords in INSIGHT_KEYWORDS.items()}
+    return build_insights(review, flags)
+
+def insight_flags(reviews: ReviewBatch, chunk_rows: int = 100_000, workers: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """Every INSIGHT_KEYWORDS flag of every review, tagged chunk_rows reviews at a time"""
+    flags = {column: np.zeros(len(reviews), dtype=bool) for column in INSIGHT_KEYWORDS}
+    for start in range(0, len(reviews), chunk_rows):
+        tagged = extract_gaming_insights_batch(reviews.slice(start, chunk_rows).pylist('review_text'), workers=workers)
+        for column, values in flags.items():
+            values[start:start + len(tagged)] = tagged[column].to_numpy()
+    return flags
+
+def game_aspect_stats(reviews: ReviewBatch, workers: Optional[int] = None) -> pa.Table:
+    """Per-game review count, positive ratio, aspect and sentiment mention rates and mean helpful votes"""
+    print(f"Aggregating aspect statistics of {len(reviews)} reviews per game...")
+    stats = aggregate_game_stats(reviews, insight_flags(reviews, workers=workers), list(GAMING_KEYWORDS))
+    print(f"Aggregated {stats.num_rows} games")
+    return stats
+
+def index_reviews(reviews: ReviewBatch, path: str, workers: Optional[int] = None) -> Dict:
+    """Build the BM25 snippet index (review_index.py) over reviews, keyed by game and aspect"""
+    print(f"Indexing {len(reviews)} reviews for retrieval...")
+    flags = extract_gaming_insights_batch(reviews.pylist('review_text'), workers=workers)
+    meta = build_review_index(reviews, {aspect: flags[aspect].to_numpy() for aspect in GAMING_KEYWORDS}, path)
+    print(f"Indexed {meta['reviews']} reviews ({meta['terms']:,} terms, {len(meta['games'])} games) at {path}")
+    return meta
+
+def save_training_data(training_data: Union[TrainingExamples, Iterable[Dict]], filename: str = "steam_training_data.jsonl",
+                       compression: str = 'none', max_shard_bytes: int = MAX_SHARD_BYTES, synthetic: bool = False) -> Dict:
+    """Save training data as JSONL shards for OpenAI, with a manifest alongside
+
+    The manifest records whether the examples came from synthetic reviews
+    and whether its token counts are approximate (no BPE tokenizer).
+    """
     print(f"Saving training data to {filename}...")
     
-    with open(filename, 'w', encoding='utf-8') as f:
-        for example in training_data:
-            f.write(json.dumps(example, ensure_ascii=False) + '\n')
-    
-    print(f"Saved {len(training_data)} examples to {filename}")
-    
-    # Calculate approximate cost
-    total_tokens = sum(
-        len(json.dumps(example).split()) * 1.3  # Rough token estimation
-        for example in training_data
-    )
-    
-    cost_estimate = (total_tokens / 1000) * 0.025  # GPT-4o-mini training cost
-    print(f"Estimated training cost: ${cost_estimate:.2f}")
+    # Compiled examples encode their shared system prompt and questions once
+    if isinstance(training_data, TrainingExamples):
+        lines = training_data.jsonl_lines()
+    else:
+        lines = map(encode_example, training_data)
+    # Token counts per shard also warm the cache estimate_cost reads
+    manifest = write_sharded_jsonl_lines(lines, filename, compression, max_shard_bytes,
+                                         count_tokens=count_jsonl_tokens,
+                                         metadata={'synthetic': synthetic, 'tokens_approximate': tokens_are_approximate()})
+    
+    for shard in manifest['shards']:
+        print(f"  {shard['file']}: {shard['rows']} examples, {shard['bytes'] / 1024 / 1024:.1f} MB, {shard['tokens']:,} tokens")
+    print(f"Saved {manifest['rows']} examples in {len(manifest['shards'])} shard(s); manifest at {manifest_path(filename)}")
+    
+    total_tokens = manifest['tokens']
+    cost_estimate = estimate_training_cost(total_tokens, DEFAULT_EPOCHS)
+    approximate = '~' if manifest['tokens_approximate'] else ''
+    print(f"Training tokens: {approximate}{total_tokens:,}" + (" (approximate: no BPE tokenizer)" if approximate else ''))
+    print(f"Estimated training cost: {approximate}${cost_estimate:.2f} ({DEFAULT_EPOCHS} epochs)")
+    return manifest
+
+# Code each checkpointed stage depends on; editing any of it re-runs that stage and everything after it
+LOAD_STAGE_CODE = (source_specs, load_review_table, review_sources)
+STREAM_STAGE_CODE = (iter_steam_reviews, *LOAD_STAGE_CODE)
+GAME_STATS_STAGE_CODE = (
+    game_aspect_stats, insight_flags, extract_gaming_insights_batch, _tag_chunk, _any_keyword_regex, INSIGHT_KEYWORDS,
+    GAMING_KEYWORDS, review_batch, game_stats
+)
+DEDUP_STAGE_CODE = (substantive_reviews, substantive_mask, review_batch, dedup)
+SELECT_STAGE_CODE = (
+    select_diverse_reviews, select_by_text, sentiments_of, game_codes, substantive_mask, length_categories, LENGTH_CATEGORIES,
+    review_batch, review_sampling, text_diversity, dedup
+)
+FORMAT_STAGE_CODE = (
+    format_for_gaming_intelligence, _format_chunk, sample_text, review_rng, extract_gaming_insights_batch, _tag_chunk,
+    _any_keyword_regex, TRAINING_TEMPLATES, SYSTEM_PROMPT, example_templates, INSIGHT_KEYWORDS
+)
 
-def main():
-    """Main execution function"""
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Prepare Steam review fine-tuning data")
+    parser.add_argument('--source', nargs='+',
+                        help="Review sources to read and union instead of HuggingFace: local JSONL/Parquet/CSV files "
+                             "(optionally .gz/.bz2/.zst), directories or globs of shards, or hf:<dataset>")
+    parser.add_argument('--schema', choices=sorted(SCHEMA_ADAPTERS),
+                        help="Schema adapter for every source (default: detected per shard from its columns)")
+    parser.add_argument('--source-pool', choices=POOLS, default='thread',
+                        help="Read shards on threads (Arrow releases the GIL) or processes; --stream reads them in turn")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream reviews straight into selection instead of loading them all first")
+    parser.add_argument('--revision', help="HuggingFace dataset revision to pin (default: latest)")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Where normalized review caches live")
+    parser.add_argument('--no-cache', action='store_true', help="Skip the normalized review cache")
+    parser.add_argument('--no-checkpoints', action='store_true',
+                        help="Recompute every stage instead of reusing checkpointed dedup/select/format output")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Workers used to read review shards and processes used to format training examples")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for review sampling and every per-review random choice")
+    parser.add_argument('--stratify-length', action='store_true', help="Balance selected reviews across length buckets")
+    parser.add_argument('--stratify-game', action='store_true', help="Spread selected reviews across games")
+    parser.add_argument('--diversity', choices=['random', 'text'], default='random',
+                        help="Pick each sentiment's half by seeded random sampling, or as the reviews farthest apart "
+                             "in hashed TF-IDF space (spreads phrasing and games)")
+    parser.add_argument('--output', default="steam_training_data.jsonl", help="Training data file name")
+    parser.add_argument('--compression', choices=list(COMPRESSION_SUFFIXES), default='none',
+                        help="Compress output shards (OpenAI uploads need 'none')")
+    parser.add_argument('--max-shard-mb', type=float, default=MAX_SHARD_BYTES / 1024 / 1024,
+                        help="Start a new output shard past this many uncompressed MB")
+    parser.add_argument('--game-stats', default='game_stats.arrow',
+                        help="Arrow file for per-game aspect statistics over the whole corpus ('' to skip)")
+    parser.add_argument('--index', default='review_index',
+                        help="Directory for the BM25 snippet index over the selected reviews ('' to skip)")
+    parser.add_argument('--report', default='prepare_report.json',
+                        help="Where to write per-stage timings, throughput and memory as JSON ('' to skip)")
+    parser.add_argument('--profile', choices=PROFILERS, help="Also profile every stage with cProfile or a stack sampler")
+    parser.add_argument('--profile-dir', default='profiles', help="Where per-stage profiles are written")
+    parser.add_argument('--no-dedup', action='store_true', help="Keep exact and near-duplicate reviews")
+    parser.add_argument('--dedup-threshold', type=float, default=0.8,
+                        help="Estimated word-shingle Jaccard similarity at which two reviews count as duplicates")
+    args = parser.parse_args(argv)
+    if args.diversity == 'text' and (args.stratify_length or args.stratify_game):
+        parser.error("--stratify-length and --stratify-game only apply to --diversity random")
+    return args
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main execution function; exits non-zero when the reviews cannot be loaded"""
+    args = parse_args(argv)
+    
     print("🎮 Steam Review Training Data Preparation")
     print("=" * 50)
     
-    # Step 1: Download reviews
-    reviews_data = download_steam_reviews()
-    
-    if not reviews_data:
-        print("❌ Failed to load review data")
-        return
+    instrumentation = Instrumentation('prepare', profiler=args.profile, profile_dir=args.profile_dir)
+    checkpoint_dir = None if args.no_checkpoints else os.path.join(args.cache_dir, 'checkpoints')
+    reviews_key = None
+    synthetic = False  # Only the full load can fall back to generated sample reviews
+    
+    # Step 1: Download reviews (or open a lazy stream over them)
+    if args.stream:
+        reviews_data = iter_steam_reviews(args.source, revision=args.revision, schema=args.schema)
+        if checkpoint_dir:
+            reviews_key = stage_key('load', '', *review_source_identity(args.source, args.revision, args.schema),
+                                    *STREAM_STAGE_CODE)
+        if not args.no_dedup:
+            print("Skipping duplicate removal: it needs the whole corpus, which --stream never holds")
+        if args.game_stats:
+            print("Skipping per-game statistics: they need the whole corpus, which --stream never holds")
+    else:
+        with instrumentation.stage('load') as record:
+            reviews_data = None
+            if not args.no_cache:
+                try:
+                    reviews_data = load_cached_reviews(args.source, args.revision, args.cache_dir, args.workers,
+                                                       args.schema, args.source_pool)
+                    if reviews_data is not None and checkpoint_dir:
+                        reviews_key = stage_key('load', '', *review_source_identity(args.source, args.revision, args.schema),
+                                                *LOAD_STAGE_CODE)
+                except Exception as e:
+                    print(f"Error loading cached reviews: {e}")
+            if reviews_data is None:
+                # May fall back to sample data, so nothing downstream of it is checkpointed
+                reviews_data = download_steam_reviews(args.source, args.workers, args.schema, args.source_pool)
+            record['rows_out'] = len(reviews_data) if reviews_data is not None else 0
+        synthetic = is_synthetic(reviews_data)
+        
+        if not reviews_data:
+            print("❌ Failed to load review data")
+            return 1
+        
+        # Per-game statistics describe the whole corpus, so they are taken before any filtering
+        if args.game_stats:
+            with instrumentation.stage('game_stats', rows_in=len(reviews_data)) as record:
+                stats = run_stage(
+                    'game_stats', stage_key('game_stats', reviews_key, *GAME_STATS_STAGE_CODE), kind='arrow',
+                    cache_dir=checkpoint_dir, compute=lambda: game_aspect_stats(reviews_data, workers=args.workers)
+                )
+                if synthetic:
+                    stats = stats.replace_schema_metadata({**(stats.schema.metadata or {}), **SYNTHETIC_METADATA})
+                record['rows_out'] = write_game_stats(stats, args.game_stats)
+        
+        # Only substantive reviews can be selected, so only they need deduplicating
+        if not args.no_dedup:
+            with instrumentation.stage('dedup') as record:
+                reviews_data = substantive_reviews(reviews_data)
+                record['rows_in'] = len(reviews_data)
+                reviews_key = stage_key('dedup', reviews_key, args.dedup_threshold, *DEDUP_STAGE_CODE)
+                kept = run_stage(
+                    'dedup', reviews_key, kind='npy', cache_dir=checkpoint_dir,
+                    compute=lambda: duplicate_free_indices(reviews_data, threshold=args.dedup_threshold, workers=args.workers)
+                )
+                reviews_data = reviews_data.take(kept)
+                record['rows_out'] = len(reviews_data)
     
     # Step 2: Select diverse reviews for gaming intelligence 
-    diverse_reviews = select_diverse_reviews(reviews_data, target_count=2000)
+    selection_key = stage_key('select', reviews_key, 2000, args.seed, args.stratify_length, args.stratify_game,
+                              args.diversity, *SELECT_STAGE_CODE)
+    with instrumentation.stage('select') as record:
+        if args.stream:
+            # Streaming reads (and times) the download inside selection
+            reviews_data = counted(reviews_data, record, size=len)
+        else:
+            record['rows_in'] = len(reviews_data)
+        diverse_reviews = ReviewBatch(run_stage(
+            'select', selection_key, kind='arrow', cache_dir=checkpoint_dir,
+            compute=lambda: select_diverse_reviews(
+                reviews_data, target_count=2000, seed=args.seed,
+                stratify_length=args.stratify_length, stratify_game=args.stratify_game,
+                diversity=args.diversity, workers=args.workers
+            ).table
+        ))
+        record['rows_out'] = len(diverse_reviews)
     
     # Step 3: Create gaming intelligence training examples
-    training_data = format_for_gaming_intelligence(diverse_reviews)
+    format_key = stage_key('format', selection_key, args.seed, *FORMAT_STAGE_CODE)
+    with instrumentation.stage('format', rows_in=len(diverse_reviews)) as record:
+        training_data = TrainingExamples.from_table(run_stage(
+            'format', format_key, kind='arrow', cache_dir=checkpoint_dir,
+            compute=lambda: format_for_gaming_intelligence(diverse_reviews, workers=args.workers, seed=args.seed).to_table()
+        ))
+        record['rows_out'] = len(training_data)
     
     # Step 4: Save training data
-    save_training_data(training_data)
+    with instrumentation.stage('save', rows_in=len(training_data)) as record:
+        manifest = save_training_data(training_data, args.output, args.compression,
+                                      int(args.max_shard_mb * 1024 * 1024), synthetic=synthetic)
+        record['rows_out'] = manifest['rows']
+    
+    # Step 5: Index the selected reviews so serving can retrieve snippets from them
+    if args.index:
+        with instrumentation.stage('index', rows_in=len(diverse_reviews)) as record:
+            record['rows_out'] = index_reviews(diverse_reviews, args.index, workers=args.workers)['reviews']
+    
+    if args.report:
+        instrumentation.write_report(args.report)
+    
+    files = [shard['file'] for shard in manifest['shards']]
+    if not files:
+        print("\n❌ No training examples were written, so there is nothing to upload or fine-tune on")
+        return 1
     
     print("\n✅ Training data preparation complete!")
+    if synthetic:
+        print("⚠️ Built from GENERATED sample reviews (manifest: \"synthetic\": true); do not fine-tune on it")
     print("Next steps:")
-    print("1. Upload steam_training_data.jsonl to OpenAI")
-    print("2. Start fine-tuning job")
+    if len(files) == 1:
+        print(f"1. Upload {files[0]} to OpenAI (main.py upload)")
+        print("2. Start fine-tuning job (main.py train)")
+    else:
+        print(f"1. Upload all {len(files)} shards listed in {manifest_path(args.output)} to OpenAI (main.py upload): "
+              f"{', '.join(files)}")
+        print("2. Start a fine-tuning job per shard (main.py sweep)")
     print("3. Update your app to use the fine-tuned model")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(main())
\ No newline at end of file
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Compact Columnar Review Batches
+Holds normalized reviews column-wise in Arrow arrays with compact types, so
+pipeline stages pass reviews along without per-review dicts or DataFrames
+"""
+
+import io
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Compact types: repeated game ids/names are dictionary-encoded (4-byte codes),
+# counts fit in int32 and playtime in float32
+DICTIONARY_COLUMNS = ('game_id', 'game_name')
+COMPACT_TYPES = {
+    'user_id': pa.string(),
+    'review_text': pa.string(),
+    'review_length': pa.int32(),
+    'recommend': pa.bool_(),
+    'helpful': pa.int32(),
+    'funny': pa.int32(),
+    'hours': pa.float32(),
+}
+RECORD_BATCH_ROWS = 50_000
+
+def _compact_column(name: str, column: pa.ChunkedArray) -> pa.ChunkedArray:
+    if name in DICTIONARY_COLUMNS:
+        if not pa.types.is_dictionary(column.type):
+            column = pc.dictionary_encode(column)
+        return column
+    target = COMPACT_TYPES.get(name)
+    if target is not None and column.type != target:
+        if name in ('helpful', 'funny'):
+            # Vote counts beyond int32 are implausible; clamp rather than overflow
+            column = pc.min_element_wise(column, pa.scalar(np.iinfo(np.int32).max, column.type))
+        column = column.cast(target)
+    return column
+
+def column_pylist(column: pa.ChunkedArray) -> List:
+    """A column as Python values, converted through NumPy (many times faster than to_pylist)
+
+    Dictionary-encoded columns yield the very same value object for every
+    row sharing a code.
+    """
+    if column.null_count:
+        return column.to_pylist()
+    if pa.types.is_dictionary(column.type):
+        # Convert each chunk's dictionary once, then look values up by code
+        values = []
+        for chunk in column.chunks:
+            dictionary = column_pylist(pa.chunked_array([chunk.dictionary]))
+            values.extend(map(dictionary.__getitem__, chunk.indices.to_numpy().tolist()))
+        return values
+    return column.to_numpy().tolist()
+
+class ReviewBatch:
+    """Normalized reviews as one Arrow table with a precomputed review_length column
+
+    Stages filter, take and slice batches instead of building lists of
+    review dicts; rows() produces dicts only where per-review Python code
+    (formatting) needs them. Pickles through Arrow IPC, so a slice sent to
+    a worker process carries only its own rows.
+    """
+
+    def __init__(self, table: pa.Table):
+        self.table = table
+
+    @classmethod
+    def from_table(cls, table: Union[pa.Table, pa.RecordBatch]) -> "ReviewBatch":
+        """Wrap a table of normalized reviews, compacting its columns
+
+        review_text passes through untouched, so a memory-mapped cache stays
+        memory-mapped. Already compact tables are returned as they are.
+        """
+        if isinstance(table, pa.RecordBatch):
+            table = pa.Table.from_batches([table])
+        columns = {name: table.column(name) for name in table.column_names}
+        if 'review_length' not in columns:
+            columns['review_length'] = pc.utf8_length(columns['review_text'])
+        return cls(pa.table({name: _compact_column(name, column) for name, column in columns.items()}))
+
+    @classmethod
+    def from_records(cls, reviews: Iterable[Dict], batch_rows: int = RECORD_BATCH_ROWS) -> "ReviewBatch":
+        """Build a batch from review dicts, converting batch_rows at a time
+
+        Only one chunk of dicts is alive at once, so a lazy stream never
+        materializes as a list.
+        """
+        tables = [batch.table for batch in iter_review_batches(reviews, batch_rows)]
+        if not tables:
+            return cls.empty()
+        return cls(pa.concat_tables(tables, promote_options='permissive').unify_dictionaries())
+
+    @classmethod
+    def empty(cls) -> "ReviewBatch":
+        return cls.from_table(pa.table({
+            'user_id': pa.array([], pa.string()), 'game_id': pa.array([], pa.int64()),
+            'game_name': pa.array([], pa.string()), 'review_text': pa.array([], pa.string()),
+            'recommend': pa.array([], pa.bool_()), 'helpful': pa.array([], pa.int64()),
+            'funny': pa.array([], pa.int64()), 'hours': pa.array([], pa.float64()),
+        }))
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __getstate__(self) -> bytes:
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, self.table.schema) as writer:
+            writer.write_table(self.table)
+        return sink.getvalue()
+
+    def __setstate__(self, state: bytes):
+        self.table = pa.ipc.open_stream(state).read_all()
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    def column(self, name: str) -> pa.ChunkedArray:
+        return self.table.column(name)
+
+    def numpy(self, name: str) -> np.ndarray:
+        """A numeric or boolean column as a NumPy array"""
+        return self.table.column(name).to_numpy()
+
+    def filter(self, mask: Union[np.ndarray, pa.Array, pa.ChunkedArray]) -> "ReviewBatch":
+        return ReviewBatch(self.table.filter(mask))
+
+    def take(self, indices: Union[np.ndarray, List[int]]) -> "ReviewBatch":
+        """Rows at indices, in that order
+
+        Arrow's Table.take concatenates every chunk of a column first, which
+        copies the whole text column of a multi-chunk (e.g. memory-mapped)
+        table; rows are gathered chunk by chunk instead.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        batches = self.table.to_batches()
+        if len(batches) <= 1:
+            return ReviewBatch(self.table.take(pa.array(indices)))
+        offsets = np.cumsum([0] + [batch.num_rows for batch in batches])
+        chunk_of = np.searchsorted(offsets, indices, side='right') - 1
+        order = np.argsort(chunk_of, kind='stable')
+        parts = []
+        for chunk in np.unique(chunk_of):
+            rows = indices[order][chunk_of[order] == chunk] - offsets[chunk]
+            parts.append(pa.Table.from_batches([batches[chunk].take(pa.array(rows))]))
+        gathered = pa.concat_tables(parts, promote_options='permissive').combine_chunks() if parts else self.table.slice(0, 0)
+        # gathered holds the rows grouped by chunk; put them back in the requested order
+        return ReviewBatch(gathered.take(pa.array(np.argsort(order, kind='stable'))))
+
+    def slice(self, start: int, length: Optional[int] = None) -> "ReviewBatch":
+        """Zero-copy view of a run of rows"""
+        return ReviewBatch(self.table.slice(start, length))
+
+    def pylist(self, name: str) -> List:
+        """A column as Python values (see column_pylist)"""
+        return column_pylist(self.table.column(name))
+
+    def rows(self, columns: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Yield one review dict per row (of the given columns), built column-wise"""
+        names = columns or self.table.column_names
+        values = [self.pylist(name) for name in names]
+        for row in zip(*values):
+            yield dict(zip(names, row))
+
+    def to_pylist(self) -> List[Dict]:
+        return list(self.rows())
+
+def iter_review_batches(reviews: Iterable[Dict], batch_rows: int = RECORD_BATCH_ROWS) -> Iterator[ReviewBatch]:
+    """Group a stream of review dicts into compact batches of batch_rows"""
+    chunk = []
+    for review in reviews:
+        chunk.append(review)
+        if len(chunk) >= batch_rows:
+            yield ReviewBatch.from_table(pa.Table.from_pylist(chunk))
+            chunk = []
+    if chunk:
+        yield ReviewBatch.from_table(pa.Table.from_pylist(chunk))
+
+def rebatch_reviews(batches: Iterable[ReviewBatch], batch_rows: int = RECORD_BATCH_ROWS) -> Iterator[ReviewBatch]:
+    """Regroup a stream of batches into batches of at least batch_rows (the last may be smaller), without copying rows"""
+    tables, rows = [], 0
+    for batch in batches:
+        tables.append(batch.table)
+        rows += len(batch)
+        if rows >= batch_rows:
+            yield ReviewBatch(pa.concat_tables(tables, promote_options='permissive'))
+            tables, rows = [], 0
+    if tables:
+        yield ReviewBatch(pa.concat_tables(tables, promote_options='permissive'))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Columnar On-disk Cache of Normalized Steam Reviews
+Stores normalized reviews as an uncompressed Arrow IPC file so later runs can
+memory-map them instead of re-downloading and re-normalizing the dataset
+"""
+
+import hashlib
+import inspect
+import os
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Optional, Union
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+DEFAULT_CACHE_DIR = os.getenv('STEAM_TRAINING_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'steam-model-training'))
+
+def normalization_version(*parts) -> str:
+    """Fingerprint the code and settings that shape normalized reviews
+
+    Functions and modules contribute their source, anything else its repr,
+    so editing the normalization code yields a new version and a fresh
+    cache entry.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        text = inspect.getsource(part) if callable(part) or inspect.ismodule(part) else repr(part)
+        digest.update(text.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def local_file_revision(path: str) -> str:
+    """Revision of a local source file, derived from its size and mtime"""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def review_cache_path(dataset: str, revision: str, version: str, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """Cache file location keyed by dataset name, revision and normalization version"""
+    key = hashlib.sha256(f"{dataset}\0{revision}\0{version}".encode('utf-8')).hexdigest()[:16]
+    safe_name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in os.path.basename(dataset))
+    return os.path.join(cache_dir, f"{safe_name}-{key}.arrow")
+
+def write_review_cache(reviews: Union["pa.Table", Iterable[Dict]], path: str, batch_size: int = 100_000) -> int:
+    """Stream normalized reviews into an Arrow IPC file in record batches
+
+    reviews is an Arrow table, written as it is, or review dicts, whose
+    schema is taken from the first batch. The file is written under a
+    temporary name and renamed into place, so a crash never leaves a partial
+    cache behind. Returns the number of rows written.
+    """
+    import pyarrow as pa
+    
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    writer = None
+    schema = None
+    rows = 0
+    batch = []
+
+    def flush():
+        nonlocal writer, schema
+        table = pa.Table.from_pylist(batch)
+        if writer is None:
+            schema = table.schema
+            writer = pa.ipc.new_file(tmp_path, schema)
+        writer.write_table(table.cast(schema))
+        batch.clear()
+
+    try:
+        if isinstance(reviews, pa.Table):
+            if reviews.num_rows:
+                writer = pa.ipc.new_file(tmp_path, reviews.schema)
+                writer.write_table(reviews, max_chunksize=batch_size)
+            rows = reviews.num_rows
+        else:
+            for review in reviews:
+                batch.append(review)
+                rows += 1
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+        if writer is None:
+            return 0
+        writer.close()
+        writer = None
+        os.replace(tmp_path, path)
+        return rows
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def read_review_cache(path: str) -> "pa.Table":
+    """Memory-map a cached review file; columns are read lazily by the OS"""
+    import pyarrow as pa
+    
+    source = pa.memory_map(path, 'r')
+    return pa.ipc.open_file(source).read_all()
+
+def load_or_build_review_cache(dataset: str, revision: str, version: str,
+                               build: Callable[[], Union["pa.Table", Iterable[Dict]]],
+                               cache_dir: str = DEFAULT_CACHE_DIR) -> Optional["pa.Table"]:
+    """Return cached reviews, building the cache from build() on a miss"""
+    path = review_cache_path(dataset, revision, version, cache_dir)
+
+    if os.path.exists(path):
+        print(f"Using cached reviews from {path}")
+    else:
+        print(f"Building review cache at {path}...")
+        if not write_review_cache(build(), path):
+            return None
+
+    return read_review_cache(path)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+BM25 Review Snippet Index
+Builds a compact inverted index over curated reviews as memory-mappable
+arrays, and answers keyword queries, narrowed by game or aspect, with the
+top-k review snippets in milliseconds
+"""
+
+import argparse
+import json
+import os
+import shutil
+import string
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from review_batch import ReviewBatch
+from text_diversity import text_words
+
+INDEX_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 300
+CHUNK_ROWS = 20_000  # Reviews tokenized at once while building
+MAX_ASPECTS = 32  # Aspect flags are packed into one uint32 per review
+ARRAYS = ('terms', 'term_offsets', 'postings', 'impacts', 'games', 'aspects')
+REVIEW_COLUMNS = ('game_id', 'game_name', 'review_text', 'recommend', 'helpful')
+
+def _run_starts(*keys: np.ndarray) -> np.ndarray:
+    """Start of every run of rows whose keys all repeat the row before"""
+    if not len(keys[0]):
+        return np.zeros(0, dtype=np.int64)
+    change = np.zeros(len(keys[0]), dtype=bool)
+    change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(change)
+
+def _chunk_postings(texts: pa.ChunkedArray, first_row: int) -> Tuple[np.ndarray, ...]:
+    """(term, review, term frequency) of every distinct term in each of a run of texts, plus their lengths"""
+    rows, words = text_words(texts)
+    order = np.lexsort((rows, words))
+    words, rows = words[order], rows[order]
+    starts = _run_starts(words, rows)
+    frequencies = np.diff(np.r_[starts, len(words)]).astype(np.float64)
+    return words[starts], (rows[starts] + first_row).astype(np.int32), frequencies, np.bincount(rows, minlength=len(texts))
+
+def build_review_index(reviews: ReviewBatch, aspects: Dict[str, Sequence[bool]], path: str,
+                       k1: float = BM25_K1, b: float = BM25_B) -> Dict:
+    """Write a BM25 index over reviews to the directory path, replacing any index there
+
+    Terms are 64-bit word hashes (tokenized as in text_diversity), sorted
+    for binary search. Each term's postings hold review numbers and their
+    precomputed BM25 impact, idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b *
+    length / mean length)), so a query only sums its terms' impacts.
+    aspects maps each aspect to one flag per review; flags and game codes
+    are kept per review for narrowing. Returns the index metadata.
+    """
+    if len(aspects) > MAX_ASPECTS:
+        raise ValueError(f"At most {MAX_ASPECTS} aspects can be indexed, got {len(aspects)}")
+    count = len(reviews)
+    texts = reviews.column('review_text')
+    chunks = [_chunk_postings(texts.slice(start, CHUNK_ROWS), start) for start in range(0, count, CHUNK_ROWS)]
+    if chunks:
+        posting_terms, postings, frequencies, lengths = (np.concatenate(parts) for parts in zip(*chunks))
+    else:
+        posting_terms, postings, frequencies, lengths = (np.zeros(0, np.uint64), np.zeros(0, np.int32),
+                                                         np.zeros(0), np.zeros(0, np.int64))
+    # Chunks hold ascending reviews, so a stable sort by term keeps each term's postings in review order
+    order = np.argsort(posting_terms, kind='stable')
+    posting_terms, postings, frequencies = posting_terms[order], postings[order], frequencies[order]
+    term_starts = _run_starts(posting_terms)
+    term_offsets = np.r_[term_starts, len(postings)].astype(np.int64)
+    document_frequency = np.diff(term_offsets)
+    idf = np.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+    mean_length = float(lengths.mean()) if count else 0.0
+    norms = k1 * (1 - b + b * lengths / mean_length) if mean_length else np.full(count, k1)
+    impacts = np.repeat(idf, document_frequency) * frequencies * (k1 + 1) / (frequencies + norms[postings])
+
+    games = reviews.column('game_id').combine_chunks()
+    games = games if pa.types.is_dictionary(games.type) else games.dictionary_encode()
+    # Games are renumbered over the ones present, as a dictionary may carry unused entries; reviews
+    # without a game_id share one code, whose game_id is None
+    indices = pc.fill_null(games.indices, -1).to_numpy(zero_copy_only=False)
+    present, first, codes = np.unique(indices, return_index=True, return_inverse=True)
+    game_ids = games.dictionary.take(pa.array(present, pa.int64(), mask=present < 0)).to_pylist()
+    aspect_bits = np.zeros(count, dtype=np.uint32)
+    for bit, flags in enumerate(aspects.values()):
+        aspect_bits |= np.asarray(flags, dtype=bool).astype(np.uint32) << np.uint32(bit)
+
+    arrays = {
+        'terms': posting_terms[term_starts],
+        'term_offsets': term_offsets,
+        'postings': postings,
+        'impacts': impacts.astype(np.float32),
+        'games': codes.astype(np.int32),
+        'aspects': aspect_bits,
+    }
+    meta = {
+        'version': INDEX_VERSION,
+        'reviews': count,
+        'terms': len(arrays['terms']),
+        'postings': len(postings),
+        'k1': k1,
+        'b': b,
+        'mean_length': mean_length,
+        'aspects': list(aspects),
+        'games': [list(game) for game in zip(game_ids, reviews.take(first).pylist('game_name'))],
+    }
+
+    # Built beside the target and swapped in, so readers never see half an index
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp_path)
+    try:
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), values)
+        table = reviews.table.select([column for column in REVIEW_COLUMNS if column in reviews.table.column_names])
+        with pa.ipc.new_file(os.path.join(tmp_path, 'reviews.arrow'), table.schema) as writer:
+            writer.write_table(table.unify_dictionaries())
+        with open(os.path.join(tmp_path, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+    return meta
+
+def snippet(text: str, words: List[str], length: int = SNIPPET_CHARS) -> str:
+    """About length characters of text around the first query word it contains"""
+    if len(text) <= length:
+        return text
+    lowered = text.lower()
+    hits = [position for position in (lowered.find(word) for word in words if word) if position >= 0]
+    start = max(0, min(hits, default=0) - length // 4)
+    if start:
+        start = text.find(' ', start) + 1 or start
+    end = min(len(text), start + length)
+    if end < len(text):
+        space = text.rfind(' ', start, end)
+        end = space if space > start else end
+    return ('…' if start else '') + text[start:end].strip() + ('…' if end < len(text) else '')
+
+class ReviewIndex:
+    """A built index, memory-mapped: opening one reads only its metadata
+
+    search() returns hits as dicts: score, review (its row in the index),
+    game_id, game_name, recommend, helpful, aspects and snippet.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, 'index.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"{path} holds index version {self.meta.get('version')}, expected {INDEX_VERSION}; rebuild it")
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r'))
+        self.reviews = pa.ipc.open_file(pa.memory_map(os.path.join(path, 'reviews.arrow'), 'r')).read_all()
+        self.aspect_names = self.meta['aspects']
+        self.game_codes = {}
+        for code, (game_id, name) in enumerate(self.meta['games']):
+            if game_id is not None:
+                self.game_codes[str(game_id)] = code
+            if name:
+                self.game_codes.setdefault(name.lower(), code)
+
+    def __len__(self) -> int:
+        return self.meta['reviews']
+
+    def _candidates(self, query: str) -> Optional[np.ndarray]:
+        """BM25 score of every review for the query's words, or None if it has none"""
+        words = np.unique(text_words(pa.array([query], pa.string()))[1])
+        if not len(words):
+            return None
+        slots = np.minimum(np.searchsorted(self.terms, words), max(len(self.terms) - 1, 0))
+        slots = slots[self.terms[slots] == words] if len(self.terms) else slots[:0]
+        spans = [(self.term_offsets[slot], self.term_offsets[slot + 1]) for slot in slots.tolist()]
+        postings = np.concatenate([self.postings[start:end] for start, end in spans]) if spans else np.zeros(0, np.int32)
+        impacts = np.concatenate([self.impacts[start:end] for start, end in spans]) if spans else np.zeros(0, np.float32)
+        return np.bincount(postings, weights=impacts, minlength=len(self))
+
+    def search(self, query: str, k: int = 5, game: Optional[Union[int, str]] = None,
+               aspects: Sequence[str] = ()) -> List[Dict]:
+        """The k best reviews for a keyword query, best first
+
+        game (an id or a name) keeps only that game's reviews and aspects
+        only reviews mentioning all of them. A query without words ranks
+        the reviews left by helpful votes instead. Ties go to the earlier
+        review.
+        """
+        unknown = [aspect for aspect in aspects if aspect not in self.aspect_names]
+        if unknown:
+            raise ValueError(f"Unknown aspect(s) {unknown}; the index has {self.aspect_names}")
+        scores = self._candidates(query)
+        if scores is None:
+            scores = np.asarray(self.reviews.column('helpful').to_numpy(), dtype=np.float64) + 1
+        keep = scores > 0
+        if game is not None:
+            code = self.game_codes.get(str(game).lower())
+            if code is None:
+                return []
+            keep &= self.games == code
+        if aspects:
+            required = np.uint32(sum(1 << self.aspect_names.index(aspect) for aspect in set(aspects)))
+            keep &= (self.aspects & required) == required
+
+        rows = np.flatnonzero(keep)
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        rows = rows[np.lexsort((rows, -scores[rows]))]
+        words = [word.strip(string.punctuation) for word in query.lower().split()]
+        hits = []
+        for row, review in zip(rows.tolist(), ReviewBatch(self.reviews).take(rows).to_pylist()):
+            bits = int(self.aspects[row])
+            hits.append({
+                'score': round(float(scores[row]), 4),
+                'review': row,
+                'game_id': review.get('game_id'),
+                'game_name': review.get('game_name'),
+                'recommend': review.get('recommend'),
+                'helpful': review.get('helpful'),
+                'aspects': [name for bit, name in enumerate(self.aspect_names) if bits >> bit & 1],
+                'snippet': snippet(review['review_text'], words),
+            })
+        return hits
+
+def open_review_index(path: str) -> ReviewIndex:
+    """Memory-map the index at path (see build_review_index)"""
+    return ReviewIndex(path)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Search the BM25 review snippet index")
+    parser.add_argument('query', nargs='*', help="Keywords (none: the most helpful reviews)")
+    parser.add_argument('--index', default='review_index', help="Index directory written by prepare_training_data.py")
+    parser.add_argument('-k', type=int, default=5, help="How many snippets to return")
+    parser.add_argument('--game', help="Only this game (id or name)")
+    parser.add_argument('--aspect', action='append', default=[], help="Only reviews mentioning this aspect (repeatable)")
+    parser.add_argument('--json', action='store_true', help="Print hits as JSON")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main execution function; exits non-zero when nothing matches"""
+    args = parse_args(argv)
+    hits = open_review_index(args.index).search(' '.join(args.query), k=args.k, game=args.game, aspects=args.aspect)
+    if args.json:
+        print(json.dumps(hits, ensure_ascii=False, indent=2))
+    else:
+        for hit in hits:
+            print(f"{hit['score']:7.2f}  {'👍' if hit['recommend'] else '👎'} {hit['game_name']}  [{', '.join(hit['aspects'])}]")
+            print(f"         {hit['snippet']}")
+    return 0 if hits else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
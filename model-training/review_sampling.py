@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Streaming Stratified Sampling
+Picks a balanced, seeded sample from a stream of review batches of any size in one pass
+"""
+
+from typing import Optional
+import numpy as np
+import pyarrow as pa
+from review_batch import ReviewBatch
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64's finalizer: spreads uint64 values into well-mixed hashes"""
+    with np.errstate(over='ignore'):
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+def stratum_ids(count: int, seed: int, *keys: np.ndarray) -> np.ndarray:
+    """A seeded pseudo-random uint64 id per row, from its integer stratum keys
+
+    Rows with the same keys get the same id in every batch, and ordering
+    strata by id shuffles them in an order that depends only on the seed.
+    """
+    ids = _mix64(np.full(count, seed, dtype=np.uint64))
+    for key in keys:
+        ids = _mix64(ids ^ np.asarray(key, dtype=np.int64).view(np.uint64))
+    return ids
+
+def _depths(groups: np.ndarray, strata: np.ndarray, keys: np.ndarray):
+    """(order, depth, stratum rank): rows sorted by group, stratum id and key, each row's
+    position within its stratum and its stratum's position within its group"""
+    order = np.lexsort((keys, strata, groups))
+    groups, strata = groups[order], strata[order]
+    new_stratum = np.ones(len(order), dtype=bool)
+    new_stratum[1:] = (groups[1:] != groups[:-1]) | (strata[1:] != strata[:-1])
+    stratum_of = np.cumsum(new_stratum) - 1
+    stratum_starts = np.flatnonzero(new_stratum)
+    depth = np.arange(len(order)) - stratum_starts[stratum_of]
+    stratum_groups = groups[stratum_starts]
+    new_group = np.ones(len(stratum_starts), dtype=bool)
+    new_group[1:] = stratum_groups[1:] != stratum_groups[:-1]
+    rank = np.arange(len(stratum_starts)) - np.flatnonzero(new_group)[np.cumsum(new_group) - 1]
+    return order, depth, rank[stratum_of]
+
+class StratifiedSample:
+    """A seeded uniform sample of up to capacity reviews per stratum, read from batches in one pass
+
+    Every candidate gets a random key and each stratum keeps its capacity
+    lowest-keyed rows (bottom-k sampling), so the sample is uniform within
+    each stratum however the stream is batched. take() drains a group's
+    strata round-robin in stratum id order; with max_strata, strata ranked
+    past max_strata in their group could never be drawn, so they are
+    dropped as they turn up, and memory stays under
+    groups x max_strata x capacity rows. Kept rows stay columnar: only the
+    rows entering the sample are copied out of each batch.
+    """
+
+    def __init__(self, capacity: int, seed: int = 0, max_strata: Optional[int] = None):
+        self.capacity = capacity
+        self.max_strata = max_strata
+        self.rng = np.random.default_rng(seed)
+        self.groups = np.empty(0, dtype=np.int64)
+        self.strata = np.empty(0, dtype=np.uint64)
+        self.keys = np.empty(0)
+        self.positions = np.empty(0, dtype=np.int64)  # Kept rows' positions in the pool
+        self.pool = []  # Tables of rows copied into the sample, some since evicted
+        self.pool_rows = 0
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def add(self, batch: ReviewBatch, rows: np.ndarray, groups: np.ndarray, strata: np.ndarray):
+        """Offer the given rows of batch, with their group and stratum ids"""
+        kept = len(self.positions)
+        groups = np.concatenate([self.groups, np.asarray(groups, dtype=np.int64)])
+        strata = np.concatenate([self.strata, np.asarray(strata, dtype=np.uint64)])
+        keys = np.concatenate([self.keys, self.rng.random(len(rows))])
+        order, depth, rank = _depths(groups, strata, keys)
+        survives = depth < self.capacity
+        if self.max_strata is not None:
+            survives &= rank < self.max_strata
+        keep = np.empty(len(order), dtype=bool)
+        keep[order] = survives
+
+        entering = np.flatnonzero(keep[kept:])
+        if len(entering):
+            self.pool.append(batch.take(np.asarray(rows)[entering]).table)
+        self.positions = np.concatenate([self.positions[keep[:kept]], self.pool_rows + np.arange(len(entering))])
+        self.pool_rows += len(entering)
+        self.groups, self.strata, self.keys = groups[keep], strata[keep], keys[keep]
+        if self.pool_rows > 2 * len(self.positions) + self.capacity:
+            self._compact()
+
+    def _pool(self) -> ReviewBatch:
+        return ReviewBatch(pa.concat_tables(self.pool, promote_options='permissive'))
+
+    def _compact(self):
+        """Drop evicted rows from the pool"""
+        self.pool = [self._pool().take(self.positions).table]
+        self.positions = np.arange(len(self.positions))
+        self.pool_rows = len(self.positions)
+
+    def take(self, group: int, count: int) -> ReviewBatch:
+        """Up to count of a group's rows: every stratum's first row in stratum id order, then every second..."""
+        rows = np.flatnonzero(self.groups == group)
+        if not len(rows):
+            return ReviewBatch.empty()
+        order, depth, _ = _depths(self.groups[rows], self.strata[rows], self.keys[rows])
+        strata = self.strata[rows][order]
+        drawn = order[np.lexsort((strata, depth))[:count]]
+        return self._pool().take(self.positions[rows[drawn]])
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Pluggable Review Sources
+Reads review dumps (local JSONL/Parquet/CSV shards or HuggingFace datasets)
+through registered schema adapters, shard by shard on a thread or process
+pool, into one normalized Arrow stream
+"""
+
+import glob
+import hashlib
+import io
+import json
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from review_cache import local_file_revision
+
+MIN_REVIEW_CHARS = 20  # Reviews this short or shorter carry no signal
+NORMALIZE_BATCH_ROWS = 100_000  # Raw rows per batch handed to an adapter by datasets.map
+STREAM_BLOCK_BYTES = 1 << 20  # Bytes of JSON/CSV parsed at a time when streaming a shard
+STREAM_BATCH_ROWS = 50_000  # Parquet or HuggingFace rows read at a time when streaming
+HF_PREFIX = 'hf:'
+POOLS = ('thread', 'process')
+
+# Every adapter's output, whatever the dataset
+NORMALIZED_SCHEMA = pa.schema([
+    ('user_id', pa.string()), ('game_id', pa.int64()), ('game_name', pa.string()), ('review_text', pa.string()),
+    ('recommend', pa.bool_()), ('helpful', pa.int64()), ('funny', pa.int64()), ('hours', pa.float64()),
+])
+SHARD_FORMATS = {'.jsonl': 'json', '.ndjson': 'json', '.parquet': 'parquet', '.csv': 'csv'}
+COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.zst')  # Arrow decompresses these itself
+
+class SchemaAdapter:
+    """How one dataset's raw rows map onto NORMALIZED_SCHEMA
+
+    raw_schema gives the raw columns and the types they are parsed as;
+    normalize(table, min_length) turns a table of them into normalized
+    reviews, dropping any review of min_length characters or fewer. A
+    source is matched to an adapter by its HuggingFace dataset name or by
+    the marker column in its rows.
+    """
+
+    def __init__(self, name: str, raw_schema: pa.Schema, normalize: Callable[[pa.Table, int], pa.Table],
+                 marker: str, dataset: Optional[str] = None):
+        self.name = name
+        self.raw_schema = raw_schema
+        self.normalize = normalize
+        self.marker = marker
+        self.dataset = dataset
+
+SCHEMA_ADAPTERS: Dict[str, SchemaAdapter] = {}
+
+def schema_adapter(name: str, raw_schema: pa.Schema, marker: str, dataset: Optional[str] = None):
+    """Register the decorated normalize(table, min_length) function as the adapter called name"""
+    def register(normalize: Callable[[pa.Table, int], pa.Table]) -> Callable[[pa.Table, int], pa.Table]:
+        SCHEMA_ADAPTERS[name] = SchemaAdapter(name, raw_schema, normalize, marker, dataset)
+        return normalize
+    return register
+
+def _raw_column(table: pa.Table, schema: pa.Schema, name: str) -> pa.ChunkedArray:
+    """A raw column cast to its schema type, or all nulls when the rows lack it"""
+    field = schema.field(name)
+    if name not in table.column_names:
+        return pa.chunked_array([pa.nulls(table.num_rows, field.type)], field.type)
+    return table.column(name).cast(field.type)
+
+def _long_enough(text: pa.ChunkedArray, min_length: int) -> pa.ChunkedArray:
+    return pc.fill_null(pc.greater(pc.utf8_length(text), min_length), False)
+
+# ksang/steamreviews: one flat row per review
+STEAMREVIEWS_SCHEMA = pa.schema([
+    ('app_id', pa.int64()), ('app_name', pa.string()), ('review_text', pa.string()),
+    ('review_score', pa.int64()), ('review_votes', pa.int64()),
+])
+
+@schema_adapter('steamreviews', STEAMREVIEWS_SCHEMA, marker='review_text', dataset='ksang/steamreviews')
+def normalize_steamreviews(table: pa.Table, min_length: int = MIN_REVIEW_CHARS) -> pa.Table:
+    """Flat ksang/steamreviews rows; the dataset has no users, so app_id stands in as user_id"""
+    table = table.filter(_long_enough(_raw_column(table, STEAMREVIEWS_SCHEMA, 'review_text'), min_length))
+    def column(name: str) -> pa.ChunkedArray:
+        return _raw_column(table, STEAMREVIEWS_SCHEMA, name)
+
+    app_id = column('app_id')
+    zeros = np.zeros(table.num_rows, dtype=np.int64)
+    return pa.table({
+        'user_id': app_id.cast(pa.string()),  # Use app_id as identifier
+        'game_id': app_id,
+        'game_name': column('app_name'),
+        'review_text': column('review_text'),
+        'recommend': pc.fill_null(pc.greater_equal(column('review_score'), 1), False),  # 1 = positive, -1 = negative
+        'helpful': pc.fill_null(column('review_votes'), 0),
+        'funny': zeros,  # Not available in this dataset
+        'hours': zeros.astype(np.float64),  # Not available in this dataset
+    }, schema=NORMALIZED_SCHEMA)
+
+# recommender-system/steam-review-and-bundle-dataset: one row per user, with a nested list of their reviews
+NESTED_REVIEW_TYPE = pa.struct([
+    ('item_id', pa.string()), ('review', pa.string()), ('recommend', pa.bool_()),
+    ('helpful', pa.int64()), ('funny', pa.int64()), ('hours', pa.float64()),
+])
+STEAM_BUNDLE_SCHEMA = pa.schema([('user_id', pa.string()), ('reviews', pa.list_(NESTED_REVIEW_TYPE))])
+NESTED_DEFAULTS = {'recommend': True, 'helpful': 0, 'funny': 0, 'hours': 0.0}
+
+@schema_adapter('steam-bundle', STEAM_BUNDLE_SCHEMA, marker='reviews',
+                dataset='recommender-system/steam-review-and-bundle-dataset')
+def normalize_steam_bundle(table: pa.Table, min_length: int = MIN_REVIEW_CHARS) -> pa.Table:
+    """Per-user rows flattened into one row per nested review, carrying its user's user_id
+
+    item_id is a Steam app id, so it becomes game_id as an integer, in the
+    same id space as ksang/steamreviews. The dataset has no game names, so
+    game_name is null.
+    """
+    # Nested fields are cast one at a time below, as datasets may type the struct differently
+    nested = table.column('reviews') if 'reviews' in table.column_names else _raw_column(table, STEAM_BUNDLE_SCHEMA, 'reviews')
+    reviews = pc.list_flatten(nested)
+    users = pc.take(_raw_column(table, STEAM_BUNDLE_SCHEMA, 'user_id'), pc.list_parent_indices(nested))
+    present = {field.name for field in reviews.type}
+
+    def field(name: str) -> pa.ChunkedArray:
+        """A nested field cast to its NESTED_REVIEW_TYPE type, or all nulls when reviews lack it"""
+        target = NESTED_REVIEW_TYPE.field(name).type
+        if name not in present:
+            return pa.chunked_array([pa.nulls(len(reviews), target)], target)
+        return pc.struct_field(reviews, name).cast(target)
+
+    text = field('review')
+    keep = _long_enough(text, min_length)
+    text, item_id = pc.filter(text, keep), pc.filter(field('item_id'), keep)
+    return pa.table({
+        'user_id': pc.filter(users, keep),
+        'game_id': pc.if_else(pc.equal(item_id, ''), None, item_id).cast(pa.int64()),
+        'game_name': pa.nulls(len(text), pa.string()),  # Not available in this dataset
+        'review_text': text,
+        **{name: pc.fill_null(pc.filter(field(name), keep), default) for name, default in NESTED_DEFAULTS.items()},
+    }, schema=NORMALIZED_SCHEMA)
+
+def detect_adapter(columns: Sequence[str], dataset: Optional[str] = None) -> SchemaAdapter:
+    """The adapter registered for a dataset name, else the first whose marker column is present"""
+    for adapter in SCHEMA_ADAPTERS.values():
+        if dataset and adapter.dataset == dataset:
+            return adapter
+    for adapter in SCHEMA_ADAPTERS.values():
+        if adapter.marker in columns:
+            return adapter
+    raise ValueError(f"No schema adapter matches columns {list(columns)}; known: {sorted(SCHEMA_ADAPTERS)}")
+
+def shard_format(path: str) -> str:
+    """'json', 'parquet' or 'csv', from the suffix under any compression suffix"""
+    stem = path.lower()
+    for suffix in COMPRESSED_SUFFIXES:
+        if stem.endswith(suffix):
+            stem = stem[:-len(suffix)]
+    extension = os.path.splitext(stem)[1]
+    if extension not in SHARD_FORMATS:
+        raise ValueError(f"Unsupported review shard {path}; expected one of {sorted(SHARD_FORMATS)} (optionally compressed)")
+    return SHARD_FORMATS[extension]
+
+def _shard_columns(path: str, file_format: str) -> List[str]:
+    """Column names of a shard, from its footer, header or first JSON line"""
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if file_format == 'csv':
+        from pyarrow import csv
+        return csv.open_csv(path).schema.names
+    with io.BufferedReader(pa.input_stream(path, compression='detect')) as f:
+        for line in f:
+            if line.strip():
+                return list(json.loads(line))
+    return []
+
+def _shard_adapter(path: str, file_format: str, schema: Optional[str] = None) -> Tuple[Optional[SchemaAdapter], List[str]]:
+    """(adapter, columns) of a shard; no adapter when the shard holds no rows"""
+    columns = _shard_columns(path, file_format) if os.path.getsize(path) else []
+    if not columns:
+        return None, columns
+    return (SCHEMA_ADAPTERS[schema] if schema else detect_adapter(columns)), columns
+
+def _csv_convert_options(path: str, adapter: SchemaAdapter, columns: List[str]):
+    from pyarrow import csv
+    flat = {field.name: field.type for field in adapter.raw_schema if not pa.types.is_nested(field.type)}
+    if len(flat) < len(adapter.raw_schema):
+        raise ValueError(f"{path}: the {adapter.name} schema has nested columns, which CSV cannot hold")
+    return csv.ConvertOptions(column_types=flat, include_columns=[name for name in flat if name in columns])
+
+def _json_parse_options(adapter: SchemaAdapter):
+    from pyarrow import json as pa_json
+    return pa_json.ParseOptions(explicit_schema=adapter.raw_schema, unexpected_field_behavior='ignore')
+
+def read_shard(path: str, schema: Optional[str] = None, min_length: int = MIN_REVIEW_CHARS) -> pa.Table:
+    """Read one local shard and normalize it (the pool worker)
+
+    Only the adapter's raw columns are parsed. Arrow's readers decode a
+    shard's blocks on several threads and release the GIL throughout.
+    """
+    file_format = shard_format(path)
+    adapter, columns = _shard_adapter(path, file_format, schema)
+    if adapter is None:
+        return NORMALIZED_SCHEMA.empty_table()
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        raw = pq.read_table(path, columns=[name for name in adapter.raw_schema.names if name in columns])
+    elif file_format == 'csv':
+        from pyarrow import csv
+        raw = csv.read_csv(path, convert_options=_csv_convert_options(path, adapter, columns))
+    else:
+        from pyarrow import json as pa_json
+        raw = pa_json.read_json(path, parse_options=_json_parse_options(adapter))
+    return adapter.normalize(raw, min_length)
+
+def iter_shard_batches(path: str, schema: Optional[str] = None, min_length: int = MIN_REVIEW_CHARS,
+                       batch_rows: int = STREAM_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    """Yield one local shard's normalized reviews a record batch at a time
+
+    Unlike read_shard the shard is never held whole: JSON and CSV are
+    parsed a STREAM_BLOCK_BYTES block at a time and Parquet a batch_rows
+    batch at a time, so memory stays flat however large the shard is.
+    """
+    file_format = shard_format(path)
+    adapter, columns = _shard_adapter(path, file_format, schema)
+    if adapter is None:
+        return
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        raw_batches = pq.ParquetFile(path).iter_batches(
+            batch_size=batch_rows, columns=[name for name in adapter.raw_schema.names if name in columns])
+    elif file_format == 'csv':
+        from pyarrow import csv
+        raw_batches = csv.open_csv(path, read_options=csv.ReadOptions(block_size=STREAM_BLOCK_BYTES),
+                                   convert_options=_csv_convert_options(path, adapter, columns))
+    else:
+        from pyarrow import json as pa_json
+        raw_batches = pa_json.open_json(path, read_options=pa_json.ReadOptions(block_size=STREAM_BLOCK_BYTES),
+                                        parse_options=_json_parse_options(adapter))
+    for raw in raw_batches:
+        yield from adapter.normalize(pa.Table.from_batches([raw]), min_length).to_batches()
+
+def iter_dataset_batches(name: str, schema: Optional[str] = None, min_length: int = MIN_REVIEW_CHARS,
+                         revision: Optional[str] = None, batch_rows: int = STREAM_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    """Yield a streamed HuggingFace dataset's normalized reviews, batch_rows raw rows at a time"""
+    from datasets import load_dataset  # Heavy import, only paid when reading from HuggingFace
+    dataset = load_dataset(name, split="train", streaming=True, revision=revision)
+    adapter = None
+    for rows in dataset.iter(batch_size=batch_rows):
+        adapter = adapter or (SCHEMA_ADAPTERS[schema] if schema else detect_adapter(list(rows), name))
+        yield from adapter.normalize(pa.Table.from_pydict(rows), min_length).to_batches()
+
+def normalize_dataset(dataset, schema: Optional[str] = None, dataset_name: Optional[str] = None,
+                      min_length: int = MIN_REVIEW_CHARS, workers: int = 1) -> pa.Table:
+    """Normalize a HuggingFace Dataset of raw rows with a batched Arrow map over worker processes
+
+    Each worker hands the adapter Arrow tables of NORMALIZE_BATCH_ROWS
+    rows and the result stays in the datasets cache, memory-mapped, so
+    rows never become Python objects.
+    """
+    adapter = SCHEMA_ADAPTERS[schema] if schema else detect_adapter(dataset.column_names, dataset_name)
+    workers = max(1, min(workers, dataset.num_rows // NORMALIZE_BATCH_ROWS))
+    normalized = dataset.with_format('arrow').map(
+        adapter.normalize, batched=True, batch_size=NORMALIZE_BATCH_ROWS,
+        fn_kwargs={'min_length': min_length}, remove_columns=dataset.column_names,
+        num_proc=workers if workers > 1 else None, desc=f"Normalizing {adapter.name} reviews"
+    )
+    return normalized.with_format('arrow')[:].cast(NORMALIZED_SCHEMA)
+
+def expand_source(spec: str) -> List[str]:
+    """The shards a source names: hf:<dataset> as is, or a file, a directory (every shard in it) or a glob"""
+    if spec.startswith(HF_PREFIX):
+        return [spec]
+    if os.path.isdir(spec):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(spec) for name in names]
+        shards = []
+        for path in sorted(paths):
+            try:
+                shard_format(path)
+            except ValueError:
+                continue
+            shards.append(path)
+        return shards
+    if glob.has_magic(spec):
+        return sorted(glob.glob(spec, recursive=True))
+    if not os.path.exists(spec):
+        raise FileNotFoundError(f"Review source {spec} does not exist")
+    return [spec]
+
+def dataset_revision(dataset: str, revision: Optional[str] = None) -> str:
+    """Pin a HuggingFace dataset revision to a commit hash when we can"""
+    if revision:
+        return revision
+    try:
+        from huggingface_hub import HfApi
+        return HfApi().dataset_info(dataset).sha
+    except Exception:
+        return "main"  # Offline: trust whatever the local datasets cache holds
+
+def source_identity(specs: Sequence[str], revision: Optional[str] = None) -> Tuple[str, str]:
+    """(dataset, revision) naming exactly which raw reviews a list of sources yields
+
+    A single HuggingFace dataset or local file keeps its own name; local
+    shards are revised by their sizes and mtimes.
+    """
+    parts = []
+    for spec in specs:
+        for shard in expand_source(spec):
+            if shard.startswith(HF_PREFIX):
+                parts.append((shard, dataset_revision(shard[len(HF_PREFIX):], revision)))
+            else:
+                parts.append((os.path.abspath(shard), local_file_revision(shard)))
+    if len(parts) == 1:
+        name, shard_revision = parts[0]
+        return (name[len(HF_PREFIX):] if name.startswith(HF_PREFIX) else name), shard_revision
+    name = ' + '.join(os.path.abspath(spec) if not spec.startswith(HF_PREFIX) else spec for spec in specs)
+    digest = hashlib.sha256('\0'.join(f"{path}\0{shard_revision}" for path, shard_revision in parts).encode('utf-8'))
+    return name, digest.hexdigest()[:16]
+
+def iter_review_sources(specs: Sequence[str], schema: Optional[str] = None, min_length: int = MIN_REVIEW_CHARS,
+                        revision: Optional[str] = None, workers: Optional[int] = None,
+                        pool: str = 'thread') -> Iterator[pa.Table]:
+    """Yield one normalized table per shard of every source, in order
+
+    Local shards are read on a pool of workers threads (or processes), a
+    bounded number ahead of the consumer, so memory stays flat however
+    many shards there are. HuggingFace sources are normalized by
+    normalize_dataset. schema forces one adapter for every source.
+    """
+    if pool not in POOLS:
+        raise ValueError(f"Unknown pool {pool!r}; expected one of {POOLS}")
+    workers = workers or os.cpu_count() or 1
+    shards = [shard for spec in specs for shard in expand_source(spec)]
+    local = [shard for shard in shards if not shard.startswith(HF_PREFIX)]
+    executor = None
+    if len(local) > 1 and workers > 1:
+        executor = (ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor)(max_workers=workers)
+    pending = []
+    try:
+        for shard in shards:
+            if shard.startswith(HF_PREFIX):
+                # Earlier shards come out first, so the stream keeps source order
+                while pending:
+                    yield pending.pop(0).result()
+                from datasets import load_dataset  # Heavy import, only paid when reading from HuggingFace
+                name = shard[len(HF_PREFIX):]
+                yield normalize_dataset(load_dataset(name, split="train", revision=revision),
+                                        schema, name, min_length, workers)
+            elif executor is None:
+                yield read_shard(shard, schema, min_length)
+            else:
+                pending.append(executor.submit(read_shard, shard, schema, min_length))
+                # Bound the work in flight so memory stays flat on huge dumps
+                while len(pending) > workers * 2:
+                    yield pending.pop(0).result()
+        while pending:
+            yield pending.pop(0).result()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def stream_review_sources(specs: Sequence[str], schema: Optional[str] = None, min_length: int = MIN_REVIEW_CHARS,
+                          revision: Optional[str] = None) -> Iterator[pa.RecordBatch]:
+    """Yield every source's normalized reviews as record batches, in order, holding one batch at a time
+
+    The bounded-memory counterpart of iter_review_sources: shards are read
+    one after another, incrementally (see iter_shard_batches), and
+    HuggingFace datasets are streamed rather than downloaded.
+    """
+    for spec in specs:
+        for shard in expand_source(spec):
+            if shard.startswith(HF_PREFIX):
+                yield from iter_dataset_batches(shard[len(HF_PREFIX):], schema, min_length, revision)
+            else:
+                yield from iter_shard_batches(shard, schema, min_length)
+
+def read_review_sources(specs: Sequence[str], schema: Optional[str] = None, min_length: int = MIN_REVIEW_CHARS,
+                        revision: Optional[str] = None, workers: Optional[int] = None,
+                        pool: str = 'thread') -> pa.Table:
+    """Every normalized review of every source as one table (see iter_review_sources)"""
+    tables = list(iter_review_sources(specs, schema, min_length, revision, workers, pool))
+    return pa.concat_tables(tables) if tables else NORMALIZED_SCHEMA.empty_table()
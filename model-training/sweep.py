@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Fine-tuning Sweep Orchestrator
+Runs a grid of base models, epochs, learning-rate multipliers and dataset
+shards as concurrent fine-tuning jobs, resumable from a local state file
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+from chunked_upload import upload_file_chunked
+from job_monitor import MAX_CONCURRENT_REQUESTS, format_event, watch_job
+from train_model import fine_tuning_job_params
+
+DEFAULT_STATE_FILE = 'sweep_state.json'
+DEFAULT_SUMMARY_FILE = 'sweep_summary.json'
+MAX_ACTIVE_JOBS = 4  # OpenAI caps concurrently active fine-tuning jobs per organization
+REQUESTS_PER_MINUTE = 20  # Upload / job-creation calls, well under the API's write limits
+MAX_RETRIES = 5
+
+class RateLimiter:
+    """Token bucket spacing API calls to at most requests_per_minute"""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def sweep_grid(models: List[str], epochs: List[int], learning_rates: List[Optional[float]],
+               shards: List[str]) -> List[Dict]:
+    """Every combination of the grid, each with a stable id
+
+    Ids name the shard by its basename plus a hash of its absolute path, so
+    same-named shards in different directories never share a run.
+    """
+    configs = []
+    for model, n_epochs, lr, shard in itertools.product(models, epochs, learning_rates, shards):
+        lr_label = 'auto' if lr is None else f"{lr:g}"
+        path_hash = hashlib.sha256(os.path.abspath(shard).encode('utf-8')).hexdigest()[:8]
+        configs.append({
+            'id': f"{model}|e{n_epochs}|lr{lr_label}|{os.path.basename(shard)}@{path_hash}",
+            'model': model,
+            'n_epochs': n_epochs,
+            'learning_rate_multiplier': lr,
+            'shard': os.path.abspath(shard),
+            # Fine-tuned model names carry the configuration (suffix is limited to 64 characters)
+            'suffix': re.sub(r'[^a-zA-Z0-9-]', '-', f"steam-e{n_epochs}-lr{lr_label}")[:64],
+        })
+    return configs
+
+class SweepState:
+    """JSON file recording each configuration's upload, job and outcome"""
+
+    def __init__(self, path: str = DEFAULT_STATE_FILE):
+        self.path = path
+        self.data = {'files': {}, 'runs': {}}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    def run(self, config_id: str) -> Dict:
+        return self.data['runs'].setdefault(config_id, {})
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+async def _call_api(limiter: RateLimiter, call, *args, **kwargs) -> Any:
+    """Rate-limited API call, retrying rate-limit and transient errors with backoff
+
+    Honours the server's retry-after header when it sends one.
+    """
+    import openai
+
+    for attempt in range(MAX_RETRIES):
+        await limiter.wait()
+        try:
+            return await call(*args, **kwargs)
+        except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            response = getattr(e, 'response', None)
+            retry_after = response.headers.get('retry-after') if response is not None else None
+            delay = float(retry_after) if retry_after else 2 ** attempt * 5
+            print(f"⚠️ {type(e).__name__}; retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+class Sweep:
+    """Submits, follows and summarizes every configuration of a grid"""
+
+    def __init__(self, client: Any, configs: List[Dict], state: SweepState,
+                 max_active_jobs: int = MAX_ACTIVE_JOBS, requests_per_minute: float = REQUESTS_PER_MINUTE):
+        self.client = client
+        self.configs = configs
+        self.state = state
+        self.active = asyncio.Semaphore(max_active_jobs)
+        self.limiter = RateLimiter(requests_per_minute)
+        self.polls = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)  # Shared by every job's watcher
+        self.upload_locks = {}
+
+    async def upload(self, shard: str) -> str:
+        """File id for a shard, uploading it at most once across the sweep (and across resumes)"""
+        lock = self.upload_locks.setdefault(shard, asyncio.Lock())
+        async with lock:
+            file_id = self.state.data['files'].get(shard)
+            if not file_id:
+                print(f"📤 Uploading {shard}...")
+                file_id = await _call_api(self.limiter, upload_file_chunked, self.client, shard)
+                self.state.data['files'][shard] = file_id
+                self.state.save()
+            return file_id
+
+    async def run_config(self, config: Dict):
+        """Submit one configuration (unless already submitted) and follow it to the end"""
+        run = self.state.run(config['id'])
+        if run.get('status') in ('succeeded', 'failed', 'cancelled'):
+            return
+        run['config'] = config
+
+        # A slot is held from submission until the job finishes, bounding active jobs
+        async with self.active:
+            try:
+                if not run.get('job_id'):
+                    file_id = await self.upload(config['shard'])
+                    params = fine_tuning_job_params(file_id, config['model'], config['n_epochs'],
+                                                    config['learning_rate_multiplier'], config['suffix'])
+                    job = await _call_api(self.limiter, self.client.fine_tuning.jobs.create, **params)
+                    run.update({'job_id': job.id, 'status': job.status, 'submitted_at': time.time()})
+                    self.state.save()
+                    print(f"🚀 {config['id']}: {job.id}")
+
+                def on_event(job_id: str, event: Any):
+                    print(format_event(job_id, event))
+                    if getattr(event, 'type', None) == 'metrics' and event.data:
+                        run['metrics'] = dict(event.data)
+
+                job = await watch_job(self.client, run['job_id'], on_event=on_event, limiter=self.polls)
+                run.update({
+                    'status': job.status,
+                    'fine_tuned_model': job.fine_tuned_model,
+                    'trained_tokens': getattr(job, 'trained_tokens', None),
+                    'error': str(job.error) if job.status != 'succeeded' and job.error else None,
+                    'finished_at': time.time(),
+                })
+            except Exception as e:
+                print(f"❌ {config['id']}: {e}")
+                run.update({'status': 'error', 'error': str(e)})
+            self.state.save()
+
+    async def run(self) -> Dict:
+        await asyncio.gather(*(self.run_config(config) for config in self.configs))
+        return self.summary()
+
+    def summary(self) -> Dict:
+        """Outcome of every configuration in this grid"""
+        runs = []
+        for config in self.configs:
+            run = self.state.run(config['id'])
+            runs.append({
+                **{key: config[key] for key in ('id', 'model', 'n_epochs', 'learning_rate_multiplier', 'shard')},
+                **{key: run.get(key) for key in ('job_id', 'status', 'fine_tuned_model', 'trained_tokens', 'metrics', 'error')},
+            })
+        return {'runs': runs}
+
+def run_sweep(configs: List[Dict], state_file: str = DEFAULT_STATE_FILE, summary_file: str = DEFAULT_SUMMARY_FILE,
+              max_active_jobs: int = MAX_ACTIVE_JOBS, requests_per_minute: float = REQUESTS_PER_MINUTE,
+              api_key: Optional[str] = None, base_url: Optional[str] = None) -> Dict:
+    """Blocking entry point: run the sweep with a fresh AsyncOpenAI client and write the summary"""
+    import openai
+
+    print(f"🧪 Sweeping {len(configs)} configurations, at most {max_active_jobs} active at once")
+
+    async def run():
+        async with openai.AsyncOpenAI(api_key=api_key, base_url=base_url) as client:
+            sweep = Sweep(client, configs, SweepState(state_file), max_active_jobs, requests_per_minute)
+            return await sweep.run()
+
+    summary = asyncio.run(run())
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n📋 Sweep summary ({summary_file})")
+    for run in summary['runs']:
+        loss = (run['metrics'] or {}).get('train_loss')
+        print(f"  {run['id']:<60} {run['status'] or 'pending':<10} "
+              f"{'' if loss is None else f'loss {loss:.4f}  '}{run['fine_tuned_model'] or ''}")
+    return summary
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Synthetic Steam Review Generator
+Produces any number of realistic-looking, seeded Steam reviews with NumPy and
+Arrow compute, written straight to Arrow IPC or raw-dataset JSONL
+"""
+
+import argparse
+import gzip
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_GAMES = 5000
+DEFAULT_BATCH_SIZE = 500_000
+
+FILLER_WORDS = (
+    "the a an and it this game i is to of was but for you in that with my on just not have so are be "
+    "really very much more time some can if all get one like play played playing would out when there "
+    "they its after first hours still even only because what about well also through again then into"
+).split()
+ASPECT_WORDS = (
+    "graphics visuals beautiful art style animation gameplay mechanics controls combat challenging "
+    "story plot narrative characters writing ending performance fps lag optimization crashes bugs "
+    "multiplayer online coop friends pvp servers price value worth money expensive sale content "
+    "soundtrack music levels bosses puzzles exploration"
+).split()
+POSITIVE_WORDS = (
+    "great amazing excellent love recommend fun enjoyable addictive immersive polished masterpiece "
+    "solid charming satisfying"
+).split()
+NEGATIVE_WORDS = (
+    "bad terrible boring frustrating waste disappointed broken grindy unfinished clunky refund "
+    "repetitive buggy overpriced"
+).split()
+# Each word slot is filler, an aspect, or sentiment language (mostly matching the verdict)
+WORD_MIX = {'filler': 0.78, 'aspect': 0.14, 'sentiment': 0.08}
+OFF_SENTIMENT_RATE = 0.2  # Share of sentiment words that argue against the reviewer's verdict
+SENTENCE_END_RATE = 0.08  # Share of words that close a sentence
+
+GAME_ADJECTIVES = (
+    "Dark Lost Eternal Hollow Iron Neon Crimson Silent Broken Ancient Stellar Wild Frozen Last Hidden Rogue"
+).split()
+GAME_NOUNS = (
+    "Kingdom Frontier Legacy Dungeon Odyssey Protocol Empire Horizon Colony Signal Citadel Outpost Tides Saga Rift Forge"
+).split()
+
+def game_name(game_id: int) -> str:
+    """Deterministic title for a synthetic game id"""
+    adjective = GAME_ADJECTIVES[game_id % len(GAME_ADJECTIVES)]
+    noun = GAME_NOUNS[(game_id // len(GAME_ADJECTIVES)) % len(GAME_NOUNS)]
+    sequel = game_id // (len(GAME_ADJECTIVES) * len(GAME_NOUNS))
+    return f"{adjective} {noun}" + (f" {sequel + 1}" if sequel else "")
+
+def _vocabulary() -> pa.Array:
+    """Every word form, plain and sentence-ending; pools index into it by offset"""
+    words = FILLER_WORDS + ASPECT_WORDS + POSITIVE_WORDS + NEGATIVE_WORDS
+    return pa.array(words + [f"{word}." for word in words])
+
+def _pool_offsets() -> Dict[str, tuple]:
+    """(start, size) of each word pool inside the vocabulary"""
+    offsets = {}
+    start = 0
+    for name, pool in (('filler', FILLER_WORDS), ('aspect', ASPECT_WORDS),
+                       ('positive', POSITIVE_WORDS), ('negative', NEGATIVE_WORDS)):
+        offsets[name] = (start, len(pool))
+        start += len(pool)
+    return offsets
+
+def _game_positive_rates(games: int, seed: int) -> np.ndarray:
+    """Share of positive reviews per game: most games are liked, some are panned"""
+    return np.random.default_rng([seed, 0]).beta(4.0, 1.3, games)
+
+def generate_review_batch(count: int, rng: np.random.Generator, game_rates: np.ndarray,
+                          first_user: int = 0) -> pa.RecordBatch:
+    """count reviews in the normalized review schema, built column-wise
+
+    Distributions: log-normal length (median ~55 words), game popularity
+    Zipf-like, per-game sentiment, log-normal playtime, and helpful votes
+    that grow with length and are heavy-tailed.
+    """
+    vocabulary = _vocabulary()
+    pools = _pool_offsets()
+    plain_words = len(vocabulary) // 2
+
+    games = len(game_rates)
+    game_ids = ((rng.pareto(1.1, count) * games / 20).astype(np.int64) % games)
+    recommend = rng.random(count) < game_rates[game_ids]
+    lengths = np.clip(rng.lognormal(4.0, 0.75, count), 3, 350).astype(np.int64)
+    total = int(lengths.sum())
+
+    # One 64-bit draw per word slot, sliced into four 16-bit uniforms:
+    # pool kind, sentiment flip, word within the pool, sentence end
+    bits = rng.integers(0, 2 ** 63, total, dtype=np.uint64)
+    uniform = [((bits >> np.uint64(shift)) & np.uint64(0xFFFF)).astype(np.uint32) for shift in (0, 16, 32, 48)]
+    kind = np.searchsorted(np.cumsum(list(WORD_MIX.values())) * 0x10000 / sum(WORD_MIX.values()),
+                           uniform[0], side='right').astype(np.int8)
+    # Sentiment words (kind 2) become kind 3 for the opposite verdict
+    against = uniform[1] < OFF_SENTIMENT_RATE * 0x10000
+    kind += ((kind == 2) & (np.repeat(~recommend, lengths) ^ against)).astype(np.int8)
+
+    pool_start = np.array([pools[name][0] for name in ('filler', 'aspect', 'positive', 'negative')], dtype=np.int64)
+    pool_size = np.array([pools[name][1] for name in ('filler', 'aspect', 'positive', 'negative')], dtype=np.int64)
+    word_index = pool_start[kind] + ((uniform[2] * pool_size[kind]) >> 16)
+    ends_sentence = uniform[3] < SENTENCE_END_RATE * 0x10000
+    ends_sentence[np.cumsum(lengths) - 1] = True
+    word_index += ends_sentence * plain_words
+
+    offsets = pa.array(np.r_[0, np.cumsum(lengths)].astype(np.int32))
+    words = pa.ListArray.from_arrays(offsets, vocabulary.take(pa.array(word_index)))
+    texts = pc.binary_join(words, ' ')
+
+    hours = np.round(rng.lognormal(2.6, 1.4, count), 1)
+    helpful = rng.poisson(np.exp(rng.normal(-0.8, 1.3, count)) * np.sqrt(lengths / 40))
+    funny = rng.poisson(0.15 + 0.05 * helpful)
+    names = pa.array([game_name(int(game_id)) for game_id in np.unique(game_ids)])
+
+    return pa.RecordBatch.from_pydict({
+        'user_id': pc.cast(pa.array(np.arange(first_user, first_user + count)), pa.string()),
+        'game_id': pa.array(game_ids + 10),
+        'game_name': names.take(pa.array(np.searchsorted(np.unique(game_ids), game_ids))),
+        'review_text': texts,
+        'recommend': pa.array(recommend),
+        'helpful': pa.array(helpful.astype(np.int64)),
+        'funny': pa.array(funny.astype(np.int64)),
+        'hours': pa.array(hours),
+    })
+
+def generate_reviews(count: int, seed: int = 0, games: int = DEFAULT_GAMES,
+                     batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+    """Yield count synthetic reviews in record batches; the same seed and count give the same reviews"""
+    game_rates = _game_positive_rates(games, seed)
+    for batch_number, start in enumerate(range(0, count, batch_size)):
+        rng = np.random.default_rng([seed, batch_number + 1])
+        yield generate_review_batch(min(batch_size, count - start), rng, game_rates, first_user=start)
+
+def synthetic_reviews(count: int, seed: int = 0, games: int = DEFAULT_GAMES) -> List[Dict]:
+    """count synthetic reviews as a list of normalized review dicts"""
+    return [review for batch in generate_reviews(count, seed, games) for review in batch.to_pylist()]
+
+def raw_jsonl_lines(batch: pa.RecordBatch) -> pa.Array:
+    """Render normalized reviews as raw ksang/steamreviews JSONL lines, without a per-row json.dumps
+
+    Generated text and names never contain quotes or backslashes, so the
+    columns can be spliced into the JSON template as-is.
+    """
+    score = pc.if_else(batch.column('recommend'), '1', '-1')
+    parts = [
+        '{"app_id": ', pc.cast(batch.column('game_id'), pa.string()),
+        ', "app_name": "', batch.column('game_name'),
+        '", "review_text": "', batch.column('review_text'),
+        '", "review_score": ', score,
+        ', "review_votes": ', pc.cast(batch.column('helpful'), pa.string()),
+        '}\n',
+    ]
+    return pc.binary_join_element_wise(*parts, '')
+
+def write_jsonl(path: str, count: int, seed: int = 0, games: int = DEFAULT_GAMES) -> int:
+    """Write raw dataset rows as JSONL (gzip if path ends in .gz), readable by --source"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with (gzip.open(path, 'wb', compresslevel=1) if path.endswith('.gz') else open(path, 'wb')) as f:
+        for batch in generate_reviews(count, seed, games):
+            lines = raw_jsonl_lines(batch)
+            f.write(pc.binary_join(pa.ListArray.from_arrays(pa.array([0, len(lines)], pa.int32()), lines), '')[0].as_buffer())
+    return count
+
+def write_arrow(path: str, count: int, seed: int = 0, games: int = DEFAULT_GAMES) -> int:
+    """Write normalized reviews as an Arrow IPC file, readable by review_cache.read_review_cache"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    writer = None
+    try:
+        for batch in generate_reviews(count, seed, games):
+            if writer is None:
+                writer = pa.ipc.new_file(path, batch.schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Generate synthetic Steam reviews")
+    parser.add_argument('count', type=int, help="Number of reviews")
+    parser.add_argument('--output', default='synthetic_reviews.jsonl.gz',
+                        help="Output file: .arrow for the columnar cache format, .jsonl[.gz] for raw rows")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--games', type=int, default=DEFAULT_GAMES, help="Number of distinct games")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    """Main execution function"""
+    args = parse_args(argv)
+    write = write_arrow if args.output.endswith('.arrow') else write_jsonl
+    write(args.output, args.count, args.seed, args.games)
+    print(f"Wrote {args.count:,} synthetic reviews to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Tests for chunked, resumable uploads, against a stand-in of the Uploads API"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import pytest
+import chunked_upload
+from chunked_upload import UploadJournal, journal_path, upload_file, upload_file_chunked
+
+PART_SIZE = 1000
+
+class FakeUploads:
+    """uploads stand-in keeping every part's bytes, so complete() can reassemble the file
+
+    fail maps a part's byte offset to how many of its attempts fail.
+    """
+
+    def __init__(self, fail=None, delay: float = 0.01):
+        self.fail = dict(fail or {})
+        self.delay = delay
+        self.created = []
+        self.parts = {}
+        self.attempts = []
+        self.completed = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.parts_api = SimpleNamespace(create=self._create_part)
+
+    @property
+    def uploads(self):
+        return SimpleNamespace(create=self._create, parts=self.parts_api, complete=self._complete)
+
+    async def _create(self, bytes, filename, mime_type, purpose):
+        upload_id = f"upload_{len(self.created)}"
+        self.created.append({'id': upload_id, 'bytes': bytes, 'filename': filename, 'purpose': purpose})
+        return SimpleNamespace(id=upload_id, expires_at=int(time.time()) + 3600)
+
+    async def _create_part(self, upload_id, data):
+        self.attempts.append(data[:20])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            key = data[:20]
+            if self.fail.get(key):
+                self.fail[key] -= 1
+                raise ConnectionError("connection reset")
+            part_id = f"part_{len(self.parts)}"
+            self.parts[part_id] = data
+            return SimpleNamespace(id=part_id)
+        finally:
+            self.in_flight -= 1
+
+    async def _complete(self, upload_id, part_ids, md5):
+        self.completed.append({'upload_id': upload_id, 'part_ids': list(part_ids), 'md5': md5})
+        content = b''.join(self.parts[part_id] for part_id in part_ids)
+        return SimpleNamespace(id=upload_id, file=SimpleNamespace(id=f"file-{hashlib.md5(content).hexdigest()}"))
+
+def _training_file(tmp_path, parts: float) -> str:
+    """A file of numbered lines, PART_SIZE * parts bytes long; every part starts differently"""
+    path = str(tmp_path / "train.jsonl")
+    line = 100
+    with open(path, 'wb') as f:
+        for index in range(int(PART_SIZE * parts) // line):
+            f.write(f"{index:06d}".encode() + b'x' * (line - 7) + b'\n')
+    return path
+
+def _part_key(path: str, index: int) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(index * PART_SIZE)
+        return f.read(20)
+
+def _expected_file_id(path: str) -> str:
+    with open(path, 'rb') as f:
+        return f"file-{hashlib.md5(f.read()).hexdigest()}"
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    """Retry back-off sleeps return at once"""
+    sleep = asyncio.sleep
+    monkeypatch.setattr(chunked_upload.asyncio, 'sleep', lambda seconds: sleep(min(seconds, 0.01)))
+
+def test_file_is_split_into_ordered_parts_and_completed(tmp_path):
+    path = _training_file(tmp_path, 5.5)
+    client = FakeUploads()
+
+    file_id = asyncio.run(upload_file_chunked(client, path, part_size=PART_SIZE))
+
+    assert file_id == _expected_file_id(path)
+    assert client.created[0]['bytes'] == os.path.getsize(path)
+    assert sorted(len(data) for data in client.parts.values()) == [500] + [PART_SIZE] * 5
+    (completed,) = client.completed
+    # Part ids are passed in file order, whatever order the parts finished in
+    assert [client.parts[part_id][:20] for part_id in completed['part_ids']] == [_part_key(path, index) for index in range(6)]
+    with open(path, 'rb') as f:
+        assert completed['md5'] == hashlib.md5(f.read()).hexdigest()
+    assert not os.path.exists(journal_path(path))
+
+def test_parts_upload_concurrently_up_to_the_limit(tmp_path):
+    path = _training_file(tmp_path, 8)
+    client = FakeUploads(delay=0.05)
+
+    asyncio.run(upload_file_chunked(client, path, part_size=PART_SIZE, max_concurrent_parts=3))
+
+    assert client.max_in_flight == 3
+    assert len(client.parts) == 8
+
+def test_failed_part_is_retried_alone(tmp_path):
+    path = _training_file(tmp_path, 4)
+    client = FakeUploads(fail={_part_key(path, 2): 2})
+
+    file_id = asyncio.run(upload_file_chunked(client, path, part_size=PART_SIZE))
+
+    assert file_id == _expected_file_id(path)
+    assert client.attempts.count(_part_key(path, 2)) == 3
+    assert all(client.attempts.count(_part_key(path, index)) == 1 for index in (0, 1, 3))
+
+def test_interrupted_upload_resumes_with_only_the_missing_parts(tmp_path, monkeypatch):
+    path = _training_file(tmp_path, 5)
+    monkeypatch.setattr(chunked_upload, 'MAX_PART_RETRIES', 2)
+    failing = FakeUploads(fail={_part_key(path, 3): 2})
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(upload_file_chunked(failing, path, part_size=PART_SIZE))
+
+    journal = UploadJournal(path)
+    assert journal.data['upload_id'] == 'upload_0'
+    assert sorted(journal.data['parts']) == ['0', '1', '2', '4']
+    assert not failing.completed
+
+    # The same upload carries on: no new upload is created and only part 4 of 5 is sent again
+    resumed = FakeUploads()
+    resumed.created = failing.created[:]
+    resumed.parts = dict(failing.parts)
+    file_id = asyncio.run(upload_file_chunked(resumed, path, part_size=PART_SIZE))
+
+    assert len(resumed.created) == 1
+    assert resumed.attempts == [_part_key(path, 3)]
+    assert file_id == _expected_file_id(path)
+    (completed,) = resumed.completed
+    assert completed['upload_id'] == 'upload_0'
+    assert [resumed.parts[part_id][:20] for part_id in completed['part_ids']] == [_part_key(path, index) for index in range(5)]
+    assert not os.path.exists(journal_path(path))
+
+def test_changed_file_starts_a_new_upload(tmp_path):
+    path = _training_file(tmp_path, 3)
+    UploadJournal(path).start('upload_stale', int(time.time()) + 3600, {'bytes': 1, 'mtime_ns': 0}, PART_SIZE)
+    client = FakeUploads()
+
+    asyncio.run(upload_file_chunked(client, path, part_size=PART_SIZE))
+
+    assert [upload['id'] for upload in client.created] == ['upload_0']
+    assert client.completed[0]['upload_id'] == 'upload_0'
+
+class _UploadsHandler(BaseHTTPRequestHandler):
+    """Minimal Uploads API over HTTP: create, add part (multipart form) and complete"""
+
+    uploads = {}
+    lock = threading.Lock()
+
+    def _reply(self, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        parts = self.path.strip('/').split('/')  # uploads [/ <id> / parts | complete]
+        with self.lock:
+            if len(parts) == 1:
+                request = json.loads(body)
+                upload_id = f"upload_{len(self.uploads)}"
+                self.uploads[upload_id] = {'parts': {}, 'request': request}
+                return self._reply({'object': 'upload', 'id': upload_id, 'status': 'pending', 'bytes': request['bytes'],
+                                    'filename': request['filename'], 'purpose': request['purpose'],
+                                    'created_at': 0, 'expires_at': int(time.time()) + 3600})
+            upload = self.uploads[parts[1]]
+            if parts[2] == 'parts':
+                form = BytesParser().parsebytes(b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + body)
+                data = next(part.get_payload(decode=True) for part in form.get_payload()
+                            if part.get_param('name', header='content-disposition') == 'data')
+                part_id = f"part_{len(upload['parts'])}"
+                upload['parts'][part_id] = data
+                return self._reply({'object': 'upload.part', 'id': part_id, 'upload_id': parts[1], 'created_at': 0})
+            request = json.loads(body)
+            upload['complete'] = request
+            content = b''.join(upload['parts'][part_id] for part_id in request['part_ids'])
+            return self._reply({'object': 'upload', 'id': parts[1], 'status': 'completed', 'bytes': len(content),
+                                'filename': upload['request']['filename'], 'purpose': upload['request']['purpose'],
+                                'created_at': 0, 'expires_at': 0,
+                                'file': {'object': 'file', 'id': f"file-{hashlib.md5(content).hexdigest()}",
+                                         'bytes': len(content), 'created_at': 0,
+                                         'filename': upload['request']['filename'], 'purpose': 'fine-tune',
+                                         'status': 'processed'}})
+
+    def log_message(self, *args):
+        pass
+
+def test_upload_file_against_a_local_http_stand_in(tmp_path):
+    pytest.importorskip('openai')
+    path = _training_file(tmp_path, 3.5)
+    _UploadsHandler.uploads = {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _UploadsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        file_id = upload_file(path, api_key='test', base_url=f"http://127.0.0.1:{server.server_port}",
+                              part_size=PART_SIZE)
+    finally:
+        server.shutdown()
+
+    assert file_id == _expected_file_id(path)
+    (upload,) = _UploadsHandler.uploads.values()
+    assert upload['request']['bytes'] == os.path.getsize(path)
+    assert len(upload['parts']) == 4
+    with open(path, 'rb') as f:
+        assert upload['complete']['md5'] == hashlib.md5(f.read()).hexdigest()
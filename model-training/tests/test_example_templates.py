@@ -0,0 +1,24 @@
+"""Tests for rendering precompiled training example templates"""
+
+import random
+from example_templates import UNKNOWN_GAME_NAME, compile_templates
+
+TEMPLATES = [{
+    "name": "matching",
+    "when": {"recommend": True},
+    "questions": ["What games have {aspects}?"],
+    "aspects": [("story", "a good story")],
+    "response": "Games like {game_name} get praise when players say '{sample_text}'",
+}]
+
+def test_missing_game_names_fall_back_to_this_game():
+    templates = compile_templates(TEMPLATES, "You are a gaming advisor.")
+    names = ["Portal 2", None, "", "   "]
+
+    examples = templates.render({'recommend': [True] * 4, 'story': [True] * 4}, ["great story"] * 4, names,
+                                lambda row: random.Random(row))
+
+    assert examples.responses == [
+        "Games like Portal 2 get praise when players say 'great story'",
+        *[f"Games like {UNKNOWN_GAME_NAME} get praise when players say 'great story'"] * 3,
+    ]
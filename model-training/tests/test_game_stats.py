@@ -0,0 +1,47 @@
+"""Tests for per-game statistics and the review index over reviews with and without a game_id"""
+
+import numpy as np
+import pyarrow as pa
+from game_stats import GameStats, aggregate_game_stats, write_game_stats
+from review_batch import ReviewBatch
+from review_index import build_review_index, open_review_index
+
+def _reviews(game_ids) -> ReviewBatch:
+    rows = len(game_ids)
+    return ReviewBatch.from_table(pa.table({
+        'user_id': pa.array([f"u{index}" for index in range(rows)]),
+        'game_id': pa.array(game_ids, pa.int64()),
+        'game_name': pa.array(['' if game is None else f"Game {game}" for game in game_ids]),
+        'review_text': pa.array([f"review {index} about combat and story" for index in range(rows)]),
+        'recommend': pa.array([index % 2 == 0 for index in range(rows)]),
+        'helpful': pa.array(np.arange(rows, dtype=np.int64)),
+        'funny': pa.array(np.zeros(rows, dtype=np.int64)),
+        'hours': pa.array(np.zeros(rows)),
+    }))
+
+def test_reviews_without_a_game_id_are_left_out_of_game_stats(tmp_path):
+    reviews = _reviews([10, None, 20, 10, None, 20])
+    flags = {'story': np.array([True, True, False, True, True, False])}
+
+    stats = aggregate_game_stats(reviews, flags, ['story'])
+
+    assert stats.column('game_id').to_pylist() == [10, 20]
+    assert stats.column('reviews').to_pylist() == [2, 2]
+    assert stats.column('story_rate').to_pylist() == [1.0, 0.0]
+    assert stats.column('positive_ratio').to_pylist() == [0.5, 0.5]
+    assert stats.column('mean_helpful').to_pylist() == [1.5, 3.5]
+    path = str(tmp_path / "game_stats.arrow")
+    write_game_stats(stats, path)
+    assert GameStats(path).get(20)['reviews'] == 2
+
+def test_reviews_without_a_game_id_are_indexed_under_no_game(tmp_path):
+    reviews = _reviews([10, None, 20, None])
+    path = str(tmp_path / "index")
+
+    meta = build_review_index(reviews, {'story': [True] * 4}, path)
+
+    assert sorted(game for game, _ in meta['games'] if game is not None) == [10, 20]
+    index = open_review_index(path)
+    assert [hit['review'] for hit in index.search("combat", k=10, game=10)] == [0]
+    assert sorted(hit['review'] for hit in index.search("combat", k=10)) == [0, 1, 2, 3]
+    assert index.search("combat", game="None") == []
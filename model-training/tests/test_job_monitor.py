@@ -0,0 +1,219 @@
+"""Tests for the async fine-tuning job monitor, against a fake client and a local HTTP stand-in"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+import pytest
+from job_monitor import (
+    BACKOFF_FACTOR, ERROR_BACKOFF, fetch_new_events, format_event, monitor_jobs, watch_job, watch_jobs
+)
+
+def _event(job_id: str, number: int) -> SimpleNamespace:
+    return SimpleNamespace(id=f"{job_id}-ev{number}", type='metrics', level='info', message=f"Step {number}",
+                           data={'step': number, 'train_loss': 1.0 / number})
+
+class FakeJobs:
+    """fine_tuning.jobs stand-in replaying a script of polls per job
+
+    Each poll is (status, new event count): retrieve moves the job on to
+    its next poll, publishing that poll's events as its status is set, and
+    reports the status; list_events sees every event published so far.
+    """
+
+    def __init__(self, script, failures=()):
+        self.script = script
+        self.polls = {job_id: -1 for job_id in script}
+        self.published = {job_id: [] for job_id in script}
+        self.failures = list(failures)  # Poll numbers whose list_events raises, once each
+        self.pages = []
+
+    def _publish(self, job_id):
+        wanted = sum(count for _, count in self.script[job_id][:self.polls[job_id] + 1])
+        while len(self.published[job_id]) < wanted:
+            self.published[job_id].append(_event(job_id, len(self.published[job_id]) + 1))
+
+    async def list_events(self, job_id, limit, after=None):
+        if self.failures and self.failures[0] == self.polls[job_id]:
+            self.failures.pop(0)
+            raise ConnectionError("rate limited")
+        newest_first = self.published[job_id][::-1]
+        start = 0 if after is None else [event.id for event in newest_first].index(after) + 1
+        page = newest_first[start:start + limit]
+        self.pages.append((job_id, after, [event.id for event in page]))
+        return SimpleNamespace(data=page, has_more=start + limit < len(newest_first))
+
+    async def retrieve(self, job_id):
+        polls = self.script[job_id]
+        self.polls[job_id] = min(self.polls[job_id] + 1, len(polls) - 1)
+        self._publish(job_id)
+        status = polls[self.polls[job_id]][0]
+        return SimpleNamespace(id=job_id, status=status, fine_tuned_model=f"ft:{job_id}" if status == 'succeeded' else None,
+                               error=None)
+
+def _client(jobs: FakeJobs) -> SimpleNamespace:
+    return SimpleNamespace(fine_tuning=SimpleNamespace(jobs=jobs))
+
+class Sleeps:
+    """Records requested sleeps without waiting"""
+
+    def __init__(self):
+        self.intervals = []
+
+    async def __call__(self, seconds):
+        self.intervals.append(seconds)
+
+def test_fetch_new_events_pages_back_to_the_last_seen_event():
+    jobs = FakeJobs({'job': [('running', 7)]})
+    asyncio.run(jobs.retrieve('job'))
+
+    events = asyncio.run(fetch_new_events(_client(jobs), 'job', 'job-ev2', page_size=2))
+
+    assert [event.id for event in events] == [f"job-ev{number}" for number in range(3, 8)]
+    # Newest-first pages, each continuing after the oldest event of the one before
+    assert [after for _, after, _ in jobs.pages] == [None, 'job-ev6', 'job-ev4']
+
+def test_fetch_new_events_reads_to_the_start_of_a_new_job():
+    jobs = FakeJobs({'job': [('running', 5)]})
+    asyncio.run(jobs.retrieve('job'))
+
+    events = asyncio.run(fetch_new_events(_client(jobs), 'job', None, page_size=2))
+
+    assert [event.id for event in events] == [f"job-ev{number}" for number in range(1, 6)]
+
+def test_watch_job_streams_every_event_once_in_order():
+    jobs = FakeJobs({'job': [('queued', 0), ('running', 3), ('running', 0), ('running', 4), ('succeeded', 1)]})
+    seen = []
+
+    job = asyncio.run(watch_job(_client(jobs), 'job', on_event=lambda job_id, event: seen.append(event.id),
+                                sleep=Sleeps()))
+
+    assert job.status == 'succeeded'
+    assert job.fine_tuned_model == 'ft:job'
+    assert seen == [f"job-ev{number}" for number in range(1, 9)]
+
+def test_events_written_as_the_job_finishes_are_reported():
+    # The final metrics and status messages appear together with the terminal status
+    jobs = FakeJobs({'job': [('running', 2), ('succeeded', 3)]})
+    seen = []
+
+    job = asyncio.run(watch_job(_client(jobs), 'job', on_event=lambda job_id, event: seen.append(event.id),
+                                sleep=Sleeps()))
+
+    assert job.status == 'succeeded'
+    assert seen == [f"job-ev{number}" for number in range(1, 6)]
+
+def test_poll_interval_backs_off_while_quiet_and_resets_on_events():
+    jobs = FakeJobs({'job': [('running', 0)] * 6 + [('running', 2), ('running', 0), ('succeeded', 0)]})
+    sleeps = Sleeps()
+
+    asyncio.run(watch_job(_client(jobs), 'job', on_event=lambda *_: None, sleep=sleeps,
+                          min_interval=2.0, max_interval=10.0))
+
+    quiet = [2.0 * BACKOFF_FACTOR ** power for power in range(1, 4)]
+    assert sleeps.intervals[:3] == pytest.approx(quiet)
+    assert sleeps.intervals[3:6] == [10.0, 10.0, 10.0]  # Capped at max_interval
+    # Events arriving on poll 7 snap the interval back to min_interval, then it grows again
+    assert sleeps.intervals[6:] == pytest.approx([2.0, 2.0 * BACKOFF_FACTOR])
+
+def test_failed_poll_waits_and_retries_without_losing_events():
+    jobs = FakeJobs({'job': [('running', 2), ('running', 2), ('succeeded', 1)]}, failures=[1])
+    sleeps = Sleeps()
+    seen = []
+
+    job = asyncio.run(watch_job(_client(jobs), 'job', on_event=lambda job_id, event: seen.append(event.id),
+                                sleep=sleeps))
+
+    assert job.status == 'succeeded'
+    assert ERROR_BACKOFF in sleeps.intervals
+    assert seen == [f"job-ev{number}" for number in range(1, 6)]
+
+def test_watch_jobs_follows_jobs_concurrently_and_keeps_each_stream_ordered():
+    jobs = FakeJobs({
+        'a': [('running', 2), ('running', 2), ('succeeded', 0)],
+        'b': [('running', 1), ('running', 0), ('running', 3), ('failed', 0)],
+    })
+    seen = {'a': [], 'b': []}
+
+    results = asyncio.run(watch_jobs(_client(jobs), ['a', 'b'], sleep=Sleeps(),
+                                     on_event=lambda job_id, event: seen[job_id].append(event.id)))
+
+    assert {job_id: job.status for job_id, job in results.items()} == {'a': 'succeeded', 'b': 'failed'}
+    assert seen == {'a': [f"a-ev{number}" for number in range(1, 5)], 'b': [f"b-ev{number}" for number in range(1, 5)]}
+
+class SlowJobs(FakeJobs):
+    """FakeJobs whose calls take a moment, counting how many are in flight"""
+
+    def __init__(self, script):
+        super().__init__(script)
+        self.in_flight = self.max_in_flight = 0
+
+    async def _slowly(self, call, *args, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            return await call(*args, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+    async def retrieve(self, job_id):
+        return await self._slowly(super().retrieve, job_id)
+
+    async def list_events(self, job_id, limit, after=None):
+        return await self._slowly(super().list_events, job_id, limit, after)
+
+def test_one_limiter_bounds_requests_across_every_watched_job():
+    jobs = SlowJobs({job_id: [('running', 1), ('running', 1), ('succeeded', 1)] for job_id in 'abcdef'})
+
+    results = asyncio.run(watch_jobs(_client(jobs), list('abcdef'), sleep=Sleeps(), on_event=lambda *_: None,
+                                     limiter=asyncio.Semaphore(2)))
+
+    assert all(job.status == 'succeeded' for job in results.values())
+    assert jobs.max_in_flight == 2
+
+class _FineTuningHandler(BaseHTTPRequestHandler):
+    """Minimal fine-tuning API: every job has finished, with three metrics events"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')  # fine_tuning / jobs / <id> [/ events]
+        job_id = parts[2]
+        if parts[-1] == 'events':
+            events = [{'object': 'fine_tuning.job.event', 'id': f"{job_id}-ev{number}", 'created_at': number,
+                       'level': 'info', 'message': f"Step {number}", 'type': 'metrics',
+                       'data': {'step': number, 'train_loss': 1.0 / number}} for number in (3, 2, 1)]
+            limit = int(parse_qs(url.query).get('limit', ['100'])[0])
+            body = {'object': 'list', 'data': events[:limit], 'has_more': limit < len(events)}
+        else:
+            body = {'object': 'fine_tuning.job', 'id': job_id, 'status': 'succeeded', 'model': 'gpt-4o-mini',
+                    'fine_tuned_model': f"ft:{job_id}", 'created_at': 0, 'finished_at': 1, 'organization_id': 'org',
+                    'result_files': [], 'training_file': 'file-1', 'validation_file': None,
+                    'hyperparameters': {'n_epochs': 3}, 'trained_tokens': 100, 'error': None, 'seed': 0}
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def test_monitor_jobs_against_a_local_http_stand_in(capsys):
+    pytest.importorskip('openai')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _FineTuningHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        jobs = monitor_jobs(['ftjob-1', 'ftjob-2'], api_key='test', base_url=f"http://127.0.0.1:{server.server_port}")
+    finally:
+        server.shutdown()
+
+    assert {job_id: job.fine_tuned_model for job_id, job in jobs.items()} == {'ftjob-1': 'ft:ftjob-1', 'ftjob-2': 'ft:ftjob-2'}
+    lines = [line for line in capsys.readouterr().out.splitlines() if line.startswith('📉 ftjob-1')]
+    # The API pages newest first; events print oldest first
+    expected = [SimpleNamespace(type='metrics', data={'step': number, 'train_loss': 1.0 / number}) for number in (1, 2, 3)]
+    assert lines == [format_event('ftjob-1', event) for event in expected]
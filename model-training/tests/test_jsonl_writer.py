@@ -0,0 +1,68 @@
+"""Tests for sharded JSONL output"""
+
+import json
+import os
+from jsonl_writer import ShardedJsonlWriter, encode_example, read_manifest, shard_paths, write_sharded_jsonl
+
+def _example(index: int) -> dict:
+    return {"messages": [{"role": "user", "content": f"question {index:04d}"},
+                         {"role": "assistant", "content": "x" * 80}]}
+
+def _read_rows(path: str) -> list:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def test_rollover_fills_every_shard(tmp_path):
+    examples = [_example(index) for index in range(100)]
+    line_bytes = len(encode_example(examples[0]))
+    filename = str(tmp_path / "train.jsonl")
+
+    manifest = write_sharded_jsonl(examples, filename, max_shard_bytes=line_bytes * 30)
+
+    # 30 lines fit per shard, and no shard is a single leftover line
+    assert [shard['rows'] for shard in manifest['shards']] == [30, 30, 30, 10]
+    assert [shard['uncompressed_bytes'] for shard in manifest['shards']] == [line_bytes * rows for rows in (30, 30, 30, 10)]
+    paths = shard_paths(read_manifest(filename))
+    assert [os.path.basename(path) for path in paths] == [f"train-{index:05d}-of-00004.jsonl" for index in range(4)]
+    assert [row for path in paths for row in _read_rows(path)] == examples
+
+def test_rollover_with_a_small_write_buffer(tmp_path):
+    examples = [_example(index) for index in range(25)]
+    line_bytes = len(encode_example(examples[0]))
+    filename = str(tmp_path / "train.jsonl")
+
+    with ShardedJsonlWriter(filename, max_shard_bytes=line_bytes * 10, max_buffer_rows=3) as writer:
+        writer.write_all(examples)
+        manifest = writer.close()
+
+    assert [shard['rows'] for shard in manifest['shards']] == [10, 10, 5]
+    assert manifest['rows'] == 25
+
+def test_single_shard_keeps_the_plain_filename(tmp_path):
+    filename = str(tmp_path / "train.jsonl")
+
+    manifest = write_sharded_jsonl([_example(index) for index in range(5)], filename)
+
+    assert [shard['file'] for shard in manifest['shards']] == ["train.jsonl"]
+    assert manifest['shards'][0]['rows'] == 5
+    assert len(_read_rows(filename)) == 5
+
+def test_no_examples_give_a_manifest_without_shards(tmp_path):
+    filename = str(tmp_path / "train.jsonl")
+
+    manifest = write_sharded_jsonl([], filename)
+
+    assert manifest['rows'] == 0
+    assert manifest['shards'] == []
+    assert shard_paths(read_manifest(filename)) == []
+    assert not os.path.exists(filename)
+
+def test_training_on_a_manifest_without_shards_fails_cleanly(tmp_path, capsys):
+    from instrumentation import Instrumentation
+    from train_model import train, upload_training_files
+    filename = str(tmp_path / "train.jsonl")
+    write_sharded_jsonl([], filename)
+
+    assert train(Instrumentation('train'), filename=filename) == 1
+    assert upload_training_files(None, filename) is None
+    assert "holds no training examples" in capsys.readouterr().out
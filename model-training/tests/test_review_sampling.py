@@ -0,0 +1,66 @@
+"""Tests for the streaming stratified sample behind review selection"""
+
+import collections
+import numpy as np
+import pyarrow as pa
+from review_batch import ReviewBatch
+from review_sampling import StratifiedSample, stratum_ids
+
+def _reviews(rows: int, games: int, seed: int = 1) -> ReviewBatch:
+    rng = np.random.default_rng(seed)
+    return ReviewBatch.from_table(pa.table({
+        'user_id': pa.array([f"u{index}" for index in range(rows)]),
+        'game_id': pa.array(rng.integers(1, 10 ** 6, games)[rng.integers(0, games, rows)]),
+        'game_name': pa.array(['Game'] * rows),
+        'review_text': pa.array(['x' * 200] * rows),
+        'recommend': pa.array(rng.random(rows) < 0.5),
+        'helpful': pa.array(np.ones(rows, dtype=np.int64)),
+        'funny': pa.array(np.zeros(rows, dtype=np.int64)),
+        'hours': pa.array(np.zeros(rows)),
+    }))
+
+def _sample(batches, capacity: int, max_strata=None, seed: int = 0) -> StratifiedSample:
+    sample = StratifiedSample(capacity, seed, max_strata)
+    for batch in batches:
+        rows = np.arange(len(batch))
+        games = batch.column('game_id').cast(pa.int64()).to_numpy()
+        sample.add(batch, rows, batch.numpy('recommend'), stratum_ids(len(rows), seed, games))
+    return sample
+
+def test_game_strata_are_drawn_in_a_seeded_random_order():
+    reviews = _reviews(50_000, 5_000)
+
+    drawn = _sample([reviews], capacity=5, max_strata=500).take(1, 500)
+
+    games = drawn.pylist('game_id')
+    assert len(set(games)) == 500  # One review per game before any game gets a second
+    # Lexically small ids (e.g. starting with "1") are not favoured: leading digits spread evenly
+    leading = collections.Counter(str(game)[0] for game in games)
+    assert set(leading) == set('123456789')
+    assert max(leading.values()) < 2 * min(leading.values())
+
+def test_sample_is_the_same_however_the_stream_is_batched():
+    reviews = _reviews(20_000, 3_000)
+    whole = _sample([reviews], capacity=3, max_strata=400).take(0, 400)
+    streamed = _sample((reviews.slice(start, 700) for start in range(0, len(reviews), 700)),
+                       capacity=3, max_strata=400).take(0, 400)
+
+    assert streamed.pylist('user_id') == whole.pylist('user_id')
+
+def test_memory_is_capped_by_max_strata_not_by_the_number_of_games():
+    reviews = _reviews(60_000, 20_000)
+
+    sample = _sample((reviews.slice(start, 1_000) for start in range(0, len(reviews), 1_000)),
+                     capacity=4, max_strata=100)
+
+    assert len(sample) <= 2 * 100 * 4
+    assert sample.pool_rows <= 3 * len(sample) + 4
+
+def test_each_stratum_keeps_at_most_capacity_rows():
+    reviews = _reviews(5_000, 10)
+    sample = _sample([reviews], capacity=7)
+
+    drawn = sample.take(1, 1_000)
+
+    assert len(drawn) == 70
+    assert set(collections.Counter(drawn.pylist('game_id')).values()) == {7}
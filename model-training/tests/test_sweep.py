@@ -0,0 +1,19 @@
+"""Tests for the fine-tuning sweep grid"""
+
+from sweep import sweep_grid
+
+def test_grid_covers_every_combination_with_unique_ids(tmp_path):
+    shards = [str(tmp_path / "a" / "train.jsonl"), str(tmp_path / "b" / "train.jsonl")]
+
+    configs = sweep_grid(["gpt-4o-mini"], [2, 3], [None, 0.5], shards)
+
+    assert len(configs) == 8
+    assert len({config['id'] for config in configs}) == 8
+    # Same-named shards in different directories are told apart
+    assert all(config['id'].split('|')[-1].startswith("train.jsonl@") for config in configs)
+
+def test_ids_are_stable_across_runs(tmp_path):
+    shard = str(tmp_path / "train.jsonl")
+
+    assert [config['id'] for config in sweep_grid(["m"], [3], [None], [shard])] == \
+           [config['id'] for config in sweep_grid(["m"], [3], [None], [shard])]
@@ -0,0 +1,27 @@
+"""Tests for checking training examples against OpenAI's fine-tuning format"""
+
+import json
+import token_counter
+from training_validator import example_problem
+
+def _line(*messages) -> bytes:
+    return json.dumps({'messages': [{'role': role, 'content': content} for role, content in messages]}).encode()
+
+def test_token_limit_is_not_passed_on_an_approximate_count(monkeypatch):
+    monkeypatch.setattr(token_counter, 'get_encoding', lambda: None)
+    line = _line(('user', "Which games have a good story?"), ('assistant', "Try Portal 2."))
+
+    assert example_problem(line) is None  # Short enough that no count is needed
+    assert example_problem(line, max_tokens=40).startswith("unverified token count: ")
+
+def test_weight_is_only_accepted_as_0_or_1_on_assistant_messages():
+    def weighted(role, weight) -> bytes:
+        messages = [{'role': 'user', 'content': "Any good co-op games?"}, {'role': 'assistant', 'content': "Portal 2."}]
+        messages[['user', 'assistant'].index(role)]['weight'] = weight
+        return json.dumps({'messages': messages}).encode()
+
+    assert example_problem(weighted('assistant', 0)) is None
+    assert example_problem(weighted('assistant', 1)) is None
+    assert example_problem(weighted('user', 1)) == "unknown keys: message 0 (user) has ['weight']"
+    for weight in (2, 0.5, True, "1", None):
+        assert example_problem(weighted('assistant', weight)).startswith("invalid weight: message 1 ")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Embedding-free Diversity Selection
+Turns review text into hashed TF-IDF sketches and picks the reviews that are
+farthest apart, chunk by chunk on a process pool
+"""
+
+import math
+import os
+import random
+import string
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Union
+from dedup import mix64, word_hashes
+from review_batch import ReviewBatch
+
+SKETCH_DIMENSIONS = 128  # Signed feature hashing into this many dense dimensions (a power of two)
+IDF_BUCKETS = 2 ** 18  # A power of two too
+IDF_SAMPLE_ROWS = 20_000
+CHUNK_ROWS = 20_000
+GAME_WEIGHT = 0.3  # Share of a sketch's squared length given to the review's game
+OVERSAMPLE = 3  # Each chunk keeps this many times its proportional share of a quota
+MERGE_FACTOR = 8  # Pooled winners are thinned back to the quota past this many times it
+_BIGRAM = np.uint64(0x9E3779B97F4A7C15)
+
+def text_words(texts: Union[pa.Array, pa.ChunkedArray]) -> Tuple[np.ndarray, np.ndarray]:
+    """(row, 64-bit word hash) for every word of each text, in order
+
+    Arrow's kernels lowercase, split on whitespace and dictionary-encode the
+    words; only distinct words are stripped of punctuation and hashed in
+    Python (memoized, as in dedup). Words that are all punctuation are
+    dropped.
+    """
+    if isinstance(texts, pa.ChunkedArray):
+        texts = texts.combine_chunks()
+    words = pc.utf8_split_whitespace(pc.utf8_lower(texts))
+    rows = pc.list_parent_indices(words).to_numpy()
+    encoded = pc.dictionary_encode(pc.list_flatten(words))
+    vocabulary = [word.strip(string.punctuation) for word in encoded.dictionary.to_pylist()]
+    codes = encoded.indices.to_numpy()
+    real = np.fromiter(map(len, vocabulary), dtype=np.int64, count=len(vocabulary))[codes] > 0
+    return rows[real], word_hashes(vocabulary)[codes][real]
+
+def text_features(texts: Union[pa.Array, pa.ChunkedArray]) -> Tuple[np.ndarray, np.ndarray]:
+    """(row, 64-bit feature hash) for every word (see text_words) and word bigram of each text
+
+    Feature hashes are uniformly random bits, so IDF buckets and sketch
+    dimensions are read straight off them.
+    """
+    rows, hashes = text_words(texts)
+    adjacent = rows[1:] == rows[:-1]
+    bigrams = mix64(hashes[:-1] * _BIGRAM + hashes[1:])[adjacent]
+    return np.concatenate([rows, rows[:-1][adjacent]]), np.concatenate([hashes, bigrams])
+
+def _idf_buckets(features: np.ndarray) -> np.ndarray:
+    return (features & np.uint64(IDF_BUCKETS - 1)).astype(np.int64)
+
+def _signed_dimensions(features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed sketch dimension and +/-1 sign of each feature"""
+    dimensions = ((features >> np.uint64(32)) & np.uint64(SKETCH_DIMENSIONS - 1)).astype(np.int64)
+    return dimensions, 1.0 - 2.0 * (features >> np.uint64(63))
+
+def fit_idf(texts: Union[pa.Array, pa.ChunkedArray]) -> np.ndarray:
+    """Smoothed inverse document frequency of every feature bucket over a sample of texts"""
+    rows, features = text_features(texts)
+    keys = np.sort(rows * IDF_BUCKETS + _idf_buckets(features))
+    present = keys[np.r_[True, keys[1:] != keys[:-1]]] % IDF_BUCKETS if len(keys) else keys
+    df = np.bincount(present, minlength=IDF_BUCKETS)
+    return (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+def sketch(texts: Union[pa.Array, pa.ChunkedArray], idf: np.ndarray, game_ids: Optional[List] = None) -> np.ndarray:
+    """Unit-length TF-IDF sketch (len(texts) x SKETCH_DIMENSIONS float32) of every text
+
+    Each feature adds its IDF weight, with a hashed sign, to one hashed
+    dimension: a count sketch of the sparse TF-IDF vector, whose dot
+    products estimate the full vectors' cosine similarity. With game_ids,
+    a hashed one-hot of the game makes up GAME_WEIGHT of the squared
+    length, so two reviews of one game are that much more similar.
+    """
+    rows, features = text_features(texts)
+    dimensions, signs = _signed_dimensions(features)
+    vectors = np.bincount(rows * SKETCH_DIMENSIONS + dimensions, weights=signs * idf[_idf_buckets(features)],
+                          minlength=len(texts) * SKETCH_DIMENSIONS).reshape(len(texts), SKETCH_DIMENSIONS)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms > 0, norms, 1)
+    if game_ids is not None:
+        dimensions, signs = _signed_dimensions(word_hashes([f"game\0{game_id}" for game_id in game_ids]))
+        vectors *= math.sqrt(1 - GAME_WEIGHT)
+        vectors[np.arange(len(texts)), dimensions] += signs * math.sqrt(GAME_WEIGHT)
+    return vectors.astype(np.float32)
+
+def farthest_point_sample(vectors: np.ndarray, count: int, start: int = 0) -> np.ndarray:
+    """Greedy farthest-point (k-center) order: each pick is the row least similar to every earlier pick"""
+    count = min(count, len(vectors))
+    picked = np.empty(count, dtype=np.int64)
+    closest = np.full(len(vectors), -np.inf, dtype=np.float32)
+    row = start
+    for position in range(count):
+        picked[position] = row
+        np.maximum(closest, vectors @ vectors[row], out=closest)
+        closest[row] = np.inf
+        row = int(np.argmin(closest))
+    return picked
+
+def _rows_of(batch: ReviewBatch) -> Tuple[pa.ChunkedArray, List]:
+    return batch.column('review_text'), batch.pylist('game_id')
+
+def _chunk_winners(index: int, batch: ReviewBatch, groups: np.ndarray, counts: Dict[Hashable, int],
+                   idf: np.ndarray, seed: int) -> Dict[Hashable, Tuple[ReviewBatch, np.ndarray]]:
+    """Worker: sketch one chunk and keep the farthest-point sample of each group in it"""
+    texts, game_ids = _rows_of(batch)
+    vectors = sketch(texts, idf, game_ids)
+    rng = random.Random(f"{seed}\0{index}")
+    winners = {}
+    for group, count in counts.items():
+        rows = np.flatnonzero(groups == group)
+        if len(rows) and count:
+            picked = rows[farthest_point_sample(vectors[rows], count, rng.randrange(len(rows)))]
+            winners[group] = (batch.take(picked), vectors[picked])
+    return winners
+
+def _thin(parts: List[Tuple[ReviewBatch, np.ndarray]], count: int,
+          rng: random.Random) -> Tuple[ReviewBatch, np.ndarray]:
+    """Farthest-point sample of count rows from pooled chunk winners"""
+    batch = ReviewBatch(pa.concat_tables([part.table for part, _ in parts], promote_options='permissive'))
+    vectors = np.concatenate([part_vectors for _, part_vectors in parts])
+    picked = farthest_point_sample(vectors, count, rng.randrange(len(vectors)))
+    return batch.take(picked), vectors[picked]
+
+def select_farthest(chunks: Iterable[Tuple[ReviewBatch, np.ndarray]], quotas: Dict[Hashable, int],
+                    idf: np.ndarray, seed: int = 0, workers: Optional[int] = None,
+                    group_rows: Optional[Dict[Hashable, int]] = None) -> Dict[Hashable, ReviewBatch]:
+    """Pick quotas[group] mutually distant reviews of each group
+
+    chunks yields (batch, group of each row). Every chunk is sketched and
+    farthest-point sampled on its own, in parallel: it keeps its share of
+    each quota, OVERSAMPLE times over when group_rows (each group's total
+    rows) is known, else the whole quota. Winners are pooled and, whenever
+    a pool grows past MERGE_FACTOR quotas and at the end, farthest-point
+    sampled again (a composable core-set), so memory stays bounded on any
+    corpus size. Results depend on seed and chunking, not on workers.
+    """
+    workers = workers or os.cpu_count() or 1
+    rng = random.Random(seed)
+    pools = {group: [] for group in quotas}
+
+    def chunk_counts(groups: np.ndarray) -> Dict[Hashable, int]:
+        counts = {}
+        for group, quota in quotas.items():
+            share = int((groups == group).sum())
+            if group_rows and group_rows.get(group):
+                counts[group] = min(share, quota, math.ceil(OVERSAMPLE * quota * share / group_rows[group]))
+            else:
+                counts[group] = min(share, quota)
+        return counts
+
+    def pool(winners: Dict[Hashable, Tuple[ReviewBatch, np.ndarray]]):
+        for group, winner in winners.items():
+            pools[group].append(winner)
+            if sum(len(part) for part, _ in pools[group]) > MERGE_FACTOR * quotas[group]:
+                pools[group] = [_thin(pools[group], quotas[group], rng)]
+
+    def tasks() -> Iterator[Tuple]:
+        for index, (batch, groups) in enumerate(chunks):
+            yield index, batch, groups, chunk_counts(groups), idf, seed
+
+    if workers <= 1:
+        for task in tasks():
+            pool(_chunk_winners(*task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for task in tasks():
+                pending.append(executor.submit(_chunk_winners, *task))
+                if len(pending) > workers * 2:
+                    pool(pending.popleft().result())
+            while pending:
+                pool(pending.popleft().result())
+
+    return {group: _thin(parts, quotas[group], rng)[0] if parts else ReviewBatch.empty()
+            for group, parts in pools.items()}
+
+def idf_sample(batch: ReviewBatch, rows: Optional[np.ndarray] = None, sample_rows: int = IDF_SAMPLE_ROWS) -> np.ndarray:
+    """IDF fitted on up to sample_rows evenly spaced reviews of batch (or of its given rows)"""
+    rows = np.arange(len(batch)) if rows is None else rows
+    if len(rows) > sample_rows:
+        rows = rows[np.linspace(0, len(rows) - 1, sample_rows).astype(np.int64)]
+    return fit_idf(batch.take(rows).column('review_text'))
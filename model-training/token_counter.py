@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Token Counting for OpenAI Fine-tuning Data
+Counts chat-format training tokens with the model's BPE tokenizer, streaming
+JSONL files across processes and caching counts per example hash
+"""
+
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import sqlite3
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional
+from jsonl_writer import open_jsonl
+from review_cache import DEFAULT_CACHE_DIR
+
+ENCODING_NAME = "o200k_base"  # gpt-4o / gpt-4o-mini tokenizer
+TOKENS_PER_MESSAGE = 3  # <|start|>{role}\n ... <|end|> framing around every message
+TOKENS_PER_NAME = 1
+TOKENS_PER_REPLY = 3  # Assistant reply priming
+TRAINING_COST_PER_1K_TOKENS = 0.025  # GPT-4o-mini training rate
+DEFAULT_EPOCHS = 3  # 3 epochs should be sufficient for 5K examples
+
+DEFAULT_TOKEN_CACHE = os.path.join(DEFAULT_CACHE_DIR, 'token_counts.sqlite')
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024  # Smaller files aren't worth the process pool start-up
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    """Load the BPE encoding once per process; None if tiktoken can't provide it (see tokens_are_approximate)"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception as e:
+        if multiprocessing.parent_process() is None:  # Pool workers stay quiet; the parent warns once
+            print(f"⚠️ Tokenizer {ENCODING_NAME} unavailable ({type(e).__name__}); "
+                  "token counts are approximate (~4 characters per token)")
+        return None
+
+def tokens_are_approximate() -> bool:
+    """Whether counts are the ~4 characters per token fallback rather than BPE counts"""
+    return get_encoding() is None
+
+def encoding_key() -> str:
+    """Name the counting scheme in use, so cached counts never mix schemes"""
+    return ENCODING_NAME if get_encoding() is not None else 'approx-chars'
+
+def count_text_tokens(text: str) -> int:
+    """Count BPE tokens in a piece of message content"""
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages: List[Dict]) -> int:
+    """Count tokens the way the chat format bills them: content plus per-message overhead"""
+    tokens = TOKENS_PER_REPLY
+    for message in messages:
+        tokens += TOKENS_PER_MESSAGE
+        for key, value in message.items():
+            if isinstance(value, str):
+                tokens += count_text_tokens(value)
+                if key == 'name':
+                    tokens += TOKENS_PER_NAME
+    return tokens
+
+def count_example_tokens(examples: Iterable[Dict]) -> int:
+    """Total training tokens for in-memory examples"""
+    return sum(count_message_tokens(example['messages']) for example in examples)
+
+def estimate_training_cost(total_tokens: float, n_epochs: int = DEFAULT_EPOCHS) -> float:
+    """Dollar cost of training on total_tokens; OpenAI bills every token once per epoch"""
+    return (total_tokens * n_epochs / 1000) * TRAINING_COST_PER_1K_TOKENS
+
+def _line_hash(line: bytes) -> bytes:
+    """Stable hash of one JSONL example"""
+    return hashlib.blake2b(line.strip(), digest_size=16).digest()
+
+def _count_lines(lines: List[bytes]) -> List[int]:
+    """Worker: count tokens for a chunk of raw JSONL lines"""
+    return [count_message_tokens(json.loads(line)['messages']) for line in lines]
+
+def _iter_line_chunks(f, chunk_lines: int) -> Iterator[List[bytes]]:
+    """Yield non-blank lines from a binary file in fixed-size chunks"""
+    chunk = []
+    for line in f:
+        if line.strip():
+            chunk.append(line)
+            if len(chunk) >= chunk_lines:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+class TokenCountCache:
+    """On-disk map of example hash -> token count, one table per encoding"""
+
+    def __init__(self, path: Optional[str] = DEFAULT_TOKEN_CACHE):
+        self.path = path
+        self.key = encoding_key()
+        self.db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.db = sqlite3.connect(path)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS counts (encoding TEXT, hash BLOB, tokens INTEGER, "
+                "PRIMARY KEY (encoding, hash)) WITHOUT ROWID"
+            )
+
+    def get_many(self, hashes: List[bytes]) -> Dict[bytes, int]:
+        """Look up cached counts for a batch of hashes"""
+        if self.db is None:
+            return {}
+        found = {}
+        unique = list(set(hashes))
+        for start in range(0, len(unique), 500):  # Stay under SQLite's bound-parameter limit
+            batch = unique[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT hash, tokens FROM counts WHERE encoding = ? AND hash IN ({','.join('?' * len(batch))})",
+                [self.key, *batch]
+            )
+            found.update(rows)
+        return found
+
+    def put_many(self, counts: Dict[bytes, int]):
+        """Remember freshly computed counts"""
+        if self.db is not None and counts:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO counts VALUES (?, ?, ?)",
+                [(self.key, h, tokens) for h, tokens in counts.items()]
+            )
+            self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def count_jsonl_tokens(filename: str, workers: Optional[int] = None, chunk_lines: int = 5000,
+                       cache_path: Optional[str] = DEFAULT_TOKEN_CACHE) -> int:
+    """Stream a training JSONL file (plain, .gz or .zst) and total its chat-format tokens
+
+    Examples already in the cache are not re-tokenized; the rest are counted
+    in chunks, spread over a process pool when the file is large. Pass
+    cache_path=None to skip the cache.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if os.path.getsize(filename) < PARALLEL_MIN_BYTES:
+        workers = 1
+
+    total = 0
+    executor = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+    pending = []
+
+    def settle(cache: TokenCountCache, unique: List[bytes], counts: List[int], occurrences: List[bytes]) -> int:
+        """Cache fresh counts and bill them once per occurrence in the chunk"""
+        counted = dict(zip(unique, counts))
+        cache.put_many(counted)
+        return sum(counted[h] for h in occurrences)
+
+    try:
+        with TokenCountCache(cache_path) as cache, open_jsonl(filename) as f:
+            for chunk in _iter_line_chunks(f, chunk_lines):
+                hashes = [_line_hash(line) for line in chunk]
+                known = cache.get_many(hashes)
+
+                missing = {}
+                for h, line in zip(hashes, chunk):
+                    if h in known:
+                        total += known[h]
+                    else:
+                        missing.setdefault(h, line)
+                if not missing:
+                    continue
+
+                # Duplicated uncached lines are tokenized once, then billed per occurrence
+                occurrences = [h for h in hashes if h in missing]
+                if executor is None:
+                    total += settle(cache, list(missing), _count_lines(list(missing.values())), occurrences)
+                    continue
+
+                pending.append((executor.submit(_count_lines, list(missing.values())), list(missing), occurrences))
+                # Bound the work in flight so memory stays flat on huge files
+                while len(pending) > workers * 2:
+                    future, unique, occurrences = pending.pop(0)
+                    total += settle(cache, unique, future.result(), occurrences)
+
+            for future, unique, occurrences in pending:
+                total += settle(cache, unique, future.result(), occurrences)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return total
@@ -4,11 +4,21 @@ OpenAI Fine-tuning Script for Steam Gaming Assistant
 Uploads training data and starts fine-tuning job
 """
 
-import openai
-import json
-import time
+import argparse
 import os
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
+from chunked_upload import journal_path, upload_file
+from instrumentation import PROFILERS, Instrumentation
+from job_monitor import monitor_jobs
+from jsonl_writer import manifest_path, read_manifest, shard_paths
+from token_counter import DEFAULT_EPOCHS, count_jsonl_tokens, estimate_training_cost, tokens_are_approximate
+from training_validator import MAX_EXAMPLE_TOKENS, validate_training_data
+
+if TYPE_CHECKING:
+    import openai
+
+DEFAULT_MODEL = "gpt-4o-mini-2024-07-18"
+SINGLE_REQUEST_UPLOAD_BYTES = 32 * 1024 * 1024  # Bigger files go up in resumable parts
 
 def setup_openai_client():
     """Initialize OpenAI client with API key"""
@@ -18,22 +28,27 @@ def setup_openai_client():
         print("Please set it with: export OPENAI_API_KEY='your-api-key'")
         return None
     
+    import openai  # Heavy import, only paid once we actually talk to the API
+    
     client = openai.OpenAI(api_key=api_key)
     print("✅ OpenAI client initialized")
     return client
 
-def upload_training_file(client: openai.OpenAI, filename: str = "steam_training_data.jsonl") -> Optional[str]:
-    """Upload training data file to OpenAI"""
+def upload_training_file(client: "openai.OpenAI", filename: str = "steam_training_data.jsonl") -> Optional[str]:
+    """Upload training data file to OpenAI, in resumable parts when it is large"""
     print(f"📤 Uploading {filename}...")
     
     try:
-        with open(filename, 'rb') as f:
-            response = client.files.create(
-                file=f,
-                purpose='fine-tune'
-            )
+        if os.path.getsize(filename) > SINGLE_REQUEST_UPLOAD_BYTES:
+            file_id = upload_file(filename, api_key=client.api_key, base_url=client.base_url)
+        else:
+            with open(filename, 'rb') as f:
+                response = client.files.create(
+                    file=f,
+                    purpose='fine-tune'
+                )
+            file_id = response.id
         
-        file_id = response.id
         print(f"✅ File uploaded successfully: {file_id}")
         return file_id
         
@@ -42,19 +57,45 @@ def upload_training_file(client: openai.OpenAI, filename: str = "steam_training_
         return None
     except Exception as e:
         print(f"❌ Upload failed: {e}")
+        if os.path.exists(journal_path(filename)):
+            print("🔁 Run the upload again to resume from the parts already sent")
+        return None
+
+def upload_training_files(client: "openai.OpenAI", filename: str = "steam_training_data.jsonl") -> Optional[List[str]]:
+    """Upload the training file, or every shard of a sharded output; file ids in shard order, or None on failure"""
+    paths = training_files(filename)
+    if not paths:
+        print(f"❌ {filename} holds no training examples ({manifest_path(filename)} lists no shards); nothing to upload.")
         return None
+    file_ids = []
+    for path in paths:
+        file_id = upload_training_file(client, path)
+        if not file_id:
+            return None
+        file_ids.append(file_id)
+    return file_ids
 
-def start_fine_tuning(client: openai.OpenAI, file_id: str, model: str = "gpt-4o-mini-2024-07-18") -> Optional[str]:
+def fine_tuning_job_params(file_id: str, model: str = DEFAULT_MODEL, n_epochs: int = DEFAULT_EPOCHS,
+                           learning_rate_multiplier: Optional[float] = None,
+                           suffix: Optional[str] = None) -> Dict:
+    """Keyword arguments for fine_tuning.jobs.create"""
+    hyperparameters = {"n_epochs": n_epochs}
+    if learning_rate_multiplier is not None:
+        hyperparameters["learning_rate_multiplier"] = learning_rate_multiplier
+    params = {"training_file": file_id, "model": model, "hyperparameters": hyperparameters}
+    if suffix:
+        params["suffix"] = suffix
+    return params
+
+def start_fine_tuning(client: "openai.OpenAI", file_id: str, model: str = DEFAULT_MODEL,
+                      n_epochs: int = DEFAULT_EPOCHS,
+                      learning_rate_multiplier: Optional[float] = None) -> Optional[str]:
     """Start fine-tuning job"""
     print(f"🚀 Starting fine-tuning with {model}...")
     
     try:
         response = client.fine_tuning.jobs.create(
-            training_file=file_id,
-            model=model,
-            hyperparameters={
-                "n_epochs": 3,  # 3 epochs should be sufficient for 5K examples
-            }
+            **fine_tuning_job_params(file_id, model, n_epochs, learning_rate_multiplier)
         )
         
         job_id = response.id
@@ -66,112 +107,151 @@ def start_fine_tuning(client: openai.OpenAI, file_id: str, model: str = "gpt-4o-
         print(f"❌ Fine-tuning failed to start: {e}")
         return None
 
-def monitor_training(client: openai.OpenAI, job_id: str):
-    """Monitor fine-tuning progress"""
+def monitor_training(client: "openai.OpenAI", job_id: str):
+    """Monitor fine-tuning progress, streaming step/loss events as they arrive"""
     print("📊 Monitoring training progress...")
     
-    while True:
-        try:
-            response = client.fine_tuning.jobs.retrieve(job_id)
-            status = response.status
-            
-            print(f"Status: {status}")
-            
-            if status == 'succeeded':
-                model_id = response.fine_tuned_model
-                print(f"🎉 Training completed successfully!")
-                print(f"📝 Fine-tuned model: {model_id}")
-                
-                # Save model ID for later use
-                with open('fine_tuned_model_id.txt', 'w') as f:
-                    f.write(model_id)
-                
-                return model_id
-                
-            elif status == 'failed':
-                print(f"❌ Training failed: {response.error}")
-                return None
-                
-            elif status in ['validating_files', 'queued', 'running']:
-                print("⏳ Training in progress... checking again in 60 seconds")
-                time.sleep(60)
-            else:
-                print(f"⚠️ Unexpected status: {status}")
-                time.sleep(30)
-                
-        except KeyboardInterrupt:
-            print("\n⏹️ Monitoring stopped. Training continues in background.")
-            print(f"📋 Job ID: {job_id}")
-            print("Check status at: https://platform.openai.com/fine-tuning")
-            break
-        except Exception as e:
-            print(f"Error checking status: {e}")
-            time.sleep(30)
-
-def estimate_cost(filename: str = "steam_training_data.jsonl"):
-    """Estimate training cost"""
     try:
-        with open(filename, 'r') as f:
-            lines = f.readlines()
+        job = monitor_jobs([job_id], api_key=client.api_key, base_url=client.base_url)[job_id]
+    except KeyboardInterrupt:
+        print("\n⏹️ Monitoring stopped. Training continues in background.")
+        print(f"📋 Job ID: {job_id}")
+        print("Check status at: https://platform.openai.com/fine-tuning")
+        return None
+    
+    if job.status == 'succeeded':
+        model_id = job.fine_tuned_model
+        print(f"🎉 Training completed successfully!")
+        print(f"📝 Fine-tuned model: {model_id}")
+        
+        # Save model ID for later use
+        with open('fine_tuned_model_id.txt', 'w') as f:
+            f.write(model_id)
         
-        total_tokens = 0
-        for line in lines:
-            data = json.loads(line)
-            # Rough token estimation
-            text = json.dumps(data)
-            tokens = len(text.split()) * 1.3  # Conservative estimate
-            total_tokens += tokens
+        return model_id
+    
+    print(f"❌ Training {job.status}: {job.error}")
+    return None
+
+def training_files(filename: str = "steam_training_data.jsonl") -> List[str]:
+    """The file itself, or every shard its manifest lists when the output was sharded"""
+    if os.path.exists(manifest_path(filename)):
+        return shard_paths(read_manifest(filename))
+    return [filename]
+
+def estimate_cost(filename: str = "steam_training_data.jsonl", n_epochs: int = DEFAULT_EPOCHS):
+    """Estimate training cost from BPE token counts of the message content, times the epochs trained"""
+    try:
+        total_tokens = sum(count_jsonl_tokens(path) for path in training_files(filename))
         
-        cost = (total_tokens / 1000) * 0.025  # GPT-4o-mini rate
-        print(f"📊 Estimated tokens: {total_tokens:,.0f}")
-        print(f"💰 Estimated cost: ${cost:.2f}")
+        cost = estimate_training_cost(total_tokens, n_epochs)
+        approximate = '~' if tokens_are_approximate() else ''
+        print(f"📊 Training tokens: {approximate}{total_tokens:,} x {n_epochs} epoch(s)"
+              + (" (approximate: no BPE tokenizer)" if approximate else ''))
+        print(f"💰 Estimated cost: {approximate}${cost:.2f}")
         return cost
         
     except Exception as e:
         print(f"Error estimating cost: {e}")
         return None
 
-def main():
-    """Main execution function"""
+def validate_training_file(filename: str = "steam_training_data.jsonl", max_errors: int = 10,
+                           drop_invalid: bool = False, max_tokens: int = MAX_EXAMPLE_TOKENS) -> bool:
+    """Check every example is a chat transcript OpenAI will accept, optionally dropping the rest"""
+    result = validate_training_data(filename, max_tokens=max_tokens, drop_invalid=drop_invalid,
+                                    max_reported=max_errors)
+    return not result['invalid'] or result['dropped']
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Fine-tune GPT-4o-mini on the prepared Steam training data")
+    parser.add_argument('--epochs', type=int, default=DEFAULT_EPOCHS,
+                        help="Training epochs (the cost estimate and $30 guard count every one)")
+    parser.add_argument('--drop-invalid', action='store_true',
+                        help="Remove examples that fail validation instead of stopping before upload")
+    parser.add_argument('--report', default='train_report.json',
+                        help="Where to write per-stage timings and memory as JSON ('' to skip)")
+    parser.add_argument('--profile', choices=PROFILERS, help="Also profile every stage with cProfile or a stack sampler")
+    parser.add_argument('--profile-dir', default='profiles', help="Where per-stage profiles are written")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main execution function; exits non-zero unless a fine-tuned model comes out"""
+    args = parse_args(argv)
+    instrumentation = Instrumentation('train', profiler=args.profile, profile_dir=args.profile_dir)
+    try:
+        return train(instrumentation, drop_invalid=args.drop_invalid, n_epochs=args.epochs)
+    finally:
+        if args.report and instrumentation.stages:
+            instrumentation.write_report(args.report)
+
+def train(instrumentation: Instrumentation, drop_invalid: bool = False, n_epochs: int = DEFAULT_EPOCHS,
+          filename: str = "steam_training_data.jsonl") -> int:
+    """Validate, estimate, upload, fine-tune and monitor, one instrumented stage each; returns an exit status"""
     print("🤖 OpenAI Fine-tuning for Steam Gaming Assistant")
     print("=" * 55)
     
-    # Check if training data exists
-    if not os.path.exists('steam_training_data.jsonl'):
+    # Check if training data exists (as one file, or as the shards its manifest lists)
+    paths = training_files(filename)
+    if not paths:
+        print(f"❌ {filename} holds no training examples ({manifest_path(filename)} lists no shards). "
+              "Re-run prepare_training_data.py on reviews that yield examples.")
+        return 1
+    if not all(os.path.exists(path) for path in paths):
         print("❌ Training data not found. Run prepare_training_data.py first.")
-        return
+        return 1
+    if len(paths) > 1:
+        # A fine-tuning job takes a single training file
+        print(f"❌ {filename} was written as {len(paths)} shards ({manifest_path(filename)}); a fine-tuning job takes one file.")
+        print("💡 Fine-tune each shard with main.py sweep, or re-run prepare_training_data.py with a larger --max-shard-mb.")
+        return 1
+    if os.path.exists(manifest_path(filename)) and read_manifest(filename).get('synthetic'):
+        print(f"⚠️ {filename} was built from GENERATED sample reviews (its manifest says synthetic), not real Steam reviews.")
+    
+    # Catch malformed examples here rather than in OpenAI's validating_files step
+    with instrumentation.stage('validate'):
+        valid = validate_training_file(filename, drop_invalid=drop_invalid)
+    if not valid:
+        print("💡 Fix the data, or re-run with --drop-invalid to skip the bad examples.")
+        return 1
     
     # Estimate cost
-    cost = estimate_cost()
+    with instrumentation.stage('estimate_cost'):
+        cost = estimate_cost(filename, n_epochs=n_epochs)
     if cost and cost > 30:
         print(f"⚠️ Cost estimate (${cost:.2f}) exceeds $30. Consider reducing dataset size.")
         response = input("Continue anyway? (y/N): ")
         if response.lower() != 'y':
             print("Cancelled.")
-            return
+            return 1
     
     # Setup OpenAI client
     client = setup_openai_client()
     if not client:
-        return
+        return 1
     
     # Upload training file
-    file_id = upload_training_file(client)
+    with instrumentation.stage('upload'):
+        file_id = upload_training_file(client, paths[0])
     if not file_id:
-        return
+        return 1
     
     # Start fine-tuning
-    job_id = start_fine_tuning(client, file_id)
+    with instrumentation.stage('start_fine_tuning'):
+        job_id = start_fine_tuning(client, file_id, n_epochs=n_epochs)
     if not job_id:
-        return
+        return 1
     
     # Monitor progress
-    model_id = monitor_training(client, job_id)
+    with instrumentation.stage('monitor'):
+        model_id = monitor_training(client, job_id)
     
-    if model_id:
-        print(f"\n🎯 Success! Your fine-tuned model is ready: {model_id}")
-        print("💡 Update your app's .env file:")
-        print(f"OPENAI_FINETUNED_MODEL={model_id}")
+    if not model_id:
+        return 1
+    print(f"\n🎯 Success! Your fine-tuned model is ready: {model_id}")
+    print("💡 Update your app's .env file:")
+    print(f"OPENAI_FINETUNED_MODEL={model_id}")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(main())
\ No newline at end of file
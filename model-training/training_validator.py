@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Training Data Validator
+Checks every line of a training JSONL file (or its shards) the way OpenAI's
+fine-tuning validation will, in parallel, before anything is uploaded
+"""
+
+import json
+import os
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+from jsonl_writer import manifest_path, open_jsonl, read_manifest, rewrite_jsonl, shard_paths, write_manifest
+from token_counter import (
+    ENCODING_NAME, PARALLEL_MIN_BYTES, count_jsonl_tokens, count_message_tokens, tokens_are_approximate
+)
+
+MAX_EXAMPLE_TOKENS = 65536  # gpt-4o-mini fine-tuning limit per example
+ROLES = ('system', 'user', 'assistant')
+MESSAGE_KEYS = {'role', 'content', 'name'}
+ASSISTANT_KEYS = MESSAGE_KEYS | {'weight'}  # weight 0 or 1 masks an assistant turn out of training
+CHUNK_LINES = 20000
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # Optional: the standard library parser is ~3x slower
+    _loads = json.loads
+
+def example_problem(line: bytes, max_tokens: int = MAX_EXAMPLE_TOKENS) -> Optional[str]:
+    """What is wrong with one JSONL line ("kind: detail"), or None if OpenAI will accept it"""
+    try:
+        example = _loads(line)
+    except ValueError:
+        return "invalid JSON"
+    if not isinstance(example, dict):
+        return "not a JSON object"
+    messages = example.get('messages')
+    if not isinstance(messages, list) or not messages:
+        return "missing 'messages' list"
+
+    expected = 'user'
+    for position, message in enumerate(messages):
+        if not isinstance(message, dict):
+            return f"invalid message: message {position} is not an object"
+        role = message.get('role')
+        if role not in ROLES:
+            return f"invalid role: message {position} has role {role!r}"
+        unknown = message.keys() - (ASSISTANT_KEYS if role == 'assistant' else MESSAGE_KEYS)
+        if unknown:
+            return f"unknown keys: message {position} ({role}) has {sorted(unknown)}"
+        if 'weight' in message and (type(message['weight']) is not int or message['weight'] not in (0, 1)):
+            return f"invalid weight: message {position} has weight {message['weight']!r}, expected 0 or 1"
+        content = message.get('content')
+        if not isinstance(content, str) or not content.strip():
+            return f"empty content: message {position} ({role})"
+        # An optional leading system prompt, then user and assistant taking turns
+        if role == 'system' and position == 0:
+            continue
+        if role != expected:
+            return f"wrong role order: message {position} is {role}, expected {expected}"
+        expected = 'assistant' if role == 'user' else 'user'
+    if messages[-1]['role'] != 'assistant':
+        return "wrong role order: does not end with an assistant message"
+
+    # A token is at least one byte, so only long lines can be over the limit
+    if len(line) + 3 * (len(messages) + 1) > max_tokens:
+        tokens = count_message_tokens(messages)
+        if tokens_are_approximate():
+            # A guessed count can't pass the limit
+            return f"unverified token count: ~{tokens} estimated without the {ENCODING_NAME} tokenizer"
+        if tokens > max_tokens:
+            return f"too many tokens: {tokens} > {max_tokens}"
+    return None
+
+def _check_chunk(first_line: int, lines: List[bytes], max_tokens: int) -> Tuple[int, List[Tuple[int, str]]]:
+    """Worker: count examples and find the bad ones in a chunk of lines"""
+    examples = 0
+    problems = []
+    for line_number, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        examples += 1
+        problem = example_problem(line, max_tokens)
+        if problem:
+            problems.append((line_number, problem))
+    return examples, problems
+
+def _iter_numbered_chunks(f, chunk_lines: int) -> Iterator[Tuple[int, List[bytes]]]:
+    """Yield (first line number, lines) chunks, blank lines included so numbering holds"""
+    chunk = []
+    first_line = 1
+    for line in f:
+        chunk.append(line)
+        if len(chunk) >= chunk_lines:
+            yield first_line, chunk
+            first_line += len(chunk)
+            chunk = []
+    if chunk:
+        yield first_line, chunk
+
+def validate_jsonl(path: str, max_tokens: int = MAX_EXAMPLE_TOKENS, workers: Optional[int] = None,
+                   drop_invalid: bool = False, chunk_lines: int = CHUNK_LINES) -> Dict:
+    """Validate one JSONL file (plain, .gz or .zst)
+
+    Chunks of lines are checked on a process pool when the file is large.
+    Returns the example count and every (line number, problem); with
+    drop_invalid a second streaming pass rewrites the file without the bad
+    (and blank) lines, and the result also carries its new manifest fields.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if os.path.getsize(path) < PARALLEL_MIN_BYTES:
+        workers = 1
+
+    examples = 0
+    problems = []
+
+    def settle(result: Tuple[int, List[Tuple[int, str]]]):
+        nonlocal examples
+        examples += result[0]
+        problems.extend(result[1])
+
+    executor = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+    pending = []
+    try:
+        with open_jsonl(path) as f:
+            for first_line, lines in _iter_numbered_chunks(f, chunk_lines):
+                if executor is None:
+                    settle(_check_chunk(first_line, lines, max_tokens))
+                    continue
+                pending.append(executor.submit(_check_chunk, first_line, lines, max_tokens))
+                # Bound the work in flight so memory stays flat on huge files
+                while len(pending) > workers * 2:
+                    settle(pending.pop(0).result())
+            for future in pending:
+                settle(future.result())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    result = {'path': path, 'examples': examples, 'problems': problems}
+    if drop_invalid and problems:
+        bad = {line_number for line_number, _ in problems}
+        with open_jsonl(path) as f:
+            kept = (line for line_number, line in enumerate(f, 1) if line_number not in bad and line.strip())
+            result['rewritten'] = rewrite_jsonl(path, kept)
+    return result
+
+def validate_training_data(filename: str, max_tokens: int = MAX_EXAMPLE_TOKENS, workers: Optional[int] = None,
+                           drop_invalid: bool = False, max_reported: int = 10) -> Dict:
+    """Validate a training file or, when it was sharded, every shard in its manifest
+
+    Prints the first max_reported problems with file and line number and a
+    count per kind of problem. With drop_invalid, bad lines are removed
+    and the manifest's row, size, checksum and token figures are updated.
+    """
+    manifest = read_manifest(filename) if os.path.exists(manifest_path(filename)) else None
+    paths = shard_paths(manifest) if manifest else [filename]
+
+    results = [validate_jsonl(path, max_tokens, workers, drop_invalid) for path in paths]
+    examples = sum(result['examples'] for result in results)
+    problems = [(result['path'], line_number, problem)
+                for result in results for line_number, problem in result['problems']]
+
+    for path, line_number, problem in problems[:max_reported]:
+        print(f"❌ {os.path.basename(path)}:{line_number}: {problem}")
+    if len(problems) > max_reported:
+        print(f"   ... and {len(problems) - max_reported} more")
+    kinds = Counter(problem.split(':')[0] for _, _, problem in problems)
+    for kind, count in kinds.most_common(5):
+        print(f"   {count:>8,} × {kind}")
+
+    if manifest and any('rewritten' in result for result in results):
+        for shard, result in zip(manifest['shards'], results):
+            shard.update(result.get('rewritten', {}))
+            if 'tokens' in shard and 'rewritten' in result:
+                shard['tokens'] = count_jsonl_tokens(shard['path'])
+        manifest['rows'] = sum(shard['rows'] for shard in manifest['shards'])
+        if 'tokens' in manifest:
+            manifest['tokens'] = sum(shard['tokens'] for shard in manifest['shards'])
+        write_manifest(filename, manifest)
+
+    if problems and drop_invalid:
+        print(f"🧹 Dropped {len(problems):,} invalid examples; {examples - len(problems):,} remain")
+    elif problems:
+        print(f"❌ {len(problems):,} of {examples:,} examples are invalid")
+    else:
+        print(f"✅ {examples:,} examples look valid")
+    return {'examples': examples, 'invalid': len(problems), 'dropped': drop_invalid and bool(problems),
+            'problems': problems}
@@ -6,44 +6,110 @@ Selects 5K best Steam reviews and formats them for GPT-4o-mini training
 
 import json
 import gzip
-import requests
+import heapq
+import pyarrow as pa
+import pyarrow.compute as pc
 from datasets import load_dataset
-import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Optional
 import os
+import argparse
 
-def download_steam_reviews():
-    """Download Steam reviews dataset from HuggingFace"""
-    print("Downloading Steam reviews dataset...")
+DATASET_NAME = "recommender-system/steam-review-and-bundle-dataset"
+FLATTEN_BATCH_ROWS = 10_000  # Users (each with a nested review list) per batch
+# Nested review fields and the value a review lacking one gets
+REVIEW_DEFAULTS = {'item_id': '', 'recommend': True, 'helpful': 0, 'funny': 0, 'hours': 0}
+
+def read_jsonl_rows(path: str) -> Iterator[Dict]:
+    """Yield raw rows from a local JSONL file (plain or .gz) one line at a time"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_steam_reviews(source: Optional[str] = None, streaming: bool = True) -> Iterator[Dict]:
+    """Lazily yield normalized reviews, flattening each user's nested review list
+
+    With no source the HuggingFace train split is read (streamed by default);
+    otherwise source is a local JSONL/JSONL.gz file of raw dataset rows.
+    """
+    if source:
+        rows = read_jsonl_rows(source)
+    else:
+        rows = load_dataset(DATASET_NAME, split="train", streaming=streaming)
+    
+    for item in rows:
+        for review in item.get('reviews') or []:
+            if review.get('review'):
+                yield {
+                    'user_id': item.get('user_id', ''),
+                    'game_id': review.get('item_id', ''),
+                    'review_text': review['review'],
+                    'recommend': review.get('recommend', True),
+                    'helpful': review.get('helpful', 0),
+                    'funny': review.get('funny', 0),
+                    'hours': review.get('hours', 0)
+                }
+
+def flatten_reviews_table(table: pa.Table) -> pa.Table:
+    """iter_steam_reviews' flattening for a whole batch of users, in Arrow kernels
+
+    Every nested review becomes a row carrying its user's user_id; reviews
+    without text are dropped.
+    """
+    reviews = pc.list_flatten(table.column('reviews'))
+    users = pc.take(table.column('user_id'), pc.list_parent_indices(table.column('reviews')))
+    fields = {field.name for field in reviews.type}
+
+    def field(name: str):
+        if name in fields:
+            return pc.fill_null(pc.struct_field(reviews, name), REVIEW_DEFAULTS[name])
+        return pa.chunked_array([pa.array([REVIEW_DEFAULTS[name]] * len(reviews))])
+
+    if 'review' in fields:
+        text = pc.struct_field(reviews, 'review')
+    else:
+        text = pa.chunked_array([pa.nulls(len(reviews), pa.string())])
+    flat = pa.table({
+        'user_id': users,
+        'game_id': field('item_id'),
+        'review_text': text,
+        'recommend': field('recommend'),
+        'helpful': field('helpful'),
+        'funny': field('funny'),
+        'hours': field('hours'),
+    })
+    return flat.filter(pc.fill_null(pc.greater(pc.utf8_length(text), 0), False))
+
+def download_steam_reviews(source: Optional[str] = None, workers: Optional[int] = None):
+    """Download Steam reviews dataset from HuggingFace (or read a local JSONL file)
+
+    Users' nested review lists are flattened by a batched Arrow map over
+    worker processes. The result is an Arrow-backed Dataset: rows only
+    become dicts as they are iterated. Only the default download falls
+    back to sample data; a source that fails to load returns None.
+    """
+    print("Downloading Steam reviews dataset..." if not source else f"Reading Steam reviews from {source}...")
     
     try:
-        # Load the dataset
-        dataset = load_dataset("recommender-system/steam-review-and-bundle-dataset")
-        
-        # The dataset contains multiple files, we want the reviews
-        reviews_data = []
-        
-        # Extract reviews from the dataset
-        if 'train' in dataset:
-            for item in dataset['train']:
-                if 'reviews' in item and item['reviews']:
-                    for review in item['reviews']:
-                        if 'review' in review and review['review']:
-                            reviews_data.append({
-                                'user_id': item.get('user_id', ''),
-                                'game_id': review.get('item_id', ''),
-                                'review_text': review['review'],
-                                'recommend': review.get('recommend', True),
-                                'helpful': review.get('helpful', 0),
-                                'funny': review.get('funny', 0),
-                                'hours': review.get('hours', 0)
-                            })
+        if source:
+            rows = load_dataset("json", data_files=source, split="train")
+        else:
+            rows = load_dataset(DATASET_NAME, split="train")
+        workers = max(1, min(workers or os.cpu_count() or 1, rows.num_rows // FLATTEN_BATCH_ROWS))
+        reviews_data = rows.with_format("arrow").map(
+            flatten_reviews_table, batched=True, batch_size=FLATTEN_BATCH_ROWS,
+            remove_columns=rows.column_names, num_proc=workers if workers > 1 else None,
+            desc="Flattening reviews"
+        ).with_format(None)
         
         print(f"Loaded {len(reviews_data)} reviews")
         return reviews_data
         
     except Exception as e:
         print(f"Error loading dataset: {e}")
+        if source:
+            return None
         # Fallback: create sample data for testing
         return create_sample_data()
 
@@ -76,31 +142,43 @@ def create_sample_data():
     # Duplicate to simulate larger dataset
     return sample_reviews * 1000
 
-def select_best_reviews(reviews_data: List[Dict], target_count: int = 5000) -> List[Dict]:
-    """Select the best reviews based on quality metrics"""
+def quality_score(review: Dict) -> float:
+    """Quality score used to rank reviews"""
+    return (
+        review['helpful'] * 2 +  # Helpful votes are most important
+        review['funny'] * 0.5 +  # Funny votes add some value
+        (review['hours'] > 5) * 3 +  # Meaningful playtime
+        (len(review['review_text']) > 100) * 2  # Detailed reviews
+    )
+
+def select_best_reviews(reviews_data: Iterable[Dict], target_count: int = 5000) -> List[Dict]:
+    """Select the best reviews based on quality metrics
+
+    Single pass over a list or lazy stream (see iter_steam_reviews): only the
+    current best target_count candidates are kept, in a min-heap. Ties keep
+    the earlier review, and the result is ordered best first.
+    """
     print(f"Selecting best {target_count} reviews...")
     
-    df = pd.DataFrame(reviews_data)
-    
-    # Quality scoring
-    df['quality_score'] = (
-        df['helpful'] * 2 +  # Helpful votes are most important
-        df['funny'] * 0.5 +  # Funny votes add some value
-        (df['hours'] > 5) * 3 +  # Meaningful playtime
-        (df['review_text'].str.len() > 100) * 2  # Detailed reviews
-    )
+    heap = []
+    for position, review in enumerate(reviews_data):
+        # Filter out very short or very long reviews
+        if not 50 <= len(review['review_text']) <= 2000:
+            continue
+        
+        entry = (quality_score(review), -position, review)
+        if len(heap) < target_count:
+            heapq.heappush(heap, entry)
+        elif target_count and entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
     
-    # Filter out very short or very long reviews
-    df = df[
-        (df['review_text'].str.len() >= 50) &  # Minimum length
-        (df['review_text'].str.len() <= 2000)  # Maximum length
+    best_reviews = [
+        {**review, 'quality_score': score}
+        for score, _, review in sorted(heap, key=lambda entry: entry[:2], reverse=True)
     ]
     
-    # Sort by quality score and take top reviews
-    best_reviews = df.nlargest(target_count, 'quality_score')
-    
     print(f"Selected {len(best_reviews)} high-quality reviews")
-    return best_reviews.to_dict('records')
+    return best_reviews
 
 def format_for_openai(reviews: List[Dict]) -> List[Dict]:
     """Format reviews for OpenAI fine-tuning format"""
@@ -158,17 +236,30 @@ def save_training_data(training_data: List[Dict], filename: str = "steam_trainin
     cost_estimate = (total_tokens / 1000) * 0.025  # GPT-4o-mini training cost
     print(f"Estimated training cost: ${cost_estimate:.2f}")
 
-def main():
-    """Main execution function"""
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Prepare Steam review fine-tuning data")
+    parser.add_argument('--source', help="Local JSONL/JSONL.gz file of raw reviews instead of HuggingFace")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream reviews straight into selection instead of loading them all first")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main execution function; exits non-zero when the reviews cannot be loaded"""
+    args = parse_args(argv)
+    
     print("🎮 Steam Review Training Data Preparation")
     print("=" * 50)
     
-    # Step 1: Download reviews
-    reviews_data = download_steam_reviews()
-    
-    if not reviews_data:
-        print("❌ Failed to load review data")
-        return
+    # Step 1: Download reviews (or open a lazy stream over them)
+    if args.stream:
+        reviews_data = iter_steam_reviews(args.source)
+    else:
+        reviews_data = download_steam_reviews(args.source)
+        
+        if not reviews_data:
+            print("❌ Failed to load review data")
+            return 1
     
     # Step 2: Select best reviews
     best_reviews = select_best_reviews(reviews_data, target_count=5000)
@@ -184,6 +275,7 @@ def main():
     print("1. Upload steam_training_data.jsonl to OpenAI")
     print("2. Start fine-tuning job")
     print("3. Update your app to use the fine-tuned model")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(main())
\ No newline at end of file